@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -19,7 +20,7 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from dependencies.services import services
+from dependencies.services import reset_services, warm_up_services
 from routers.router import router
 
 logger = logging.getLogger(__name__)
@@ -32,12 +33,15 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     # Initialize services on startup
     logger.info("Initializing services...")
-    # Services will be lazily initialized on first use
+    try:
+        await asyncio.to_thread(warm_up_services)
+    except Exception as e:
+        # e.g. the database is still waking up, fall back to lazy initialization
+        logger.warning(f"Service warm-up failed, will initialize on first use: {e}")
     yield
     # Cleanup on shutdown
     logger.info("Cleaning up services...")
-    services.document_store = None
-    services.vector_store = None
+    reset_services()
 
 
 def create_app() -> FastAPI:
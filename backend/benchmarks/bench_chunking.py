@@ -0,0 +1,86 @@
+"""
+Benchmark SentenceChunker against LangChain's RecursiveCharacterTextSplitter.
+
+Chunks the Bitcoin whitepaper's pages, repeated to make a larger document, with the
+default chunking settings. Reports chunks/s and the peak memory allocated while
+chunking, for the full split into Documents and for the text splitting alone, and
+checks both splitters produce the same chunks.
+
+Usage: python -m benchmarks.bench_chunking --copies 50
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+from typing import Callable, List
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from benchmarks.bench_pdf_parsing import BITCOIN_PDF
+from brain.document_processing import DocumentProcessor, SentenceChunker
+
+
+def time_split(split: Callable[[], List[Document]], repeats: int) -> float:
+    """Median seconds to split the pages."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        split()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def peak_memory(split: Callable[[], List[Document]]) -> int:
+    """Peak bytes allocated while splitting the pages, including the chunks."""
+    tracemalloc.start()
+    split()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--copies", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = DocumentProcessor().load_pdf(BITCOIN_PDF) * args.copies
+    kwargs = DocumentProcessor.DEFAULT_SPLITTER_KWARGS
+    recursive_splitter = RecursiveCharacterTextSplitter(**kwargs)
+    sentence_chunker = SentenceChunker(**kwargs)
+    texts = [page.page_content for page in pages]
+    splitters = {
+        "RecursiveCharacterTextSplitter": lambda: RecursiveCharacterTextSplitter(
+            **kwargs
+        ).split_documents(pages),
+        "SentenceChunker": lambda: SentenceChunker(**kwargs).split_documents(pages),
+        "RecursiveCharacterTextSplitter (text)": lambda: [
+            chunk for text in texts for chunk in recursive_splitter.split_text(text)
+        ],
+        "SentenceChunker (offsets)": lambda: [
+            offsets
+            for text in texts
+            for offsets in sentence_chunker.split_offsets(text)
+        ],
+    }
+
+    chunks = {name: split() for name, split in splitters.items()}
+    same = [doc.page_content for doc in chunks["SentenceChunker"]] == [
+        doc.page_content for doc in chunks["RecursiveCharacterTextSplitter"]
+    ]
+    print(f"{len(pages)} pages, identical chunks: {same}")
+    print(f"{'splitter':<40} {'chunks':>8} {'chunks/s':>10} {'peak MiB':>9}")
+    for name, split in splitters.items():
+        seconds = time_split(split, args.repeats)
+        peak = peak_memory(split)
+        print(
+            f"{name:<40} {len(chunks[name]):>8} {len(chunks[name]) / seconds:>10.0f} "
+            f"{peak / 2**20:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark serial vs page-parallel PDF parsing.
+
+Parses the bundled Bitcoin whitepaper and a synthetic PDF with many text-heavy pages,
+serially with PyMuPDFLoader and in parallel with an increasing number of workers.
+
+Usage: python -m benchmarks.bench_pdf_parsing --pages 400 --workers 2 4 8
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+
+from brain.document_processing import DocumentProcessor
+
+BITCOIN_PDF = str(
+    Path(__file__).parent.parent
+    / "docs"
+    / "Bitcoin - A Peer-to-Peer Electronic Cash System.pdf"
+)
+
+PARAGRAPH = (
+    "A purely peer-to-peer version of electronic cash would allow online payments "
+    "to be sent directly from one party to another without going through a "
+    "financial institution. Digital signatures provide part of the solution, but "
+    "the main benefits are lost if a trusted third party is still required. "
+)
+
+
+def make_synthetic_pdf(path: str, pages: int) -> None:
+    """Write a PDF of `pages` pages, each filled with wrapped paragraphs of text."""
+    with fitz.open() as pdf:
+        for number in range(pages):
+            page = pdf.new_page()
+            text = f"Page {number + 1}\n\n" + "\n\n".join([PARAGRAPH] * 12)
+            page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=9)
+        pdf.save(path)
+
+
+def time_load(processor: DocumentProcessor, path: str, repeats: int) -> float:
+    """Median seconds to load the PDF, after a warm-up load."""
+    processor.load_pdf(path)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        processor.load_pdf(path)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_pdf = os.path.join(tmp_dir, f"synthetic_{args.pages}.pdf")
+        make_synthetic_pdf(synthetic_pdf, args.pages)
+
+        print(f"CPUs: {os.cpu_count()}")
+        print(
+            f"{'pdf':<20} {'workers':>8} {'seconds':>10} {'pages/s':>10} {'speedup':>8}"
+        )
+        for name, path in [("bitcoin", BITCOIN_PDF), ("synthetic", synthetic_pdf)]:
+            with fitz.open(path) as pdf:
+                page_count = len(pdf)
+
+            serial = time_load(DocumentProcessor(parse_workers=1), path, args.repeats)
+            print(
+                f"{name:<20} {'serial':>8} {serial:>10.4f} "
+                f"{page_count / serial:>10.0f} {1.0:>8.2f}"
+            )
+            for workers in args.workers:
+                processor = DocumentProcessor(
+                    parse_workers=workers, min_pages_per_worker=1
+                )
+                seconds = time_load(processor, path, args.repeats)
+                processor.close()
+                print(
+                    f"{name:<20} {workers:>8} {seconds:>10.4f} "
+                    f"{page_count / seconds:>10.0f} {serial / seconds:>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark bulk inserting chunks into the pgvector chunks table.
+
+Inserts random embeddings into a scratch chunks table with a binary COPY, with the
+HNSW index maintained while loading and built once afterwards, and with a row by row
+INSERT for comparison. Needs the docker-compose Postgres (`just docker-up`).
+
+Usage: python -m benchmarks.bench_pg_insert --chunks 10000
+"""
+
+import argparse
+import time
+import uuid
+from typing import Callable, List
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.embeddings import FakeEmbeddings
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+from repositories.vector_db import PGChunkIndex, _to_vector
+from settings import settings
+from utills.db_utils import close_connection_pool, get_connection_pool
+
+TABLE_NAME = "bench_document_chunks"
+
+
+def make_chunks(count: int, dimensions: int) -> List[Document]:
+    return [
+        Document(
+            page_content=f"Chunk {i} of the benchmark document. " * 20,
+            metadata={"doc_id": f"doc-{i // 500}", "session_id": "bench", "page": i},
+        )
+        for i in range(count)
+    ]
+
+
+def insert_rows(
+    index: PGChunkIndex, documents: List[Document], embeddings: List[List[float]]
+) -> None:
+    """Row by row INSERTs, as the previous implementation did."""
+    with index.connection_pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.executemany(
+                sql.SQL(
+                    "INSERT INTO {} "
+                    "(id, doc_id, session_id, content, metadata, embedding) "
+                    "VALUES (%s, %s, %s, %s, %s, %s::vector)"
+                ).format(index.table),
+                [
+                    (
+                        str(uuid.uuid4()),
+                        doc.metadata["doc_id"],
+                        doc.metadata["session_id"],
+                        doc.page_content,
+                        Jsonb(doc.metadata),
+                        _to_vector(embedding),
+                    )
+                    for doc, embedding in zip(documents, embeddings)
+                ],
+            )
+
+
+def time_load(index: PGChunkIndex, load: Callable[[], None]) -> float:
+    index.clear()
+    start = time.perf_counter()
+    load()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=settings.ingestion_batch_size)
+    args = parser.parse_args()
+
+    dimensions = settings.embedding_size
+    index = PGChunkIndex(
+        FakeEmbeddings(size=dimensions), get_connection_pool(), table_name=TABLE_NAME
+    )
+    documents = make_chunks(args.chunks, dimensions)
+    embeddings = (
+        np.random.default_rng(0).normal(size=(args.chunks, dimensions)).tolist()
+    )
+    batches = [
+        (documents[i : i + args.batch_size], embeddings[i : i + args.batch_size])
+        for i in range(0, args.chunks, args.batch_size)
+    ]
+
+    def copy_batches() -> None:
+        for batch_documents, batch_embeddings in batches:
+            for doc in batch_documents:
+                doc.id = None
+            index.add_embeddings(batch_documents, batch_embeddings)
+
+    def copy_deferred() -> None:
+        with index.deferred_index():
+            copy_batches()
+
+    loads = {
+        "COPY, index maintained": copy_batches,
+        "COPY, index built afterwards": copy_deferred,
+        "INSERT, index maintained": lambda: [
+            insert_rows(index, *batch) for batch in batches
+        ],
+    }
+    print(f"{args.chunks} chunks of {dimensions} dimensions")
+    print(f"{'load':<32} {'seconds':>8} {'chunks/s':>10}")
+    try:
+        for name, load in loads.items():
+            seconds = time_load(index, load)
+            print(f"{name:<32} {seconds:>8.2f} {args.chunks / seconds:>10.0f}")
+    finally:
+        with index.connection_pool.connection() as conn:
+            conn.execute(sql.SQL("DROP TABLE {}").format(index.table))
+        close_connection_pool()
+
+
+if __name__ == "__main__":
+    main()
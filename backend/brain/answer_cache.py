@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from settings import settings
+
+
+@dataclass
+class _CachedAnswer:
+    embedding: np.ndarray  # normalised question embedding
+    answer: str
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """Answers to questions about a document, matched by question similarity.
+
+    A question whose embedding's cosine similarity to a cached question of the same
+    document is at least `threshold` gets the cached answer. Identical uploads share a
+    doc_id, so answers are shared by every session asking about the same PDF. Entries
+    expire after `ttl` seconds, and the least recently used are evicted beyond
+    `max_size` answers.
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.answer_cache_similarity_threshold,
+        max_size: int = settings.answer_cache_size,
+        ttl: float = settings.answer_cache_ttl,
+    ):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # doc_id -> normalised question -> answer
+        self._answers: Dict[str, Dict[str, _CachedAnswer]] = {}
+        # (doc_id, normalised question), least recently used first
+        self._lru: OrderedDict[Tuple[str, str], None] = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, doc_id: str, embedding: List[float]) -> Optional[str]:
+        """Return the answer to the most similar cached question, if similar enough."""
+        query = _normalise(embedding)
+        with self._lock:
+            answers = self._answers.get(doc_id, {})
+            now = time.monotonic()
+            for question in [q for q, a in answers.items() if a.expires_at <= now]:
+                self._remove(doc_id, question)
+            answers = self._answers.get(doc_id, {})
+            if answers:
+                questions = list(answers)
+                scores = np.stack([answers[q].embedding for q in questions]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._lru.move_to_end((doc_id, questions[best]))
+                    self._stats["hits"] += 1
+                    return answers[questions[best]].answer
+            self._stats["misses"] += 1
+        return None
+
+    def put(
+        self, doc_id: str, question: str, embedding: List[float], answer: str
+    ) -> None:
+        key = " ".join(question.split()).casefold()
+        with self._lock:
+            self._answers.setdefault(doc_id, {})[key] = _CachedAnswer(
+                embedding=_normalise(embedding),
+                answer=answer,
+                expires_at=time.monotonic() + self.ttl,
+            )
+            self._lru[(doc_id, key)] = None
+            self._lru.move_to_end((doc_id, key))
+            while len(self._lru) > self.max_size:
+                self._remove(*next(iter(self._lru)))
+
+    def stats(self) -> Dict[str, float]:
+        """Hit counts, hit rate and number of cached answers."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._lru))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _remove(self, doc_id: str, question: str) -> None:
+        del self._answers[doc_id][question]
+        if not self._answers[doc_id]:
+            del self._answers[doc_id]
+        del self._lru[(doc_id, question)]
+
+
+def _normalise(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+from brain.tokens import count_tokens_batch
+from repositories.chat_history import PostgresChatHistory
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChatMemory:
+    """Bounded, token-aware window over a chat history, with a rolling summary.
+
+    Only the last `max_turns` turns are read, with a LIMIT query, and the most recent
+    whole turns that fit in `max_tokens` are given to the prompt, so a question is
+    never separated from its answer. Every older turn, including those read but left
+    out for the token budget, is folded into a rolling summary, a few messages at a
+    time, once a turn has been answered. A turn's prompt size and latency therefore
+    stay constant as the session grows.
+    """
+
+    def __init__(
+        self,
+        llm: Optional[ChatOpenAI] = None,
+        max_turns: int = settings.history_max_turns,
+        max_tokens: int = settings.history_max_tokens,
+    ):
+        self.max_messages = 2 * max_turns  # a question and an answer per turn
+        self.max_tokens = max_tokens
+        self.summary_chain = (
+            ChatPromptTemplate.from_template(
+                "Progressively summarise the conversation between a user and an "
+                "assistant about a document. Add the new lines to the current "
+                "summary and return a new summary of at most 200 words, keeping "
+                "facts and names the user may refer back to.\n\n"
+                "Current summary:\n{summary}\n\nNew lines:\n{new_lines}\n\n"
+                "New summary:"
+            )
+            | (llm or ChatOpenAI(model=settings.llm_model, temperature=0))
+            | StrOutputParser()
+        )
+
+    def load(self, history: PostgresChatHistory) -> List[BaseMessage]:
+        """The messages to give the prompt: the summary, then the recent messages."""
+        summary, _ = history.get_summary()
+        messages = [
+            message
+            for _, message in self._window(
+                history.get_recent_messages(self.max_messages)
+            )
+        ]
+        if summary:
+            messages.insert(
+                0,
+                SystemMessage(
+                    content=f"Summary of the earlier conversation: {summary}"
+                ),
+            )
+        return messages
+
+    async def aupdate_summary(self, history: PostgresChatHistory) -> None:
+        """Fold the messages that have left the window into the rolling summary."""
+
+        def load():
+            summary, last_message_id = history.get_summary()
+            window = self._window(history.get_recent_messages(self.max_messages))
+            older = history.get_older_messages(
+                len(window), after_id=last_message_id, limit=self.max_messages
+            )
+            return summary, older
+
+        summary, older = await asyncio.to_thread(load)
+        if not older:
+            return
+        summary = await self.summary_chain.ainvoke(
+            {"summary": summary or "None", "new_lines": _format(older)}
+        )
+        await asyncio.to_thread(history.put_summary, summary, older[-1][0])
+        logger.info(f"Summarised {len(older)} messages of {history.session_id}")
+
+    def _window(
+        self, messages: List[Tuple[int, BaseMessage]]
+    ) -> List[Tuple[int, BaseMessage]]:
+        """The most recent whole turns whose content fits in the token budget."""
+        turns: List[List[Tuple[int, BaseMessage]]] = []
+        for id, message in messages:
+            if message.type == "human" or not turns:
+                turns.append([])
+            turns[-1].append((id, message))
+        if turns and turns[0][0][1].type != "human":
+            # The end of a turn cut by the LIMIT, its question is older
+            turns.pop(0)
+
+        tokens = iter(
+            count_tokens_batch(
+                [str(message.content) for turn in turns for _, message in turn]
+            )
+        )
+        turn_tokens = [sum(next(tokens) for _ in turn) for turn in turns]
+        window: List[Tuple[int, BaseMessage]] = []
+        total = 0
+        for turn, cost in zip(reversed(turns), reversed(turn_tokens)):
+            total += cost
+            if total > self.max_tokens:
+                break
+            window = turn + window
+        return window
+
+
+def _format(messages) -> str:
+    return "\n".join(f"{message.type}: {message.content}" for _, message in messages)
@@ -0,0 +1,128 @@
+import re
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
+
+from langchain_core.documents import Document
+
+from brain.tokens import count_tokens_batch
+from settings import settings
+
+
+@dataclass
+class _Span:
+    """Contiguous text of a page, merged from one or more retrieved chunks."""
+
+    text: str
+    source: Optional[str]
+    page: Optional[int]
+    start: Optional[int]
+    rank: int  # best retrieval rank of its chunks
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+
+class ContextPacker:
+    """Assemble retrieved chunks into the prompt context, within a token budget.
+
+    Chunks of the same page that overlap or are adjacent, by their `start_index`, are
+    merged back into contiguous spans, so the text chunks share through the splitter's
+    overlap is only sent once. Spans whose word shingles are at least
+    `dedup_threshold` similar to a better ranked span are dropped. The best ranked
+    spans that fit in `max_tokens` are kept and given in page order.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = settings.context_max_tokens,
+        dedup_threshold: float = settings.context_dedup_threshold,
+        separator: str = "\n\n",
+    ):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.separator = separator
+
+    def pack(self, docs: List[Document]) -> str:
+        """The context for the documents, ranked best first, as a single string."""
+        spans = self._deduplicate(self._merge(docs))
+        spans.sort(key=lambda span: span.rank)
+
+        budget = self.max_tokens
+        separator_tokens = count_tokens_batch([self.separator])[0]
+        packed = []
+        for span, tokens in zip(spans, count_tokens_batch([s.text for s in spans])):
+            cost = tokens + (separator_tokens if packed else 0)
+            if cost <= budget:
+                packed.append(span)
+                budget -= cost
+
+        packed.sort(key=_reading_order)
+        return self.separator.join(span.text for span in packed)
+
+    def _merge(self, docs: List[Document]) -> List[_Span]:
+        """Merge the overlapping and adjacent chunks of each page into spans."""
+        chunks = [
+            _Span(
+                text=doc.page_content,
+                source=doc.metadata.get("source"),
+                page=doc.metadata.get("page"),
+                start=doc.metadata.get("start_index"),
+                rank=rank,
+            )
+            for rank, doc in enumerate(docs)
+        ]
+        spans: List[_Span] = []
+        for chunk in sorted(chunks, key=_reading_order):
+            previous = spans[-1] if spans else None
+            if (
+                previous is not None
+                and chunk.start is not None
+                and previous.start is not None
+                and (chunk.source, chunk.page) == (previous.source, previous.page)
+                and chunk.start <= previous.end
+            ):
+                # Only the part of the chunk past the end of the span is new
+                previous.text += chunk.text[previous.end - chunk.start :]
+                previous.rank = min(previous.rank, chunk.rank)
+            else:
+                spans.append(chunk)
+        return spans
+
+    def _deduplicate(self, spans: List[_Span]) -> List[_Span]:
+        """Drop spans nearly identical to a better ranked span."""
+        kept: List[_Span] = []
+        kept_shingles: List[FrozenSet[str]] = []
+        for span in sorted(spans, key=lambda span: span.rank):
+            shingles = _shingles(span.text)
+            if any(
+                _jaccard(shingles, other) >= self.dedup_threshold
+                for other in kept_shingles
+            ):
+                continue
+            kept.append(span)
+            kept_shingles.append(shingles)
+        return kept
+
+
+def _reading_order(span: _Span):
+    # Spans without a page or offset keep their retrieval order after the others
+    return (
+        span.source or "",
+        span.page if span.page is not None else float("inf"),
+        span.start if span.start is not None else float("inf"),
+        span.rank,
+    )
+
+
+def _shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    words = re.findall(r"\w+", text.casefold())
+    if len(words) <= size:
+        return frozenset([" ".join(words)])
+    return frozenset(
+        " ".join(words[i : i + size]) for i in range(len(words) - size + 1)
+    )
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
@@ -1,6 +1,184 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import logging
+import multiprocessing
+import re
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import fitz
+from langchain.schema import Document
 from langchain_community.document_loaders import PyMuPDFLoader
 
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def parse_page_range(file_path: str, start: int, stop: int) -> List[Document]:
+    """
+    Extract pages [start, stop) of a PDF with PyMuPDF, with the same content and
+    metadata as PyMuPDFLoader. Runs in a worker process, which opens the file itself.
+    """
+    with fitz.open(file_path) as pdf:
+        pdf_metadata = {
+            key: value
+            for key, value in pdf.metadata.items()
+            if isinstance(value, (str, int))
+        }
+        return [
+            Document(
+                page_content=pdf[number].get_text(),
+                metadata={
+                    "source": file_path,
+                    "file_path": file_path,
+                    "page": number,
+                    "total_pages": len(pdf),
+                    **pdf_metadata,
+                },
+            )
+            for number in range(start, stop)
+        ]
+
+
+class SentenceChunker:
+    """
+    Drop-in replacement for RecursiveCharacterTextSplitter, for literal separators.
+
+    Produces the same chunks (separators kept at the start of each split), but works
+    on offsets into the page text: each separator's positions are found with a single
+    scan, splits and overlapping merges are (start, end) pairs, and only the final
+    chunks are sliced out of the text. Chunks get their `start_index` in the page.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 4000,
+        chunk_overlap: int = 200,
+        separators: Optional[List[str]] = None,
+        add_start_index: bool = True,
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size "
+                f"({chunk_size}), should be smaller."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or ["\n\n", "\n", " "]
+        if "" in self.separators:
+            raise ValueError("SentenceChunker only supports non-empty separators")
+        self.add_start_index = add_start_index
+        self._patterns = [re.compile(re.escape(sep)) for sep in self.separators]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Split each document into chunks, keeping its metadata."""
+        chunks = []
+        for doc in documents:
+            text = doc.page_content
+            for start, end in self.split_offsets(text):
+                metadata = dict(doc.metadata)
+                if self.add_start_index:
+                    metadata["start_index"] = start
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Return the (start, end) offsets of the chunks of a text."""
+        chunks: List[Tuple[int, int]] = []
+        self._split_range(text, 0, len(text), 0, {}, chunks)
+        return chunks
+
+    def _split_range(
+        self,
+        text: str,
+        start: int,
+        end: int,
+        level: int,
+        positions: Dict[str, List[int]],
+        chunks: List[Tuple[int, int]],
+    ) -> None:
+        """Split text[start:end] on the first separator, from `level`, it contains."""
+        boundaries: List[int] = []
+        next_level = len(self.separators)
+        for i in range(level, len(self.separators)):
+            separator = self.separators[i]
+            if separator not in positions:
+                # Each separator's positions are found once, and only if needed
+                positions[separator] = [
+                    match.start() for match in self._patterns[i].finditer(text)
+                ]
+            lo = bisect_left(positions[separator], start)
+            hi = bisect_left(positions[separator], end)
+            if lo < hi:
+                boundaries = positions[separator][lo:hi]
+                next_level = i + 1
+                break
+
+        # Each split starts at a separator, empty splits are dropped
+        splits = [
+            (split_start, split_end)
+            for split_start, split_end in zip([start, *boundaries], [*boundaries, end])
+            if split_start < split_end
+        ]
+
+        # Runs of small splits are merged, long splits are split further
+        run: List[Tuple[int, int]] = []
+        for split_start, split_end in splits:
+            if split_end - split_start < self.chunk_size:
+                run.append((split_start, split_end))
+                continue
+            if run:
+                self._merge(text, run, chunks)
+                run = []
+            if next_level < len(self.separators):
+                self._split_range(
+                    text, split_start, split_end, next_level, positions, chunks
+                )
+            else:
+                # Kept whole and, like RecursiveCharacterTextSplitter, untrimmed
+                chunks.append((split_start, split_end))
+        if run:
+            self._merge(text, run, chunks)
+
+    def _merge(
+        self,
+        text: str,
+        splits: List[Tuple[int, int]],
+        chunks: List[Tuple[int, int]],
+    ) -> None:
+        """
+        Merge contiguous splits into chunks of up to chunk_size, with overlap. As the
+        splits are contiguous, the length of a window of splits is just the distance
+        from its first start to its last end.
+        """
+        first = 0
+        for i, (_, split_end) in enumerate(splits):
+            if first < i and split_end - splits[first][0] > self.chunk_size:
+                window_end = splits[i - 1][1]
+                self._add_chunk(text, splits[first][0], window_end, chunks)
+                # Keep the trailing splits, up to chunk_overlap, for the next chunk
+                while first < i and (
+                    window_end - splits[first][0] > self.chunk_overlap
+                    or split_end - splits[first][0] > self.chunk_size
+                ):
+                    first += 1
+        if first < len(splits):
+            self._add_chunk(text, splits[first][0], splits[-1][1], chunks)
+
+    def _add_chunk(
+        self, text: str, start: int, end: int, chunks: List[Tuple[int, int]]
+    ) -> None:
+        """Add the chunk with surrounding whitespace trimmed, unless it's empty."""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            chunks.append((start, end))
+
 
 class DocumentProcessor:
     DEFAULT_SPLITTER_KWARGS = {
@@ -12,8 +190,10 @@ class DocumentProcessor:
     def __init__(
         self,
         document_loader=PyMuPDFLoader,
-        text_splitter=RecursiveCharacterTextSplitter,
+        text_splitter=SentenceChunker,
         text_splitter_kwargs=None,
+        parse_workers: int = settings.pdf_parse_workers,
+        min_pages_per_worker: int = settings.pdf_min_pages_per_worker,
     ) -> None:
         self.document_loader = document_loader
         self.text_splitter = text_splitter
@@ -24,14 +204,81 @@ class DocumentProcessor:
             **(text_splitter_kwargs or {}),
         }
 
+        # PyMuPDF parsing is split across processes for PDFs with enough pages
+        self.parse_workers = parse_workers
+        self.min_pages_per_worker = min_pages_per_worker
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+
     def load_pdf(self, file_path: str) -> list:
         """Load a PDF file into a list of pages."""
+        if self._parses_in_parallel():
+            return list(self._iter_pages_parallel(file_path))
         loader_py = self.document_loader(file_path)
         pages_py = loader_py.load()
         return pages_py
 
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
+        """Yield the pages of a PDF file as they are parsed."""
+        if self._parses_in_parallel():
+            yield from self._iter_pages_parallel(file_path)
+        else:
+            yield from self.document_loader(file_path).lazy_load()
+
     def chunk_docs(self, pages: list) -> list:
         """Chunk a list of pages into a list of documents."""
         text_splitter = self.text_splitter(**self.text_splitter_kwargs)
         docs = text_splitter.split_documents(pages)
         return docs
+
+    def iter_chunks(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """Yield the chunks of each page as soon as the page is available."""
+        text_splitter = self.text_splitter(**self.text_splitter_kwargs)
+        for page in pages:
+            yield from text_splitter.split_documents([page])
+
+    def close(self) -> None:
+        """Shut down the parsing worker processes, if they were started."""
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown()
+            self._parse_pool = None
+
+    def _parses_in_parallel(self) -> bool:
+        return self.parse_workers > 1 and self.document_loader is PyMuPDFLoader
+
+    def _iter_pages_parallel(self, file_path: str) -> Iterator[Document]:
+        """Parse contiguous page ranges in worker processes, yielded in page order."""
+        with fitz.open(file_path) as pdf:
+            page_count = len(pdf)
+
+        workers = min(self.parse_workers, page_count // self.min_pages_per_worker)
+        if workers <= 1:
+            yield from parse_page_range(file_path, 0, page_count)
+            return
+
+        # A few ranges per worker, so one slow range doesn't leave the others idle
+        range_size = -(-page_count // (workers * 4))
+        ranges = [
+            (start, min(start + range_size, page_count))
+            for start in range(0, page_count, range_size)
+        ]
+        logger.info(
+            f"Parsing {page_count} pages in {len(ranges)} ranges on {workers} workers"
+        )
+        pool = self._get_parse_pool()
+        results = pool.map(
+            parse_page_range,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges],
+        )
+        for pages in results:
+            yield from pages
+
+    def _get_parse_pool(self) -> ProcessPoolExecutor:
+        if self._parse_pool is None:
+            # Spawned rather than forked, the API process runs threads
+            self._parse_pool = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._parse_pool
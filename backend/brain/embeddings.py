@@ -0,0 +1,419 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from psycopg import sql
+from psycopg_pool import ConnectionPool
+
+from brain.tokens import count_tokens_batch
+from settings import settings
+from utills.db_utils import get_connection_pool
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache(ABC):
+    """Content-hash keyed store of embeddings, shared across uploads."""
+
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached embeddings for the keys that are present"""
+        pass
+
+    @abstractmethod
+    def put_many(self, embeddings: Dict[str, List[float]]) -> None:
+        """Store embeddings by key"""
+        pass
+
+
+class InMemoryEmbeddingCache(EmbeddingCache):
+    """In-memory implementation of EmbeddingCache for testing."""
+
+    def __init__(self):
+        self._embeddings: Dict[str, List[float]] = {}
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        return {key: self._embeddings[key] for key in keys if key in self._embeddings}
+
+    def put_many(self, embeddings: Dict[str, List[float]]) -> None:
+        self._embeddings.update(embeddings)
+
+
+class LocalEmbeddingCache(EmbeddingCache):
+    """SQLite file backed EmbeddingCache, e.g. in /tmp to survive warm Lambda invocations.
+
+    Holds at most `max_rows` embeddings, the least recently used are pruned first.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.embedding_cache_path,
+        max_rows: int = settings.embedding_cache_max_rows,
+    ):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, embedding BLOB, last_used REAL DEFAULT 0)"
+            )
+            columns = [
+                row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")
+            ]
+            if "last_used" not in columns:
+                # Caches written before pruning was added
+                self._conn.execute(
+                    "ALTER TABLE embeddings ADD COLUMN last_used REAL DEFAULT 0"
+                )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+        logger.info(f"Using local embedding cache at {path}")
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock, self._conn:
+            # Stay well under SQLite's bound parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    "SELECT key, embedding FROM embeddings "
+                    f"WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(
+                    (key, np.frombuffer(blob, dtype=np.float32).tolist())
+                    for key, blob in rows
+                )
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key in found],
+                )
+        return found
+
+    def put_many(self, embeddings: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) "
+                "VALUES (?, ?, ?)",
+                [
+                    (key, np.asarray(embedding, dtype=np.float32).tobytes(), now)
+                    for key, embedding in embeddings.items()
+                ],
+            )
+            (rows,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if rows > self.max_rows:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used, rowid LIMIT ?)",
+                    (rows - self.max_rows,),
+                )
+
+
+class PostgresEmbeddingCache(EmbeddingCache):
+    """Postgres backed EmbeddingCache, shared by every instance of the API."""
+
+    def __init__(
+        self,
+        connection_pool: Optional[ConnectionPool] = None,
+        table_name: str = "embedding_cache",
+    ):
+        self.connection_pool = connection_pool or get_connection_pool()
+        self.table = sql.Identifier(table_name)
+        with self.connection_pool.connection() as conn:
+            conn.execute(
+                sql.SQL(
+                    """
+                    CREATE TABLE IF NOT EXISTS {} (
+                        key TEXT PRIMARY KEY,
+                        embedding REAL[] NOT NULL
+                    )
+                    """
+                ).format(self.table)
+            )
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        with self.connection_pool.connection() as conn:
+            rows = conn.execute(
+                sql.SQL("SELECT key, embedding FROM {} WHERE key = ANY(%s)").format(
+                    self.table
+                ),
+                (keys,),
+            ).fetchall()
+        return {key: embedding for key, embedding in rows}
+
+    def put_many(self, embeddings: Dict[str, List[float]]) -> None:
+        with self.connection_pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.executemany(
+                    sql.SQL(
+                        """
+                        INSERT INTO {} (key, embedding) VALUES (%s, %s)
+                        ON CONFLICT (key) DO NOTHING
+                        """
+                    ).format(self.table),
+                    list(embeddings.items()),
+                )
+
+
+class QueryEmbeddingCache:
+    """LRU cache of query embeddings with a time to live, over an optional shared tier.
+
+    The in-process tier answers repeated questions without any network hop. On a miss
+    the shared tier, e.g. a PostgresEmbeddingCache, is tried before the embeddings API.
+    Its entries don't expire, keys include the embedding model.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.query_embedding_cache_size,
+        ttl: float = settings.query_embedding_cache_ttl,
+        shared: Optional[EmbeddingCache] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._lock = threading.Lock()
+        # key -> (expiry time, embedding), least recently used first
+        self._entries: OrderedDict[str, Tuple[float, List[float]]] = OrderedDict()
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0}
+
+    def get(self, key: str) -> Optional[List[float]]:
+        embedding = self._get_local(key)
+        if embedding is None and self.shared is not None:
+            embedding = self._get_shared(key)
+        return embedding
+
+    async def aget(self, key: str) -> Optional[List[float]]:
+        embedding = self._get_local(key)
+        if embedding is None and self.shared is not None:
+            embedding = await asyncio.to_thread(self._get_shared, key)
+        return embedding
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        self._put_local(key, embedding)
+        if self.shared is not None:
+            self.shared.put_many({key: embedding})
+
+    async def aput(self, key: str, embedding: List[float]) -> None:
+        self._put_local(key, embedding)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.put_many, {key: embedding})
+
+    def stats(self) -> Dict[str, float]:
+        """Hit counts per tier and the overall hit rate."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+    def _get_local(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            if self.shared is None:
+                self._stats["misses"] += 1
+        return None
+
+    def _get_shared(self, key: str) -> Optional[List[float]]:
+        embedding = self.shared.get_many([key]).get(key)
+        with self._lock:
+            self._stats["shared_hits" if embedding is not None else "misses"] += 1
+        if embedding is not None:
+            self._put_local(key, embedding)
+        return embedding
+
+    def _put_local(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that batches, parallelises and caches document embeddings.
+
+    Texts are keyed by a hash of the embedding model and their content, so identical
+    chunks (re-uploads, chunks shared across versions of a PDF) are only embedded once.
+    Cache misses are sent to the wrapped embeddings in batches of `batch_size`, with at
+    most `max_concurrency` requests in flight. Queries are cached separately, keyed by
+    their normalised text, in `query_cache`.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = settings.embedding_batch_size,
+        max_concurrency: int = settings.embedding_max_concurrency,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.query_cache = query_cache
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # In-flight query embeddings keyed like the query cache
+        self._query_jobs: Dict[str, asyncio.Task] = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "chunks": 0,
+            "cached_chunks": 0,
+            "embedded_chunks": 0,
+            "embedded_tokens": 0,
+            "embedding_seconds": 0.0,
+        }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            start = time.perf_counter()
+            results = self._executor.map(
+                self.embeddings.embed_documents, self._batches(missing)
+            )
+            embeddings = [embedding for batch in results for embedding in batch]
+            self._store(found, missing, embeddings, start)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            start = time.perf_counter()
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def embed(batch: List[str]) -> List[List[float]]:
+                async with semaphore:
+                    return await self.embeddings.aembed_documents(batch)
+
+            results = await asyncio.gather(
+                *[embed(batch) for batch in self._batches(missing)]
+            )
+            embeddings = [embedding for batch in results for embedding in batch]
+            await asyncio.to_thread(self._store, found, missing, embeddings, start)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self.embeddings.embed_query(text)
+        key = self._query_key(text)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.query_cache.put(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a query, concurrent calls for the same query share one request."""
+        if self.query_cache is None:
+            return await self.embeddings.aembed_query(text)
+        key = self._query_key(text)
+        embedding = await self.query_cache.aget(key)
+        if embedding is not None:
+            return embedding
+
+        job = self._query_jobs.get(key)
+        if job is None:
+
+            async def embed() -> List[float]:
+                embedding = await self.embeddings.aembed_query(text)
+                await self.query_cache.aput(key, embedding)
+                return embedding
+
+            def on_done(task: asyncio.Task) -> None:
+                self._query_jobs.pop(key, None)
+                if not task.cancelled():
+                    task.exception()  # Retrieved, even if every caller was cancelled
+
+            job = asyncio.create_task(embed())
+            job.add_done_callback(on_done)
+            self._query_jobs[key] = job
+        # Shielded so one cancelled caller doesn't cancel the shared request
+        return await asyncio.shield(job)
+
+    def stats(self) -> Dict[str, float]:
+        """Cache hit counts and embedding throughput, and the query cache's hit rate."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        seconds = stats["embedding_seconds"]
+        stats["chunks_per_second"] = (
+            stats["embedded_chunks"] / seconds if seconds else 0.0
+        )
+        stats["tokens_per_second"] = (
+            stats["embedded_tokens"] / seconds if seconds else 0.0
+        )
+        if self.query_cache is not None:
+            stats["query_cache"] = self.query_cache.stats()
+        return stats
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    def _query_key(self, text: str) -> str:
+        """Key of the query, ignoring case and whitespace differences."""
+        return self._key(" ".join(text.split()).casefold())
+
+    def _lookup(
+        self, texts: List[str]
+    ) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        """Return every text's key, the cached embeddings and the unique uncached texts."""
+        keys = [self._key(text) for text in texts]
+        found = self.cache.get_many(list(set(keys))) if self.cache else {}
+        # Identical texts within the same call are only embedded once too
+        missing = list(
+            {key: text for key, text in zip(keys, texts) if key not in found}.values()
+        )
+        with self._stats_lock:
+            self._stats["chunks"] += len(texts)
+            self._stats["cached_chunks"] += len(texts) - len(missing)
+        return keys, found, missing
+
+    def _store(
+        self,
+        found: Dict[str, List[float]],
+        texts: List[str],
+        embeddings: List[List[float]],
+        start: float,
+    ) -> None:
+        """Record throughput, and add the new embeddings to `found` and the cache."""
+        seconds = time.perf_counter() - start
+        tokens = sum(count_tokens_batch(texts))
+        with self._stats_lock:
+            self._stats["embedding_seconds"] += seconds
+            self._stats["embedded_chunks"] += len(texts)
+            self._stats["embedded_tokens"] += tokens
+
+        new = {self._key(text): embedding for text, embedding in zip(texts, embeddings)}
+        found.update(new)
+        if self.cache:
+            self.cache.put_many(new)
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
@@ -1,9 +1,16 @@
-from typing import Literal
+import math
+import re
+import statistics
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Literal, Tuple
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from settings import settings
+
 
 class RouteQuery(BaseModel):
     """Route a user query to the most relevant task/action."""
@@ -14,14 +21,13 @@ class RouteQuery(BaseModel):
     )
 
 
-# TODO: Could this be a class or would it be overkill ?
 def create_router():
     """Create a router that directs user queries to appropriate actions.
 
     Returns:
         A router chain that processes queries and returns structured output.
     """
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    llm = ChatOpenAI(model=settings.llm_model, temperature=0)
     structured_llm = llm.with_structured_output(RouteQuery)
 
     system_prompt = """You are an expert at routing user queries to the most relevant task/action.
@@ -52,3 +58,211 @@ def create_router():
 
     router = prompt | structured_llm
     return router
+
+
+# Labelled prototype queries for the local routing stage. They are kept generic, so
+# they hold for any uploaded document: summary prototypes ask about the document as a
+# whole, while questions narrowed to a topic ("... about", "... in section") are
+# q_and_a prototypes, even when they start like a summary request
+ROUTE_PROTOTYPES = {
+    "summary": [
+        "what is this document about",
+        "what is the paper about",
+        "summarize this document",
+        "summarise this report",
+        "give me a summary",
+        "can you summarize it",
+        "sum up the article",
+        "give me an overview",
+        "a high level overview of the document",
+        "what are the main findings",
+        "what are the key points",
+        "what are the key takeaways",
+        "what are the main conclusions",
+        "what is the main argument",
+        "what is the gist of it",
+        "what is the purpose of this document",
+        "what does this document cover",
+        "tldr",
+        "tl dr",
+    ],
+    "q_and_a": [
+        "what are the main findings about",
+        "what are the key points on",
+        "what does the document say about",
+        "what does the author conclude about",
+        "summarize section",
+        "what does section say",
+        "what is shown in figure",
+        "what does table show",
+        "who are the authors",
+        "who wrote this",
+        "can you elaborate on that",
+        "tell me more about that",
+        "can you explain that further",
+        "what do you mean",
+        "what did i ask you before",
+        "what was your previous answer",
+        "what did we talk about earlier",
+        "what is the definition of",
+        "how is it calculated",
+        "how many were there",
+        "when does it expire",
+        "which methods were used",
+        "why did it happen",
+        "how do i",
+        "is it true that",
+        "what is the clause on",
+    ],
+}
+
+
+class PrototypeClassifier:
+    """Local query classifier scoring a query against labelled prototype queries.
+
+    Queries are represented as TF-IDF weighted unigrams and bigrams, and each label is
+    scored by its most similar prototype (cosine similarity). Confidence is the margin
+    between the best and second best label, so ambiguous queries score close to zero.
+    """
+
+    def __init__(self, prototypes: Dict[str, List[str]]):
+        features = [
+            (label, self._features(text))
+            for label, texts in prototypes.items()
+            for text in texts
+        ]
+        document_frequency = Counter(
+            feature for _, counts in features for feature in counts
+        )
+        n_docs = len(features)
+        self.idf = {
+            feature: math.log((1 + n_docs) / (1 + df)) + 1
+            for feature, df in document_frequency.items()
+        }
+        self.labels = list(prototypes)
+        self.prototypes = [
+            (label, self._vectorise(counts)) for label, counts in features
+        ]
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        """Return the most likely label and the confidence margin for a query."""
+        vector = self._vectorise(self._features(query))
+        scores = {label: 0.0 for label in self.labels}
+        for label, prototype in self.prototypes:
+            similarity = sum(
+                weight * prototype.get(feature, 0.0)
+                for feature, weight in vector.items()
+            )
+            scores[label] = max(scores[label], similarity)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_label, best_score), (_, second_score) = ranked[0], ranked[1]
+        return best_label, best_score - second_score
+
+    def _features(self, text: str) -> Counter:
+        tokens = re.findall(r"[a-z0-9]+", text.lower())
+        bigrams = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return Counter(tokens + bigrams)
+
+    def _vectorise(self, counts: Counter) -> Dict[str, float]:
+        # Unseen features carry no prototype signal, so they are dropped
+        vector = {
+            feature: (1 + math.log(count)) * self.idf[feature]
+            for feature, count in counts.items()
+            if feature in self.idf
+        }
+        norm = math.sqrt(sum(weight**2 for weight in vector.values()))
+        return (
+            {feature: weight / norm for feature, weight in vector.items()}
+            if norm
+            else {}
+        )
+
+
+class QueryRouter:
+    """Routes user queries, only calling the LLM router when the local stage is unsure.
+
+    The local stage only short-circuits to q_and_a. A summary skips retrieval and
+    answers with the whole-document summary, so misrouting a question narrowed to a
+    topic ("give me an overview of the incentive mechanism") loses the answer, while
+    answering a summary request by retrieval still gives a relevant answer. Queries
+    the classifier takes for summaries are therefore always confirmed by the LLM.
+
+    Tracks how often the local stage short-circuited the LLM call and the latency that
+    saved. Each avoided LLM call is estimated to have taken as long as the LLM routing
+    calls that did happen, so the saved latency percentiles are those of the observed
+    LLM routing latencies, less the typical local routing latency.
+    """
+
+    def __init__(
+        self,
+        llm_router=None,
+        classifier: PrototypeClassifier | None = None,
+        confidence_threshold: float = settings.router_confidence_threshold,
+        max_samples: int = 1000,
+    ):
+        self.llm_router = llm_router or create_router()
+        self.classifier = classifier or PrototypeClassifier(ROUTE_PROTOTYPES)
+        self.confidence_threshold = confidence_threshold
+        self.short_circuits = 0
+        self.llm_calls = 0
+        self._local_latencies: Deque[float] = deque(maxlen=max_samples)
+        self._llm_latencies: Deque[float] = deque(maxlen=max_samples)
+
+    def invoke(self, query: str) -> RouteQuery:
+        route = self._route_locally(query)
+        if route is not None:
+            return route
+
+        start = time.perf_counter()
+        route = self.llm_router.invoke(query)
+        self._record_llm_call(time.perf_counter() - start)
+        return route
+
+    async def ainvoke(self, query: str) -> RouteQuery:
+        route = self._route_locally(query)
+        if route is not None:
+            return route
+
+        start = time.perf_counter()
+        route = await self.llm_router.ainvoke(query)
+        self._record_llm_call(time.perf_counter() - start)
+        return route
+
+    def stats(self) -> Dict[str, float]:
+        """Short-circuit rate and estimated latency saved per local route and in total."""
+        total = self.short_circuits + self.llm_calls
+        stats = {
+            "short_circuits": self.short_circuits,
+            "llm_calls": self.llm_calls,
+            "short_circuit_rate": self.short_circuits / total if total else 0.0,
+        }
+        if self._llm_latencies and self._local_latencies:
+            avoided = sorted(self._llm_latencies)
+            local = statistics.median(self._local_latencies)
+            stats["saved_seconds_p50"] = max(_percentile(avoided, 50) - local, 0.0)
+            stats["saved_seconds_p95"] = max(_percentile(avoided, 95) - local, 0.0)
+            stats["saved_seconds_total"] = self.short_circuits * max(
+                statistics.mean(avoided) - statistics.mean(self._local_latencies), 0.0
+            )
+        return stats
+
+    def _route_locally(self, query: str) -> RouteQuery | None:
+        start = time.perf_counter()
+        task, confidence = self.classifier.predict(query)
+        if task != "q_and_a" or confidence < self.confidence_threshold:
+            return None
+
+        self.short_circuits += 1
+        self._local_latencies.append(time.perf_counter() - start)
+        return RouteQuery(task=task)
+
+    def _record_llm_call(self, latency: float) -> None:
+        self.llm_calls += 1
+        self._llm_latencies.append(latency)
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(math.ceil(percentile / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
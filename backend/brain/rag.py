@@ -1,15 +1,19 @@
-from typing import List
+from operator import itemgetter
+from typing import AsyncIterator, List, Optional
 
-from langchain_community.chat_message_histories import PostgresChatMessageHistory
+from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 
-from repositories.vector_db import VectorStoreRetriever
+from brain.context import ContextPacker
+from settings import settings
 
 
 class RAGChain:
-    def __init__(self):
+    def __init__(self, context_packer: Optional[ContextPacker] = None):
         self.template = """
         Answer the question based on the following document and chat history.
         If you don't know the answer, just say that you don't know, don't try to make up an answer.
@@ -24,20 +28,50 @@ class RAGChain:
         Current Question: {question}
         """
         self.prompt = ChatPromptTemplate.from_template(self.template)
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+        self.llm = ChatOpenAI(model=settings.llm_model, temperature=0)
+        self.context_packer = context_packer or ContextPacker()
 
-    def run(
+    async def arun(
         self,
         query: str,
-        retriever: VectorStoreRetriever,
+        retriever: BaseRetriever,
         messages: List,
+        documents: Optional[List[Document]] = None,
     ):
-        # Create the chain at runtime with the provided retriever
-        chain = (
+        """Answer the question, skipping retrieval if `documents` were already retrieved."""
+        chain = self._build_chain(retriever, documents)
+        return await chain.ainvoke({"question": query, "chat_history": messages})
+
+    async def astream(
+        self,
+        query: str,
+        retriever: BaseRetriever,
+        messages: List,
+        documents: Optional[List[Document]] = None,
+    ) -> AsyncIterator[str]:
+        """Asynchronously yield the answer token by token as the LLM produces it."""
+        chain = self._build_chain(retriever, documents)
+        async for token in chain.astream({"question": query, "chat_history": messages}):
+            yield token
+
+    def _build_chain(
+        self,
+        retriever: BaseRetriever,
+        documents: Optional[List[Document]] = None,
+    ):
+        # Create the chain at runtime with the provided retriever. The retriever is
+        # composed as a runnable so the async entrypoints also retrieve asynchronously.
+        if documents is not None:
+            context = RunnableLambda(lambda _: self._combine_documents(documents))
+        else:
+            context = (
+                itemgetter("question")
+                | retriever
+                | RunnableLambda(self._combine_documents)
+            )
+        return (
             {
-                "context": lambda x: self._combine_documents(
-                    retriever.invoke(x["question"])
-                ),
+                "context": context,
                 "chat_history": lambda x: self._format_messages(x["chat_history"]),
                 "question": lambda x: x["question"],
             }
@@ -45,14 +79,13 @@ class RAGChain:
             | self.llm
             | StrOutputParser()
         )
-        return chain.invoke({"question": query, "chat_history": messages})
 
     def _format_messages(self, messages: List) -> str:
-        """Format messages from PostgresChatMessageHistory."""
+        """Format the chat history messages."""
         if not messages:
             return "No previous conversation."
         return "\n".join([f"{msg.type}: {msg.content}" for msg in messages])
 
     def _combine_documents(self, docs):
-        """Combine multiple documents into a single string."""
-        return "\n\n".join([doc.page_content for doc in docs])
+        """Combine the documents into the context, merged and within the budget."""
+        return self.context_packer.pack(docs)
@@ -1,14 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
 from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.schema import Document
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
+from brain.document_processing import DocumentProcessor
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the summary prompts change, cached summaries are keyed by it
+SUMMARY_PROMPT_VERSION = "2"
+
+
+class HierarchicalSummariser:
+    """Map-reduce summariser for documents larger than a single prompt.
+
+    The document is split into sections which are summarised concurrently (bounded by
+    `max_concurrency`), then the section summaries are combined in groups of
+    `reduce_fanout`, level by level, until a single summary remains. Intermediate
+    summaries are cached per doc_id so a retried or repeated summary only pays for the
+    levels that haven't been computed yet, until the final summary is produced. Only
+    the `cache_documents` most recently summarised documents are kept, for at most
+    `cache_ttl` seconds, so failed summaries don't accumulate.
+    """
+
+    def __init__(
+        self,
+        llm: ChatOpenAI,
+        section_chars: int = settings.summary_section_chars,
+        reduce_fanout: int = settings.summary_reduce_fanout,
+        max_concurrency: int = settings.summary_max_concurrency,
+        cache_documents: int = settings.summary_cache_documents,
+        cache_ttl: float = settings.summary_cache_ttl,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.map_chain = (
+            ChatPromptTemplate.from_template(
+                "Summarize this section of a larger document: {context}"
+            )
+            | llm
+            | StrOutputParser()
+        )
+        self.reduce_chain = (
+            ChatPromptTemplate.from_template(
+                "Combine these summaries of consecutive sections of a document into "
+                "a single coherent summary: {context}"
+            )
+            | llm
+            | StrOutputParser()
+        )
+        self.document_processor = DocumentProcessor(
+            text_splitter_kwargs={"chunk_size": section_chars, "chunk_overlap": 0}
+        )
+        self.reduce_fanout = reduce_fanout
+        self.max_concurrency = max_concurrency
+        self.cache_documents = cache_documents
+        self.cache_ttl = cache_ttl
+        self.clock = clock
+        # doc_id -> (expiry time, intermediate summaries keyed by (level, index)),
+        # least recently used first
+        self._cache: OrderedDict[str, Tuple[float, Dict[Tuple[int, int], str]]] = (
+            OrderedDict()
+        )
+
+    async def arun(
+        self, documents: List[Document], doc_id: Optional[str] = None
+    ) -> str:
+        summaries = await self._summarise_to_fanout(documents, doc_id)
+        summary = await self.reduce_chain.ainvoke({"context": _join(summaries)})
+        self.clear(doc_id)
+        return summary
+
+    async def astream(
+        self, documents: List[Document], doc_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Summarise the sections, then stream the final reduce step."""
+        summaries = await self._summarise_to_fanout(documents, doc_id)
+        async for token in self.reduce_chain.astream({"context": _join(summaries)}):
+            yield token
+        self.clear(doc_id)
+
+    def clear(self, doc_id: str) -> None:
+        """Drop the cached intermediate summaries of a document."""
+        self._cache.pop(doc_id, None)
+
+    def _document_cache(self, doc_id: str) -> Dict[Tuple[int, int], str]:
+        """The intermediate summaries of a document, evicting expired and old ones."""
+        now = self.clock()
+        for expired in [
+            key for key, (expiry, _) in self._cache.items() if expiry <= now
+        ]:
+            del self._cache[expired]
+        _, summaries = self._cache.pop(doc_id, (None, {}))
+        self._cache[doc_id] = (now + self.cache_ttl, summaries)
+        while len(self._cache) > self.cache_documents:
+            self._cache.popitem(last=False)
+        return summaries
+
+    async def _summarise_to_fanout(
+        self, documents: List[Document], doc_id: Optional[str]
+    ) -> List[str]:
+        """Map the sections, then reduce level by level until one final group remains."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        cache = self._document_cache(doc_id) if doc_id is not None else {}
+        sections = self.document_processor.chunk_docs(documents)
+        logger.info(f"Summarising {len(sections)} sections of document {doc_id}")
+
+        summaries = await self._summarise_level(
+            self.map_chain,
+            [section.page_content for section in sections],
+            cache,
+            0,
+            semaphore,
+        )
+        level = 1
+        while len(summaries) > self.reduce_fanout:
+            groups = [
+                _join(summaries[i : i + self.reduce_fanout])
+                for i in range(0, len(summaries), self.reduce_fanout)
+            ]
+            summaries = await self._summarise_level(
+                self.reduce_chain, groups, cache, level, semaphore
+            )
+            level += 1
+        return summaries
+
+    async def _summarise_level(
+        self,
+        chain,
+        texts: List[str],
+        cache: Dict[Tuple[int, int], str],
+        level: int,
+        semaphore: asyncio.Semaphore,
+    ) -> List[str]:
+        async def summarise(index: int, text: str) -> str:
+            key = (level, index)
+            if key in cache:
+                return cache[key]
+            async with semaphore:
+                summary = await chain.ainvoke({"context": text})
+            cache[key] = summary
+            return summary
+
+        return await asyncio.gather(
+            *[summarise(index, text) for index, text in enumerate(texts)]
+        )
+
 
 class SummaryChain:
-    def __init__(self):
+    def __init__(self, stuff_max_chars: int = settings.summary_stuff_max_chars):
         prompt = ChatPromptTemplate.from_template("Summarize this content: {context}")
         # Define LLM chain
-        llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
+        llm = ChatOpenAI(temperature=0, model_name=settings.llm_model)
         self.chain = create_stuff_documents_chain(llm, prompt)
+        # Documents longer than this are summarised hierarchically
+        self.stuff_max_chars = stuff_max_chars
+        self.hierarchical = HierarchicalSummariser(llm)
+
+    async def arun(self, context: List[Document], doc_id: Optional[str] = None):
+        if self._is_too_long(context):
+            return await self.hierarchical.arun(context, doc_id)
+        return await self.chain.ainvoke({"context": context})
+
+    async def astream(
+        self, context: List[Document], doc_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Asynchronously yield the summary token by token as the LLM produces it."""
+        if self._is_too_long(context):
+            tokens = self.hierarchical.astream(context, doc_id)
+        else:
+            tokens = self.chain.astream({"context": context})
+        async for token in tokens:
+            yield token
+
+    def _is_too_long(self, context: List[Document]) -> bool:
+        return sum(len(doc.page_content) for doc in context) > self.stuff_max_chars
+
 
-    def run(self, context: str):
-        return self.chain.invoke({"context": context})
+def _join(summaries: List[str]) -> str:
+    return "\n\n".join(summaries)
@@ -0,0 +1,42 @@
+import logging
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token for English text, used when the tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+# Encoding of the current OpenAI chat models, for models tiktoken doesn't know yet
+DEFAULT_ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> Optional[tiktoken.Encoding]:
+    """Load the tokenizer of the configured chat model, once per process."""
+    try:
+        name = tiktoken.encoding_name_for_model(settings.llm_model)
+    except KeyError:
+        name = DEFAULT_ENCODING
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # The encoding is downloaded on first use, which fails without network access
+        logger.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in a text."""
+    return count_tokens_batch([text])[0]
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Count the tokens in each of the texts."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return [-(-len(text) // CHARS_PER_TOKEN) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
@@ -1,22 +1,34 @@
 import logging
-from typing import Annotated
+import time
+from typing import Annotated, Dict
 
 from fastapi import Depends
 from langchain_core.vectorstores import VectorStore
 from langchain_openai import OpenAIEmbeddings
 
+from brain.answer_cache import SemanticAnswerCache
 from brain.document_processing import DocumentProcessor
+from brain.embeddings import (
+    BatchedEmbeddings,
+    EmbeddingCache,
+    LocalEmbeddingCache,
+    PostgresEmbeddingCache,
+    QueryEmbeddingCache,
+)
 from brain.rag import RAGChain
 from brain.summariser import SummaryChain
 from repositories.session_db import (
+    CachedDocumentStore,
     DocumentStore,
     InMemoryDocumentStore,
     PostgresDocumentStore,
     S3DocumentStore,
 )
-from repositories.vector_db import InMemoryVectorStore, PGVectorStore
+from repositories.vector_db import InMemoryStore, PGVectorStore
+from services.ingestion_jobs import IngestionJobQueue
 from services.pdf_chat_service import PDFChatService
 from settings import settings
+from utills.db_utils import close_connection_pool, get_connection_pool
 
 logger = logging.getLogger(__name__)
 
@@ -25,23 +37,68 @@ class Services:
     def __init__(self):
         self.document_store: DocumentStore | None = None
         self.vector_store: VectorStore | None = None
+        self.embeddings: BatchedEmbeddings | None = None
+        self.pdf_service: PDFChatService | None = None
+        self.ingestion_queue: IngestionJobQueue | None = None
+        # Timings (seconds) recorded while building the services, see `warm_up_services`
+        self.metrics: Dict[str, float] = {}
 
 
 # Create a single instance to hold our services
 services = Services()
 
 
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Get's the configured embedding cache, if any."""
+    if settings.embedding_cache_type == "none":
+        return None
+    if settings.embedding_cache_type == "postgres":
+        return PostgresEmbeddingCache(connection_pool=get_connection_pool())
+    return LocalEmbeddingCache(settings.embedding_cache_path)
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache | None:
+    """Get's the configured query embedding cache, if any."""
+    if settings.query_embedding_cache_type == "none":
+        return None
+    shared = None
+    if settings.query_embedding_cache_type == "postgres":
+        shared = PostgresEmbeddingCache(
+            connection_pool=get_connection_pool(), table_name="query_embedding_cache"
+        )
+    return QueryEmbeddingCache(
+        max_size=settings.query_embedding_cache_size,
+        ttl=settings.query_embedding_cache_ttl,
+        shared=shared,
+    )
+
+
+def get_embeddings() -> BatchedEmbeddings:
+    """Get's the embeddings, batched, parallelised and cached by chunk content."""
+    if services.embeddings is None:
+        services.embeddings = BatchedEmbeddings(
+            # Shortened to the width of the pgvector column
+            OpenAIEmbeddings(
+                model=settings.embedding_model, dimensions=settings.embedding_size
+            ),
+            cache=get_embedding_cache(),
+            batch_size=settings.embedding_batch_size,
+            max_concurrency=settings.embedding_max_concurrency,
+            query_cache=get_query_embedding_cache(),
+        )
+    return services.embeddings
+
+
 def get_vector_store() -> VectorStore:
     """Get's the correct vector store implementation based on the environment."""
     if services.vector_store is None:
-        embeddings = OpenAIEmbeddings(model=settings.embedding_model)
+        embeddings = get_embeddings()
         if settings.use_postgres_db:
             services.vector_store = PGVectorStore(
-                embeddings=embeddings,
-                connection_string=settings.connection_string,
+                embeddings=embeddings, connection_pool=get_connection_pool()
             )
         else:
-            services.vector_store = InMemoryVectorStore(embeddings=embeddings)
+            services.vector_store = InMemoryStore(embeddings=embeddings)
 
     return services.vector_store
 
@@ -55,7 +112,11 @@ def get_document_store() -> DocumentStore:
             "postgres": PostgresDocumentStore,
         }
         logger.info(f"Using document store type: {settings.document_store_type}")
-        services.document_store = DOCUMENT_STORES[settings.document_store_type]()
+        document_store = DOCUMENT_STORES[settings.document_store_type]()
+        # The in-memory store has nothing to gain from a cache
+        if settings.document_cache and settings.document_store_type != "in_memory":
+            document_store = CachedDocumentStore(document_store)
+        services.document_store = document_store
 
     return services.document_store
 
@@ -64,11 +125,73 @@ def get_pdf_service(
     vector_store: Annotated[VectorStore, Depends(get_vector_store)],
     document_store: Annotated[DocumentStore, Depends(get_document_store)],
 ) -> PDFChatService:
-    """Dependency provider for PDFChatService"""
-    return PDFChatService(
-        document_processor=DocumentProcessor(),
-        vector_store=vector_store,
-        document_store=document_store,
-        rag_chain=RAGChain(),
-        summary_chain=SummaryChain(),
+    """Dependency provider for PDFChatService.
+
+    The service and its chains are built once per process and reused across requests,
+    so the LLM clients and their connection pools are shared.
+    """
+    if services.pdf_service is None:
+        start = time.perf_counter()
+        services.pdf_service = PDFChatService(
+            document_processor=DocumentProcessor(),
+            vector_store=vector_store,
+            document_store=document_store,
+            rag_chain=RAGChain(),
+            summary_chain=SummaryChain(),
+            # Without background tasks, summaries are generated on first request
+            precompute_summaries=settings.precompute_summaries
+            and settings.background_tasks,
+            deduplicate_uploads=settings.deduplicate_uploads,
+            answer_cache=SemanticAnswerCache() if settings.answer_cache else None,
+            background_tasks=settings.background_tasks,
+        )
+        services.metrics["pdf_service_build_seconds"] = time.perf_counter() - start
+        services.metrics["pdf_service_reuses"] = 0
+    else:
+        services.metrics["pdf_service_reuses"] += 1
+        # Construction cost that would have been paid again on every request
+        services.metrics["pdf_service_build_seconds_saved"] = (
+            services.metrics["pdf_service_reuses"]
+            * services.metrics["pdf_service_build_seconds"]
+        )
+
+    return services.pdf_service
+
+
+def get_ingestion_queue(
+    pdf_service: Annotated[PDFChatService, Depends(get_pdf_service)],
+) -> IngestionJobQueue:
+    """Dependency provider for the queue of uploads waiting to be ingested."""
+    if services.ingestion_queue is None:
+        services.ingestion_queue = IngestionJobQueue(pdf_service)
+    return services.ingestion_queue
+
+
+def warm_up_services() -> None:
+    """Build all the services up front so the first request doesn't pay for it."""
+    start = time.perf_counter()
+    vector_store = get_vector_store()
+    document_store = get_document_store()
+    services.metrics["stores_build_seconds"] = time.perf_counter() - start
+
+    get_pdf_service(vector_store=vector_store, document_store=document_store)
+    services.metrics["warm_up_seconds"] = time.perf_counter() - start
+    logger.info(
+        f"Services warmed up in {services.metrics['warm_up_seconds']:.3f}s, saving "
+        f"{services.metrics['pdf_service_build_seconds']:.3f}s of construction per request"
     )
+
+
+def reset_services() -> None:
+    """Drop the cached services, they will be rebuilt on next use."""
+    services.document_store = None
+    services.vector_store = None
+    services.embeddings = None
+    if services.pdf_service is not None:
+        services.pdf_service.document_processor.close()
+    services.pdf_service = None
+    if services.ingestion_queue is not None:
+        services.ingestion_queue.close()
+        services.ingestion_queue = None
+    services.metrics.clear()
+    close_connection_pool()
@@ -1 +1,40 @@
-CREATE EXTENSION IF NOT EXISTS vector;
\ No newline at end of file
+CREATE EXTENSION IF NOT EXISTS vector;
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    full_text TEXT NOT NULL,
+    filename TEXT
+);
+
+CREATE TABLE IF NOT EXISTS document_summaries (
+    doc_id TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (doc_id, prompt_version)
+);
+
+-- Identical uploads are stored once and shared by every session that uploads them
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE INDEX IF NOT EXISTS documents_content_hash_idx ON documents (content_hash);
+
+-- Content is stored as compressed per-page frames, see utills/compression.py, with
+-- the byte offset of each frame so pages can be read with substring. Rows written
+-- before this keep their full_text. The application compresses the content, so
+-- TOAST doesn't, and substring only reads the bytes it needs
+ALTER TABLE documents ALTER COLUMN full_text DROP NOT NULL;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content BYTEA;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_encoding TEXT;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS frame_offsets INTEGER[];
+ALTER TABLE documents ALTER COLUMN content SET STORAGE EXTERNAL;
+
+CREATE TABLE IF NOT EXISTS document_sessions (
+    doc_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    PRIMARY KEY (doc_id, session_id)
+);
+
+-- Chunk embeddings live in the hash partitioned document_chunks table, created with
+-- its HNSW index by repositories.vector_db.PGChunkIndex for the configured dimension.
+-- Chunks in LangChain's earlier langchain_pg_embedding table are not migrated, their
+-- documents must be uploaded again, as must every document when EMBEDDING_SIZE or
+-- EMBEDDING_MODEL change
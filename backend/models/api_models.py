@@ -5,6 +5,8 @@ class QueryRequest(BaseModel):
     query: str
     session_id: str
     doc_id: str
+    # Skip the answer cache, e.g. to regenerate an answer
+    bypass_cache: bool = False
 
 
 class AppInfo(BaseModel):
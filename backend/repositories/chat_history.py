@@ -0,0 +1,172 @@
+import json
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from psycopg import sql
+from psycopg_pool import ConnectionPool
+
+from utills.db_utils import get_connection_pool
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresChatHistory(BaseChatMessageHistory):
+    """Chat message history stored in Postgres, using the shared connection pool.
+
+    Uses the same `message_store` schema as LangChain's PostgresChatMessageHistory,
+    but borrows a pooled connection per operation instead of opening a new one for
+    every history object. Long histories can be read a window at a time, with a
+    rolling summary of the older messages stored alongside.
+    """
+
+    _tables_created: set = set()
+
+    def __init__(
+        self,
+        session_id: str,
+        connection_pool: Optional[ConnectionPool] = None,
+        table_name: str = "message_store",
+    ):
+        self.session_id = session_id
+        self.connection_pool = connection_pool or get_connection_pool()
+        self.table_name = table_name
+        self.table = sql.Identifier(table_name)
+        self.summary_table = sql.Identifier(f"{table_name}_summaries")
+        self._create_table_if_not_exists()
+
+    def _create_table_if_not_exists(self) -> None:
+        # Only needs to happen once per process and table
+        if self.table_name in self._tables_created:
+            return
+        with self.connection_pool.connection() as conn:
+            conn.execute(
+                sql.SQL(
+                    """
+                    CREATE TABLE IF NOT EXISTS {} (
+                        id SERIAL PRIMARY KEY,
+                        session_id TEXT NOT NULL,
+                        message JSONB NOT NULL
+                    )
+                    """
+                ).format(self.table)
+            )
+            # Windows of recent messages are read newest first with a LIMIT
+            conn.execute(
+                sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (session_id, id)").format(
+                    sql.Identifier(f"{self.table_name}_session_id_idx"), self.table
+                )
+            )
+            conn.execute(
+                sql.SQL(
+                    """
+                    CREATE TABLE IF NOT EXISTS {} (
+                        session_id TEXT PRIMARY KEY,
+                        summary TEXT NOT NULL,
+                        last_message_id INTEGER NOT NULL
+                    )
+                    """
+                ).format(self.summary_table)
+            )
+        self._tables_created.add(self.table_name)
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore
+        """Retrieve the messages from Postgres"""
+        with self.connection_pool.connection() as conn:
+            cur = conn.execute(
+                sql.SQL(
+                    "SELECT message FROM {} WHERE session_id = %s ORDER BY id"
+                ).format(self.table),
+                (self.session_id,),
+            )
+            items = [record[0] for record in cur.fetchall()]
+        return messages_from_dict(items)
+
+    def get_recent_messages(self, limit: int) -> List[Tuple[int, BaseMessage]]:
+        """The last `limit` messages with their ids, oldest first"""
+        with self.connection_pool.connection() as conn:
+            rows = conn.execute(
+                sql.SQL(
+                    "SELECT id, message FROM {} WHERE session_id = %s "
+                    "ORDER BY id DESC LIMIT %s"
+                ).format(self.table),
+                (self.session_id, limit),
+            ).fetchall()
+        return _with_ids(reversed(rows))
+
+    def get_older_messages(
+        self, keep_recent: int, after_id: int = 0, limit: int = 100
+    ) -> List[Tuple[int, BaseMessage]]:
+        """Messages before the `keep_recent` most recent ones and after `after_id`,
+        oldest first and at most `limit` of them"""
+        with self.connection_pool.connection() as conn:
+            rows = conn.execute(
+                sql.SQL(
+                    "SELECT id, message FROM ("
+                    "SELECT id, message FROM {} WHERE session_id = %s AND id > %s "
+                    "ORDER BY id DESC OFFSET %s"
+                    ") AS older ORDER BY id LIMIT %s"
+                ).format(self.table),
+                (self.session_id, after_id, keep_recent, limit),
+            ).fetchall()
+        return _with_ids(rows)
+
+    def get_summary(self) -> Tuple[Optional[str], int]:
+        """The summary of the older messages and the id of the last one it covers"""
+        with self.connection_pool.connection() as conn:
+            row = conn.execute(
+                sql.SQL(
+                    "SELECT summary, last_message_id FROM {} WHERE session_id = %s"
+                ).format(self.summary_table),
+                (self.session_id,),
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def put_summary(self, summary: str, last_message_id: int) -> None:
+        """Store the summary, unless a summary covering more messages is stored"""
+        with self.connection_pool.connection() as conn:
+            conn.execute(
+                sql.SQL(
+                    """
+                    INSERT INTO {0} (session_id, summary, last_message_id)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (session_id) DO UPDATE
+                    SET summary = EXCLUDED.summary,
+                        last_message_id = EXCLUDED.last_message_id
+                    WHERE {0}.last_message_id < EXCLUDED.last_message_id
+                    """
+                ).format(self.summary_table),
+                (self.session_id, summary, last_message_id),
+            )
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append the messages to Postgres in a single transaction"""
+        query = sql.SQL("INSERT INTO {} (session_id, message) VALUES (%s, %s)").format(
+            self.table
+        )
+        with self.connection_pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.executemany(
+                    query,
+                    [
+                        (self.session_id, json.dumps(message_to_dict(message)))
+                        for message in messages
+                    ],
+                )
+
+    def clear(self) -> None:
+        """Clear session memory from Postgres"""
+        with self.connection_pool.connection() as conn:
+            for table in (self.table, self.summary_table):
+                conn.execute(
+                    sql.SQL("DELETE FROM {} WHERE session_id = %s").format(table),
+                    (self.session_id,),
+                )
+
+
+def _with_ids(rows) -> List[Tuple[int, BaseMessage]]:
+    rows = list(rows)
+    messages = messages_from_dict([message for _, message in rows])
+    return [(id, message) for (id, _), message in zip(rows, messages)]
@@ -0,0 +1,116 @@
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+from langchain.retrievers import EnsembleRetriever
+from langchain.schema import Document
+
+from settings import settings
+
+# Words, keeping numbers like 2.5 or 1,000 and contractions in one piece
+_TOKEN_PATTERN = re.compile(r"\w+(?:[.,']\w+)*")
+
+# Question words and other terms that match almost every chunk
+STOPWORDS = frozenset(
+    """
+    a about an and are as at be by can could did do does for from how i if in is it
+    its me my of on or so that the their them then there these they this to was
+    we were what when where which who why will with would you your
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms of the text, without stopwords."""
+    return [
+        token
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+@dataclass
+class _DocumentIndex:
+    """Inverted index of the chunks of one document."""
+
+    chunks: List[Document] = field(default_factory=list)
+    lengths: List[int] = field(default_factory=list)
+    # term -> {chunk position: term frequency}
+    postings: Dict[str, Dict[int, int]] = field(default_factory=dict)
+
+
+class BM25Index:
+    """In-process BM25 keyword index, with an inverted index per document.
+
+    Catches exact terms, like names, citations and numbers, that dense retrieval
+    tends to miss.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _DocumentIndex] = {}
+
+    def add(self, doc_id: str, documents: List[Document]) -> None:
+        """Index chunks of a document, may be called once per batch."""
+        terms = [Counter(tokenize(doc.page_content)) for doc in documents]
+        with self._lock:
+            index = self._indexes.setdefault(doc_id, _DocumentIndex())
+            for doc, counts in zip(documents, terms):
+                position = len(index.chunks)
+                index.chunks.append(doc)
+                index.lengths.append(sum(counts.values()))
+                for term, count in counts.items():
+                    index.postings.setdefault(term, {})[position] = count
+
+    def search(self, doc_id: str, query: str, k: int = 4) -> List[Document]:
+        """Return the document's k best matching chunks, best first."""
+        with self._lock:
+            index = self._indexes.get(doc_id)
+            if index is None:
+                return []
+            postings = [
+                index.postings[term]
+                for term in set(tokenize(query))
+                if term in index.postings
+            ]
+            chunks = index.chunks
+            lengths = np.asarray(index.lengths, dtype=np.float32)
+
+        scores = np.zeros(len(chunks), dtype=np.float32)
+        norms = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1))
+        for term_postings in postings:
+            df = len(term_postings)
+            idf = math.log(1 + (len(chunks) - df + 0.5) / (df + 0.5))
+            rows = np.fromiter(term_postings.keys(), dtype=np.int64, count=df)
+            tfs = np.fromiter(term_postings.values(), dtype=np.float32, count=df)
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norms[rows])
+
+        matches = np.flatnonzero(scores)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        return [chunks[i] for i in matches[np.argsort(-scores[matches])]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+
+class HybridRetriever(EnsembleRetriever):
+    """Fuses dense and keyword results by weighted reciprocal rank fusion.
+
+    Each retriever fetches more candidates than needed, a chunk ranked well by both
+    comes first, and only the top `k` fused chunks are kept.
+    """
+
+    k: int = settings.retrieval_k
+
+    def weighted_reciprocal_rank(
+        self, doc_lists: List[List[Document]]
+    ) -> List[Document]:
+        return super().weighted_reciprocal_rank(doc_lists)[: self.k]
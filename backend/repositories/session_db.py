@@ -1,16 +1,37 @@
+import asyncio
+import hashlib
+import io
+import json
 import logging
+import os
+import tempfile
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import boto3
-import psycopg
 from botocore.exceptions import ClientError
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
 from settings import settings
+from utills.compression import (
+    check_encoding,
+    decode_pages,
+    decompress,
+    open_decompressed,
+    read_pages,
+    split_pages,
+    write_frames,
+)
+from utills.db_utils import get_connection_pool
 
 logger = logging.getLogger(__name__)
 
+# Compressed documents are spooled in memory up to this size, and on disk beyond it
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
 
 class DocumentStore(ABC):
     """Store for document full text content."""
@@ -22,21 +43,145 @@ class DocumentStore(ABC):
         session_id: str,
         full_text: str,
         filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
     ) -> None:
-        """Store document content"""
+        """Store document content, with the offset at which each page starts"""
         pass
 
+    def put_document_file(
+        self,
+        doc_id: str,
+        session_id: str,
+        text_path: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        """Store document content written to a UTF-8 text file"""
+        with open(text_path, encoding="utf-8", newline="") as f:
+            full_text = f.read()
+        self.put_document(
+            doc_id, session_id, full_text, filename, content_hash, page_offsets
+        )
+
     @abstractmethod
     def get_document(self, doc_id: str) -> Optional[str]:
         """Retrieve document content"""
         pass
 
+    @abstractmethod
+    def get_pages(
+        self, doc_id: str, start: int = 0, stop: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """Retrieve pages [start, stop) of a document, stored without offsets it's one page"""
+        pass
+
+    def document_exists(self, doc_id: str) -> bool:
+        """Check a document exists, without retrieving its content if possible"""
+        return self.get_document(doc_id) is not None
+
+    @abstractmethod
+    def get_doc_id_by_hash(self, content_hash: str) -> Optional[str]:
+        """Find the document uploaded with the given content hash"""
+        pass
+
+    @abstractmethod
+    def attach_session(self, doc_id: str, session_id: str) -> None:
+        """Give another session access to an already stored document"""
+        pass
+
+    @abstractmethod
+    def put_summary(self, doc_id: str, prompt_version: str, summary: str) -> None:
+        """Store a document summary generated with a given prompt version"""
+        pass
+
+    @abstractmethod
+    def get_summary(self, doc_id: str, prompt_version: str) -> Optional[str]:
+        """Retrieve a document summary generated with a given prompt version"""
+        pass
+
+    async def aput_document(
+        self,
+        doc_id: str,
+        session_id: str,
+        full_text: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        """Store document content without blocking the event loop"""
+        await asyncio.to_thread(
+            self.put_document,
+            doc_id,
+            session_id,
+            full_text,
+            filename,
+            content_hash,
+            page_offsets,
+        )
+
+    async def aput_document_file(
+        self,
+        doc_id: str,
+        session_id: str,
+        text_path: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        """Store document content from a text file without blocking the event loop"""
+        await asyncio.to_thread(
+            self.put_document_file,
+            doc_id,
+            session_id,
+            text_path,
+            filename,
+            content_hash,
+            page_offsets,
+        )
+
+    async def aget_document(self, doc_id: str) -> Optional[str]:
+        """Retrieve document content without blocking the event loop"""
+        return await asyncio.to_thread(self.get_document, doc_id)
+
+    async def aget_pages(
+        self, doc_id: str, start: int = 0, stop: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """Retrieve pages of a document without blocking the event loop"""
+        return await asyncio.to_thread(self.get_pages, doc_id, start, stop)
+
+    async def adocument_exists(self, doc_id: str) -> bool:
+        """Check a document exists without blocking the event loop"""
+        return await asyncio.to_thread(self.document_exists, doc_id)
+
+    async def aget_doc_id_by_hash(self, content_hash: str) -> Optional[str]:
+        """Find a document by content hash without blocking the event loop"""
+        return await asyncio.to_thread(self.get_doc_id_by_hash, content_hash)
+
+    async def aattach_session(self, doc_id: str, session_id: str) -> None:
+        """Attach a session to a document without blocking the event loop"""
+        await asyncio.to_thread(self.attach_session, doc_id, session_id)
+
+    async def aput_summary(
+        self, doc_id: str, prompt_version: str, summary: str
+    ) -> None:
+        """Store a document summary without blocking the event loop"""
+        await asyncio.to_thread(self.put_summary, doc_id, prompt_version, summary)
+
+    async def aget_summary(self, doc_id: str, prompt_version: str) -> Optional[str]:
+        """Retrieve a document summary without blocking the event loop"""
+        return await asyncio.to_thread(self.get_summary, doc_id, prompt_version)
+
 
 class InMemoryDocumentStore(DocumentStore):
     """In-memory implementation of DocumentStore for testing."""
 
     def __init__(self):
         self._docs: Dict[str, Dict] = {}
+        self._summaries: Dict[Tuple[str, str], str] = {}
+        self._hashes: Dict[str, str] = {}
+        self._sessions: Dict[str, Set[str]] = {}
         logger.info("Using in-memory document store")
 
     def put_document(
@@ -45,12 +190,19 @@ class InMemoryDocumentStore(DocumentStore):
         session_id: str,
         full_text: str,
         filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
     ) -> None:
         self._docs[doc_id] = {
             "session_id": session_id,
             "full_text": full_text,
             "filename": filename,
+            "content_hash": content_hash,
+            "page_offsets": page_offsets,
         }
+        self._sessions[doc_id] = {session_id}
+        if content_hash is not None:
+            self._hashes.setdefault(content_hash, doc_id)
         logger.info(f"Saved document {doc_id} to memory")
 
     def get_document(self, doc_id: str) -> Optional[str]:
@@ -58,12 +210,83 @@ class InMemoryDocumentStore(DocumentStore):
         logger.info(f"Getting document {doc_id} from memory. Found: {doc is not None}")
         return doc["full_text"] if doc else None
 
+    def get_pages(
+        self, doc_id: str, start: int = 0, stop: Optional[int] = None
+    ) -> Optional[List[str]]:
+        doc = self._docs.get(doc_id)
+        if doc is None:
+            return None
+        return split_pages(doc["full_text"], doc["page_offsets"])[start:stop]
+
+    def document_exists(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def get_doc_id_by_hash(self, content_hash: str) -> Optional[str]:
+        return self._hashes.get(content_hash)
+
+    def attach_session(self, doc_id: str, session_id: str) -> None:
+        self._sessions.setdefault(doc_id, set()).add(session_id)
+
+    def put_summary(self, doc_id: str, prompt_version: str, summary: str) -> None:
+        self._summaries[(doc_id, prompt_version)] = summary
+
+    def get_summary(self, doc_id: str, prompt_version: str) -> Optional[str]:
+        return self._summaries.get((doc_id, prompt_version))
+
+    async def aput_document(
+        self,
+        doc_id: str,
+        session_id: str,
+        full_text: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        self.put_document(
+            doc_id, session_id, full_text, filename, content_hash, page_offsets
+        )
+
+    async def aget_document(self, doc_id: str) -> Optional[str]:
+        return self.get_document(doc_id)
+
+    async def aget_pages(
+        self, doc_id: str, start: int = 0, stop: Optional[int] = None
+    ) -> Optional[List[str]]:
+        return self.get_pages(doc_id, start, stop)
+
+    async def adocument_exists(self, doc_id: str) -> bool:
+        return self.document_exists(doc_id)
+
+    async def aget_doc_id_by_hash(self, content_hash: str) -> Optional[str]:
+        return self.get_doc_id_by_hash(content_hash)
 
-# TODO: Create a table for documents in the database
-# WARNING: This will not work as the table is not created automatically now.
+    async def aattach_session(self, doc_id: str, session_id: str) -> None:
+        self.attach_session(doc_id, session_id)
+
+    async def aput_summary(
+        self, doc_id: str, prompt_version: str, summary: str
+    ) -> None:
+        self.put_summary(doc_id, prompt_version, summary)
+
+    async def aget_summary(self, doc_id: str, prompt_version: str) -> Optional[str]:
+        return self.get_summary(doc_id, prompt_version)
+
+
+# NOTE: The tables are not created automatically, see dev/init-pg-vector.sql
 class PostgresDocumentStore(DocumentStore):
-    def __init__(self):
-        self.connection_string = settings.connection_string
+    """Postgres implementation of DocumentStore, using the shared connection pool.
+
+    The async methods inherited from DocumentStore borrow a pooled connection in a
+    worker thread.
+    """
+
+    def __init__(
+        self,
+        connection_pool: Optional[ConnectionPool] = None,
+        compression: str = settings.document_compression,
+    ):
+        self.connection_pool = connection_pool or get_connection_pool()
+        self.compression = check_encoding(compression)
 
     def put_document(
         self,
@@ -71,38 +294,205 @@ class PostgresDocumentStore(DocumentStore):
         session_id: str,
         full_text: str,
         filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
     ) -> None:
-        with psycopg.connect(self.connection_string, row_factory=dict_row) as conn:
-            with conn.cursor() as cur:
+        self._put_pages(
+            doc_id,
+            session_id,
+            split_pages(full_text, page_offsets),
+            filename,
+            content_hash,
+        )
+
+    def put_document_file(
+        self,
+        doc_id: str,
+        session_id: str,
+        text_path: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        # Compressed page by page, the text is never loaded into memory whole
+        with open(text_path, encoding="utf-8", newline="") as f:
+            self._put_pages(
+                doc_id,
+                session_id,
+                read_pages(f, page_offsets),
+                filename,
+                content_hash,
+            )
+
+    def _put_pages(
+        self,
+        doc_id: str,
+        session_id: str,
+        pages: Iterable[str],
+        filename: Optional[str],
+        content_hash: Optional[str],
+    ) -> None:
+        """Store the pages as compressed frames, with the offset of each frame."""
+        content = io.BytesIO()
+        frame_offsets = write_frames(pages, self.compression, content)
+        with self.connection_pool.connection() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
                 cur.execute(
                     """
-                    INSERT INTO documents (id, session_id, full_text, filename)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO documents
+                        (id, session_id, content, content_encoding, frame_offsets,
+                         filename, content_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
                     """,
-                    (doc_id, session_id, full_text, filename),
+                    (
+                        doc_id,
+                        session_id,
+                        content.getvalue(),
+                        self.compression,
+                        frame_offsets,
+                        filename,
+                        content_hash,
+                    ),
                 )
+                self._insert_session(cur, doc_id, session_id)
 
     def get_document(self, doc_id: str) -> Optional[str]:
-        with psycopg.connect(self.connection_string, row_factory=dict_row) as conn:
-            with conn.cursor() as cur:
+        with self.connection_pool.connection() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
                 cur.execute(
                     """
-                    SELECT full_text 
+                    SELECT full_text, content, content_encoding
                     FROM documents 
                     WHERE id = %s
                     """,
                     (doc_id,),
                 )
                 result = cur.fetchone()
-                return result["full_text"] if result else None
+        if result is None:
+            return None
+        if result["full_text"] is not None:
+            # Stored before documents were compressed
+            return result["full_text"]
+        return decompress(result["content"], result["content_encoding"]).decode("utf-8")
+
+    def get_pages(
+        self, doc_id: str, start: int = 0, stop: Optional[int] = None
+    ) -> Optional[List[str]]:
+        # Only the bytes of the requested frames are read, content isn't TOAST
+        # compressed (STORAGE EXTERNAL) so substring doesn't detoast the whole value
+        with self.connection_pool.connection() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
+                cur.execute(
+                    """
+                    SELECT full_text, content_encoding,
+                        frame_offsets[pages.lo:pages.hi] AS frame_offsets,
+                        substring(
+                            content FROM frame_offsets[pages.lo] + 1
+                            FOR GREATEST(
+                                frame_offsets[pages.hi] - frame_offsets[pages.lo], 0
+                            )
+                        ) AS content
+                    FROM documents, LATERAL (
+                        SELECT %(start)s::int + 1 AS lo, LEAST(
+                            COALESCE(%(stop)s::int, cardinality(frame_offsets) - 1),
+                            cardinality(frame_offsets) - 1
+                        ) + 1 AS hi
+                    ) AS pages
+                    WHERE id = %(doc_id)s
+                    """,
+                    {"doc_id": doc_id, "start": start, "stop": stop},
+                )
+                result = cur.fetchone()
+        if result is None:
+            return None
+        if result["full_text"] is not None:
+            return split_pages(result["full_text"], None)[start:stop]
+        frame_offsets = result["frame_offsets"]
+        if len(frame_offsets) < 2:
+            return []
+        return decode_pages(
+            result["content"],
+            [offset - frame_offsets[0] for offset in frame_offsets],
+            start,
+            result["content_encoding"],
+        )
+
+    def document_exists(self, doc_id: str) -> bool:
+        with self.connection_pool.connection() as conn:
+            result = conn.execute(
+                "SELECT 1 FROM documents WHERE id = %s", (doc_id,)
+            ).fetchone()
+            return result is not None
+
+    def get_doc_id_by_hash(self, content_hash: str) -> Optional[str]:
+        with self.connection_pool.connection() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
+                cur.execute(
+                    """
+                    SELECT id
+                    FROM documents
+                    WHERE content_hash = %s
+                    LIMIT 1
+                    """,
+                    (content_hash,),
+                )
+                result = cur.fetchone()
+                return result["id"] if result else None
+
+    def attach_session(self, doc_id: str, session_id: str) -> None:
+        with self.connection_pool.connection() as conn:
+            with conn.cursor() as cur:
+                self._insert_session(cur, doc_id, session_id)
+
+    def _insert_session(self, cur, doc_id: str, session_id: str) -> None:
+        cur.execute(
+            """
+            INSERT INTO document_sessions (doc_id, session_id)
+            VALUES (%s, %s)
+            ON CONFLICT DO NOTHING
+            """,
+            (doc_id, session_id),
+        )
+
+    def put_summary(self, doc_id: str, prompt_version: str, summary: str) -> None:
+        with self.connection_pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO document_summaries (doc_id, prompt_version, summary)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (doc_id, prompt_version)
+                    DO UPDATE SET summary = EXCLUDED.summary
+                    """,
+                    (doc_id, prompt_version, summary),
+                )
+
+    def get_summary(self, doc_id: str, prompt_version: str) -> Optional[str]:
+        with self.connection_pool.connection() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
+                cur.execute(
+                    """
+                    SELECT summary
+                    FROM document_summaries
+                    WHERE doc_id = %s AND prompt_version = %s
+                    """,
+                    (doc_id, prompt_version),
+                )
+                result = cur.fetchone()
+                return result["summary"] if result else None
 
 
 class S3DocumentStore(DocumentStore):
-    """S3-based implementation of DocumentStore."""
+    """S3-based implementation of DocumentStore.
 
-    def __init__(self):
+    boto3 clients are thread-safe, so the async methods inherited from
+    DocumentStore run the blocking S3 calls in a worker thread.
+    """
+
+    def __init__(self, compression: str = settings.document_compression):
         self.bucket_name = settings.s3_bucket_name
         self.s3_client = boto3.client("s3")
+        self.compression = check_encoding(compression)
         logger.info(f"Using S3 document store with bucket: {settings.s3_bucket_name}")
 
     def put_document(
@@ -111,26 +501,106 @@ class S3DocumentStore(DocumentStore):
         session_id: str,
         full_text: str,
         filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        self._put_pages(
+            doc_id,
+            session_id,
+            split_pages(full_text, page_offsets),
+            filename,
+            content_hash,
+        )
+
+    def put_document_file(
+        self,
+        doc_id: str,
+        session_id: str,
+        text_path: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
     ) -> None:
+        # Compressed page by page, the text is never loaded into memory whole
+        with open(text_path, encoding="utf-8", newline="") as f:
+            self._put_pages(
+                doc_id,
+                session_id,
+                read_pages(f, page_offsets),
+                filename,
+                content_hash,
+            )
+
+    def _put_pages(
+        self,
+        doc_id: str,
+        session_id: str,
+        pages: Iterable[str],
+        filename: Optional[str],
+        content_hash: Optional[str],
+    ) -> None:
+        """
+        Store the pages as one object of compressed frames, marked with its
+        Content-Encoding, and the frames' byte offsets in a page index object.
+        """
         try:
-            # Store the document content
-            key = self._get_document_key(doc_id)
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=key,
-                Body=full_text.encode("utf-8"),
-                Metadata={"session_id": session_id, "filename": filename or ""},
+            # Spilled to disk beyond the spool size, streamed to S3 from there
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as body:
+                frame_offsets = write_frames(pages, self.compression, body)
+                body.seek(0)
+                # Written first, so any stored document has a page index
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=self._get_pages_key(doc_id),
+                    Body=json.dumps(
+                        {"encoding": self.compression, "frame_offsets": frame_offsets}
+                    ).encode("utf-8"),
+                )
+                extra_args = {
+                    "ContentType": "text/plain; charset=utf-8",
+                    "Metadata": self._get_document_metadata(
+                        session_id, filename, content_hash
+                    ),
+                }
+                if self.compression is not None:
+                    extra_args["ContentEncoding"] = self.compression
+                self.s3_client.upload_fileobj(
+                    body,
+                    self.bucket_name,
+                    self._get_document_key(doc_id),
+                    ExtraArgs=extra_args,
+                )
+            self._index_document(doc_id, session_id, content_hash)
+            logger.info(
+                f"Successfully stored document {doc_id} in S3 "
+                f"({frame_offsets[-1]} bytes, {self.compression or 'uncompressed'})"
             )
-            logger.info(f"Successfully stored document {doc_id} in S3")
         except Exception as e:
             logger.error(f"Failed to store document in S3: {str(e)}")
             raise
 
+    def _index_document(
+        self, doc_id: str, session_id: str, content_hash: Optional[str]
+    ) -> None:
+        """Record the document's content hash and uploading session."""
+        if content_hash is not None:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self._get_hash_key(content_hash),
+                Body=doc_id.encode("utf-8"),
+            )
+        self.attach_session(doc_id, session_id)
+
     def get_document(self, doc_id: str) -> Optional[str]:
         try:
             key = self._get_document_key(doc_id)
             response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
-            return response["Body"].read().decode("utf-8")
+            # Decompressed as it is downloaded, documents stored before compression
+            # have no Content-Encoding
+            with open_decompressed(
+                response["Body"], response.get("ContentEncoding")
+            ) as body:
+                return io.TextIOWrapper(body, encoding="utf-8", newline="").read()
         except ClientError as e:
             if e.response["Error"]["Code"] == "NoSuchKey":
                 return None
@@ -139,6 +609,320 @@ class S3DocumentStore(DocumentStore):
             logger.error(f"Failed to retrieve document from S3: {str(e)}")
             raise
 
+    def get_pages(
+        self, doc_id: str, start: int = 0, stop: Optional[int] = None
+    ) -> Optional[List[str]]:
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=self._get_pages_key(doc_id)
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                raise
+            # Stored before documents had a page index, as a single page
+            full_text = self.get_document(doc_id)
+            return None if full_text is None else [full_text][start:stop]
+        page_index = json.loads(response["Body"].read())
+        frame_offsets = page_index["frame_offsets"]
+        pages = len(frame_offsets) - 1
+        stop = pages if stop is None else min(stop, pages)
+        if start >= stop:
+            return []
+        # A ranged GET of only the frames of the requested pages
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=self._get_document_key(doc_id),
+            Range=f"bytes={frame_offsets[start]}-{frame_offsets[stop] - 1}",
+        )
+        return decode_pages(
+            response["Body"].read(),
+            [
+                offset - frame_offsets[start]
+                for offset in frame_offsets[start : stop + 1]
+            ],
+            start,
+            page_index["encoding"],
+        )
+
+    def document_exists(self, doc_id: str) -> bool:
+        # A HEAD request, the document body isn't downloaded
+        try:
+            self.s3_client.head_object(
+                Bucket=self.bucket_name, Key=self._get_document_key(doc_id)
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def get_doc_id_by_hash(self, content_hash: str) -> Optional[str]:
+        try:
+            key = self._get_hash_key(content_hash)
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            return response["Body"].read().decode("utf-8")
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise
+
+    def attach_session(self, doc_id: str, session_id: str) -> None:
+        # An empty marker object per session, the document itself isn't copied
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=self._get_session_key(doc_id, session_id),
+            Body=b"",
+        )
+
+    def put_summary(self, doc_id: str, prompt_version: str, summary: str) -> None:
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self._get_summary_key(doc_id, prompt_version),
+                Body=summary.encode("utf-8"),
+            )
+            logger.info(f"Successfully stored summary for document {doc_id} in S3")
+        except Exception as e:
+            logger.error(f"Failed to store summary in S3: {str(e)}")
+            raise
+
+    def get_summary(self, doc_id: str, prompt_version: str) -> Optional[str]:
+        try:
+            key = self._get_summary_key(doc_id, prompt_version)
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            return response["Body"].read().decode("utf-8")
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise
+
+    def _get_document_metadata(
+        self, session_id: str, filename: Optional[str], content_hash: Optional[str]
+    ) -> Dict[str, str]:
+        """S3 object metadata stored with the document content."""
+        return {
+            "session_id": session_id,
+            "filename": filename or "",
+            "content_hash": content_hash or "",
+        }
+
     def _get_document_key(self, doc_id: str) -> str:
         """Generate S3 key for a document."""
         return f"documents/{doc_id}/content.txt"
+
+    def _get_pages_key(self, doc_id: str) -> str:
+        """Generate S3 key for a document's page index, stored alongside it."""
+        return f"documents/{doc_id}/pages.json"
+
+    def _get_summary_key(self, doc_id: str, prompt_version: str) -> str:
+        """Generate S3 key for a document summary, stored alongside the document."""
+        return f"documents/{doc_id}/summaries/{prompt_version}.txt"
+
+    def _get_hash_key(self, content_hash: str) -> str:
+        """Generate S3 key mapping an uploaded file's content hash to its document."""
+        return f"hashes/{content_hash}.txt"
+
+    def _get_session_key(self, doc_id: str, session_id: str) -> str:
+        """Generate S3 key recording a session's access to a document."""
+        return f"documents/{doc_id}/sessions/{session_id}"
+
+
+class CachedDocumentStore(DocumentStore):
+    """Read-through cache of document content over another DocumentStore.
+
+    Documents are immutable once stored, so cached content never goes stale. The
+    content is kept in an in-process LRU bounded to `max_bytes` of UTF-8 text and,
+    if `disk_dir` is set, in files bounded to `disk_max_bytes` that outlive the
+    process, e.g. in /tmp across warm Lambda invocations. Writes go through to the
+    wrapped store, everything else is delegated to it.
+    """
+
+    def __init__(
+        self,
+        store: DocumentStore,
+        max_bytes: int = settings.document_cache_max_bytes,
+        disk_dir: Optional[str] = settings.document_cache_dir,
+        disk_max_bytes: int = settings.document_cache_disk_max_bytes,
+    ):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # doc_id -> content, least recently used first
+        self._docs: OrderedDict[str, str] = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def put_document(
+        self,
+        doc_id: str,
+        session_id: str,
+        full_text: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        self.store.put_document(
+            doc_id, session_id, full_text, filename, content_hash, page_offsets
+        )
+        self._cache(doc_id, full_text)
+
+    def put_document_file(
+        self,
+        doc_id: str,
+        session_id: str,
+        text_path: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> None:
+        # Streamed to the wrapped store, the content is cached when first read
+        self.store.put_document_file(
+            doc_id, session_id, text_path, filename, content_hash, page_offsets
+        )
+
+    def get_document(self, doc_id: str) -> Optional[str]:
+        full_text = self._get_cached(doc_id)
+        if full_text is None:
+            full_text = self.store.get_document(doc_id)
+            if full_text is not None:
+                self._cache(doc_id, full_text)
+        return full_text
+
+    def document_exists(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id in self._docs:
+                return True
+        if self.disk_dir and os.path.exists(self._get_path(doc_id)):
+            return True
+        return self.store.document_exists(doc_id)
+
+    def get_pages(
+        self, doc_id: str, start: int = 0, stop: Optional[int] = None
+    ) -> Optional[List[str]]:
+        # Pages are ranged reads of the wrapped store, they aren't cached
+        return self.store.get_pages(doc_id, start, stop)
+
+    def get_doc_id_by_hash(self, content_hash: str) -> Optional[str]:
+        return self.store.get_doc_id_by_hash(content_hash)
+
+    def attach_session(self, doc_id: str, session_id: str) -> None:
+        self.store.attach_session(doc_id, session_id)
+
+    def put_summary(self, doc_id: str, prompt_version: str, summary: str) -> None:
+        self.store.put_summary(doc_id, prompt_version, summary)
+
+    def get_summary(self, doc_id: str, prompt_version: str) -> Optional[str]:
+        return self.store.get_summary(doc_id, prompt_version)
+
+    async def aget_document(self, doc_id: str) -> Optional[str]:
+        # Memory hits are returned without a thread hop
+        with self._lock:
+            if doc_id in self._docs:
+                self._docs.move_to_end(doc_id)
+                self._stats["memory_hits"] += 1
+                return self._docs[doc_id]
+        return await asyncio.to_thread(self.get_document, doc_id)
+
+    async def adocument_exists(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id in self._docs:
+                return True
+        return await asyncio.to_thread(self.document_exists, doc_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit counts per tier, and the number and size of documents in memory."""
+        with self._lock:
+            return dict(self._stats, documents=len(self._docs), bytes=self._bytes)
+
+    def _get_cached(self, doc_id: str) -> Optional[str]:
+        """Content from memory, or from disk, promoted to memory."""
+        with self._lock:
+            if doc_id in self._docs:
+                self._docs.move_to_end(doc_id)
+                self._stats["memory_hits"] += 1
+                return self._docs[doc_id]
+        if self.disk_dir:
+            path = self._get_path(doc_id)
+            try:
+                with open(path, encoding="utf-8", newline="") as f:
+                    full_text = f.read()
+                os.utime(path)  # Disk eviction is least recently used first
+            except FileNotFoundError:
+                pass
+            else:
+                self._cache_in_memory(doc_id, full_text)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return full_text
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def _cache(self, doc_id: str, full_text: str) -> None:
+        self._cache_in_memory(doc_id, full_text)
+        if self.disk_dir:
+            try:
+                self._cache_on_disk(doc_id, full_text)
+            except OSError as e:
+                # The disk tier is best effort, e.g. /tmp may be full
+                logger.warning(f"Failed to cache document {doc_id} on disk: {e}")
+
+    def _cache_in_memory(self, doc_id: str, full_text: str) -> None:
+        size = len(full_text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if doc_id in self._docs:
+                self._docs.move_to_end(doc_id)
+                return
+            self._docs[doc_id] = full_text
+            self._sizes[doc_id] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted, _ = self._docs.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+
+    def _cache_on_disk(self, doc_id: str, full_text: str) -> None:
+        path = self._get_path(doc_id)
+        if os.path.exists(path):
+            return
+        # Written to a temporary file and renamed, so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        try:
+            # Without newline="", "\r\n" and "\r" would come back as "\n", shifting
+            # the page offsets
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(full_text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._evict_from_disk()
+
+    def _evict_from_disk(self) -> None:
+        """Delete the least recently used files beyond the disk budget."""
+        entries = []
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".txt"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _get_path(self, doc_id: str) -> str:
+        # doc_ids are generated UUIDs, hashed anyway so any id is a safe file name
+        name = hashlib.sha256(doc_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.txt")
@@ -1,16 +1,50 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
+import psycopg
 from langchain.schema import Document
-from langchain_community.vectorstores.pgvector import PGVector
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
 from langchain_core.embeddings import Embeddings
-from langchain_core.vectorstores import VectorStoreRetriever
-from langchain_core.vectorstores.in_memory import InMemoryVectorStore
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore as LangChainVectorStore
+from pgvector.psycopg.vector import register_vector_info
+from psycopg import sql
+from psycopg.types import TypeInfo
+from psycopg.types.json import Jsonb
+from psycopg_pool import ConnectionPool
+
+from repositories.keyword_index import BM25Index, HybridRetriever
+from settings import settings
+from utills.db_utils import get_connection_pool
+
+try:
+    import hnswlib
+except ImportError:
+    # Optional, only needed for the HNSW index of NumpyVectorStore
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# Widest vectors pgvector's HNSW index can index
+HNSW_MAX_DIMENSIONS = 2000
 
 
 class VectorStore(ABC):
     """Abstract base class for vector stores with session and document filtering."""
 
+    embeddings: Embeddings
+    store: LangChainVectorStore
+
     @abstractmethod
     def add_documents(
         self, documents: List[Document], session_id: str, doc_id: str
@@ -18,56 +52,710 @@ class VectorStore(ABC):
         """Add documents to the vector store with session and document identifiers."""
         pass
 
+    async def aadd_documents(
+        self, documents: List[Document], session_id: str, doc_id: str
+    ) -> None:
+        """Add documents to the vector store without blocking the event loop."""
+        await asyncio.to_thread(self.add_documents, documents, session_id, doc_id)
+
+    @abstractmethod
+    def add_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        session_id: str,
+        doc_id: str,
+    ) -> None:
+        """Add documents that have already been embedded with `self.embeddings`."""
+        pass
+
+    async def aadd_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        session_id: str,
+        doc_id: str,
+    ) -> None:
+        """Add already embedded documents without blocking the event loop."""
+        await asyncio.to_thread(
+            self.add_embeddings, documents, embeddings, session_id, doc_id
+        )
+
     @abstractmethod
-    def get_retriever(self, session_id: str, doc_id: str) -> VectorStoreRetriever:
-        """Get a retriever that filters by session and document."""
+    def keyword_search(self, doc_id: str, query: str, k: int) -> List[Document]:
+        """Return the document's k chunks best matching the query's terms."""
         pass
 
+    async def akeyword_search(self, doc_id: str, query: str, k: int) -> List[Document]:
+        """Keyword search without blocking the event loop."""
+        return await asyncio.to_thread(self.keyword_search, doc_id, query, k)
+
+    def get_retriever(
+        self,
+        session_id: str,
+        doc_id: str,
+        k: int = settings.retrieval_k,
+        mode: str = settings.retrieval_mode,
+    ) -> BaseRetriever:
+        """Get a retriever that filters by document.
+
+        Identical uploads share their chunks across sessions, so the chunks are
+        only tagged with the session that first uploaded them. In "hybrid" mode the
+        dense and keyword results are fused by reciprocal rank fusion.
+        """
+        if mode not in ("dense", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        fetch_k = k if mode == "dense" else max(k, settings.retrieval_fetch_k)
+        dense_retriever = self.store.as_retriever(
+            search_kwargs={"filter": {"doc_id": doc_id}, "k": fetch_k}
+        )
+        if mode == "dense":
+            return dense_retriever
+        return HybridRetriever(
+            retrievers=[
+                dense_retriever,
+                KeywordRetriever(vector_store=self, doc_id=doc_id, k=fetch_k),
+            ],
+            weights=[
+                settings.retrieval_dense_weight,
+                settings.retrieval_keyword_weight,
+            ],
+            c=settings.retrieval_rrf_k,
+            k=k,
+        )
+
     @abstractmethod
     def clear(self) -> None:
         """Clear all documents from the store."""
         pass
 
 
+class KeywordRetriever(BaseRetriever):
+    """Retriever over a vector store's keyword search, scoped to a document."""
+
+    vector_store: VectorStore
+    doc_id: str
+    k: int = settings.retrieval_k
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.vector_store.keyword_search(self.doc_id, query, self.k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.vector_store.akeyword_search(self.doc_id, query, self.k)
+
+
+class NumpyVectorStore(LangChainVectorStore):
+    """LangChain vector store keeping normalised embeddings in a float32 matrix.
+
+    Rows are indexed by doc_id, so a search filtered to a document only scores that
+    document's rows, with a vectorised dot product and `argpartition` for the top k.
+    With `index_type="hnsw"` each document also gets an HNSW graph (needs hnswlib),
+    for approximate search over documents with very many chunks.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        index_type: str = settings.vector_index_type,
+        hnsw_m: int = settings.hnsw_m,
+        hnsw_ef_construction: int = settings.hnsw_ef_construction,
+        hnsw_ef_search: int = settings.hnsw_ef_search,
+    ):
+        if index_type not in ("flat", "hnsw"):
+            raise ValueError(f"Unknown vector index type: {index_type}")
+        if index_type == "hnsw" and hnswlib is None:
+            raise ImportError("The HNSW index needs hnswlib: pip install hnswlib")
+        self.embedding = embedding
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self._lock = threading.Lock()
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self._documents: List[Document] = []
+        self._rows: Dict[str, List[int]] = {}
+        self._hnsw: Dict[str, "hnswlib.Index"] = {}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        documents = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas or [{} for _ in texts])
+        ]
+        return self.add_embeddings(documents, self.embedding.embed_documents(texts))
+
+    def add_embeddings(
+        self, documents: List[Document], embeddings: List[List[float]]
+    ) -> List[str]:
+        """Add documents with their precomputed embeddings."""
+        if not documents:
+            return []
+        vectors = _normalise(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._reserve(self._size + len(documents), vectors.shape[1])
+            rows = np.arange(self._size, self._size + len(documents))
+            self._vectors[rows] = vectors
+            self._size += len(documents)
+            ids = []
+            for row, doc in zip(rows, documents):
+                doc.id = doc.id or str(uuid.uuid4())
+                ids.append(doc.id)
+                self._documents.append(doc)
+                self._rows.setdefault(doc.metadata.get("doc_id"), []).append(int(row))
+            if self.index_type == "hnsw":
+                for doc_id in {doc.metadata.get("doc_id") for doc in documents}:
+                    self._add_to_hnsw(doc_id)
+        return ids
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding.embed_query(query), k=k, filter=filter
+        )
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        # Only embedding the query is slow, the search itself is vectorised
+        return self.similarity_search_by_vector(
+            await self.embedding.aembed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter
+            )
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """Return the k most similar documents with their cosine similarity.
+
+        Only exact match filters on metadata are supported. A `doc_id` filter is
+        answered from the document's rows without scanning the others.
+        """
+        query = _normalise(np.asarray(embedding, dtype=np.float32))
+        filter = dict(filter or {})
+        with self._lock:
+            if "doc_id" in filter:
+                doc_id = filter.pop("doc_id")
+                if self.index_type == "hnsw" and not filter and doc_id in self._hnsw:
+                    return self._search_hnsw(doc_id, query, k)
+                rows = np.asarray(self._rows.get(doc_id, []), dtype=np.int64)
+            else:
+                rows = np.arange(self._size)
+            if filter:
+                rows = np.asarray(
+                    [
+                        row
+                        for row in rows
+                        if all(
+                            self._documents[row].metadata.get(key) == value
+                            for key, value in filter.items()
+                        )
+                    ],
+                    dtype=np.int64,
+                )
+            if len(rows) == 0:
+                return []
+            scores = self._vectors[rows] @ query
+            documents = self._documents
+
+        top = np.argpartition(-scores, k - 1)[:k] if len(rows) > k else None
+        top = np.arange(len(rows)) if top is None else top
+        top = top[np.argsort(-scores[top])]
+        return [(documents[rows[i]], float(scores[i])) for i in top]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def _reserve(self, rows: int, dimensions: int) -> None:
+        """Grow the matrix, doubling its capacity, to fit at least `rows` rows."""
+        capacity = len(self._vectors)
+        if rows <= capacity and self._vectors.shape[1] == dimensions:
+            return
+        if self._size and self._vectors.shape[1] != dimensions:
+            raise ValueError(
+                f"Expected {self._vectors.shape[1]} dimensional embeddings, "
+                f"got {dimensions}"
+            )
+        vectors = np.empty((max(rows, 2 * capacity, 64), dimensions), dtype=np.float32)
+        if self._size:
+            vectors[: self._size] = self._vectors[: self._size]
+        self._vectors = vectors
+
+    def _add_to_hnsw(self, doc_id: str) -> None:
+        """Add the document's rows that aren't in its HNSW graph yet."""
+        rows = self._rows[doc_id]
+        index = self._hnsw.get(doc_id)
+        if index is None:
+            index = hnswlib.Index(space="ip", dim=self._vectors.shape[1])
+            index.init_index(
+                max_elements=len(rows),
+                M=self.hnsw_m,
+                ef_construction=self.hnsw_ef_construction,
+            )
+            self._hnsw[doc_id] = index
+        new_rows = rows[index.get_current_count() :]
+        if index.get_current_count() + len(new_rows) > index.get_max_elements():
+            index.resize_index(max(len(rows), 2 * index.get_max_elements()))
+        index.add_items(self._vectors[new_rows], new_rows)
+
+    def _search_hnsw(
+        self, doc_id: str, query: np.ndarray, k: int
+    ) -> List[Tuple[Document, float]]:
+        index = self._hnsw[doc_id]
+        index.set_ef(max(self.hnsw_ef_search, k))
+        labels, distances = index.knn_query(query, k=min(k, index.get_current_count()))
+        # Inner product distance is 1 - cosine similarity for normalised vectors
+        return [
+            (self._documents[row], 1.0 - float(distance))
+            for row, distance in zip(labels[0], distances[0])
+        ]
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    """Scale vectors to unit length, so the dot product is the cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
 class InMemoryStore(VectorStore):
-    """In-memory vector store implementation with filtering."""
+    """In-memory vector store implementation, indexed by document."""
 
     def __init__(self, embeddings: Embeddings):
-        self.store = InMemoryVectorStore(embeddings)
-        self.docs_metadata: Dict[str, Document] = (
-            {}
-        )  # Track document metadata for filtering
+        self.embeddings = embeddings
+        self.store = NumpyVectorStore(embeddings)
+        self.keyword_index = BM25Index()
 
     def add_documents(
         self, documents: List[Document], session_id: str, doc_id: str
     ) -> None:
         """Add documents to the vector store with session and document identifiers."""
+        self.add_embeddings(
+            documents,
+            self.embeddings.embed_documents([doc.page_content for doc in documents]),
+            session_id,
+            doc_id,
+        )
+
+    async def aadd_documents(
+        self, documents: List[Document], session_id: str, doc_id: str
+    ) -> None:
+        """Add documents to the vector store, embedding them asynchronously."""
+        self.add_embeddings(
+            documents,
+            await self.embeddings.aembed_documents(
+                [doc.page_content for doc in documents]
+            ),
+            session_id,
+            doc_id,
+        )
+
+    def add_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        session_id: str,
+        doc_id: str,
+    ) -> None:
+        """Add already embedded documents with session and document identifiers."""
         for doc in documents:
             doc.metadata["session_id"] = session_id
             doc.metadata["doc_id"] = doc_id
 
-        self.store.add_documents(documents)
+        self.store.add_embeddings(documents, embeddings)
+        self.keyword_index.add(doc_id, documents)
+
+    async def aadd_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        session_id: str,
+        doc_id: str,
+    ) -> None:
+        self.add_embeddings(documents, embeddings, session_id, doc_id)
+
+    def keyword_search(self, doc_id: str, query: str, k: int) -> List[Document]:
+        return self.keyword_index.search(doc_id, query, k)
+
+    async def akeyword_search(self, doc_id: str, query: str, k: int) -> List[Document]:
+        return self.keyword_search(doc_id, query, k)
+
+    def clear(self) -> None:
+        """Reset the store"""
+        self.store = NumpyVectorStore(self.embeddings)
+        self.keyword_index.clear()
+
 
-    def get_retriever(self, session_id: str, doc_id: str) -> VectorStoreRetriever:
-        """Retrieve documents from the vector store that match the session and doc identifiers."""
+class PGChunkIndex(LangChainVectorStore):
+    """LangChain vector store over a pgvector chunks table.
 
-        def filter_fn(doc: Document) -> bool:
-            return (
-                doc.metadata.get("session_id") == session_id
-                and doc.metadata.get("doc_id") == doc_id
+    Chunks have first-class doc_id and session_id columns rather than JSON metadata.
+    The table is hash partitioned by doc_id, so a document's search is pruned to one
+    partition, and has an HNSW index on the embedding. The index is searched with
+    `hnsw.ef_search` candidates and iterative scans, which keep scanning until k
+    chunks pass the doc_id filter.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        connection_pool: ConnectionPool,
+        table_name: str = "document_chunks",
+        embedding_size: int = settings.embedding_size,
+        partitions: int = settings.pg_vector_partitions,
+        index_type: str = settings.pg_vector_index_type,
+        hnsw_m: int = settings.hnsw_m,
+        hnsw_ef_construction: int = settings.hnsw_ef_construction,
+        hnsw_ef_search: int = settings.hnsw_ef_search,
+        hnsw_iterative_scan: str = settings.pg_hnsw_iterative_scan,
+    ):
+        if index_type not in ("hnsw", "none"):
+            raise ValueError(f"Unknown pgvector index type: {index_type}")
+        if index_type == "hnsw" and embedding_size > HNSW_MAX_DIMENSIONS:
+            raise ValueError(
+                f"The HNSW index supports at most {HNSW_MAX_DIMENSIONS} dimensions, "
+                f"not {embedding_size}: lower EMBEDDING_SIZE"
             )
+        self.embedding = embedding
+        self.embedding_size = embedding_size
+        self.connection_pool = connection_pool
+        self.table_name = table_name
+        self.table = sql.Identifier(table_name)
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.hnsw_iterative_scan = hnsw_iterative_scan
+        self._index_name = sql.Identifier(f"{table_name}_embedding_idx")
+        self._create_schema(embedding_size, partitions)
+        with self.connection_pool.connection() as conn:
+            self._vector_type = TypeInfo.fetch(conn, "vector")
+            self._check_column_size(conn)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        documents = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas or [{} for _ in texts])
+        ]
+        return self.add_embeddings(documents, self.embedding.embed_documents(texts))
+
+    def add_embeddings(
+        self, documents: List[Document], embeddings: List[List[float]]
+    ) -> List[str]:
+        """Insert documents, tagged with doc_id and session_id, with their embeddings.
 
-        return self.store.as_retriever(
-            search_kwargs={
-                "filter": filter_fn,
-                "k": 4,  # Number of relevant chunks to retrieve
-            }
+        Rows are written with a single binary COPY in one transaction, vectors
+        included, instead of an INSERT per chunk.
+        """
+        vectors = np.asarray(embeddings, dtype=">f4")  # pgvector's binary layout
+        if len(vectors):
+            self._check_size(vectors.shape[1])
+        ids = []
+        with self.connection_pool.connection() as conn:
+            with conn.cursor() as cur:
+                # Registered on the cursor, the pooled connection is left untouched
+                register_vector_info(cur, self._vector_type)
+                with cur.copy(
+                    sql.SQL(
+                        "COPY {} (id, doc_id, session_id, content, metadata, "
+                        "embedding) FROM STDIN WITH (FORMAT BINARY)"
+                    ).format(self.table)
+                ) as copy:
+                    copy.set_types(["uuid", "text", "text", "text", "jsonb", "vector"])
+                    for doc, vector in zip(documents, vectors):
+                        doc.id = doc.id or str(uuid.uuid4())
+                        ids.append(doc.id)
+                        copy.write_row(
+                            (
+                                uuid.UUID(doc.id),
+                                doc.metadata["doc_id"],
+                                doc.metadata["session_id"],
+                                doc.page_content,
+                                Jsonb(doc.metadata),
+                                vector,
+                            )
+                        )
+        return ids
+
+    @contextmanager
+    def deferred_index(self) -> Iterator[None]:
+        """Drop the HNSW index during a large load and build it once afterwards.
+
+        Building the index over the loaded rows is much faster than maintaining it
+        row by row, but searches are exact scans until it is rebuilt. Meant for
+        backfills and re-embedding, the index covers every document.
+        """
+        if self.index_type != "hnsw":
+            yield
+            return
+        with self.connection_pool.connection() as conn:
+            conn.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(self._index_name))
+        try:
+            yield
+        finally:
+            start = time.perf_counter()
+            with self.connection_pool.connection() as conn:
+                self._create_index(conn)
+            logger.info(
+                f"Built the HNSW index of {self.table_name} in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding.embed_query(query), k=k, filter=filter
         )
 
+    async def asimilarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        embedding = await self.embedding.aembed_query(query)
+        return await asyncio.to_thread(
+            self.similarity_search_by_vector, embedding, k, filter
+        )
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter
+            )
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """Return the k most similar chunks with their cosine similarity.
+
+        Filters on `doc_id` and `session_id` use their columns, any other keys
+        are matched against the chunk's metadata.
+        """
+        filter = dict(filter or {})
+        conditions, params = [], []
+        for column in ("doc_id", "session_id"):
+            if column in filter:
+                conditions.append(sql.SQL("{} = %s").format(sql.Identifier(column)))
+                params.append(filter.pop(column))
+        if filter:
+            conditions.append(sql.SQL("metadata @> %s"))
+            params.append(Jsonb(filter))
+        where = (
+            sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions)
+            if conditions
+            else sql.SQL("")
+        )
+        self._check_size(len(embedding))
+        vector = _to_vector(embedding)
+        query = sql.SQL(
+            "SELECT id, content, metadata, 1 - (embedding <=> %s::vector) "
+            "FROM {} {} ORDER BY embedding <=> %s::vector LIMIT %s"
+        ).format(self.table, where)
+
+        with self.connection_pool.connection() as conn:
+            # Local to this transaction, pooled connections are left untouched
+            conn.execute(
+                "SELECT set_config('hnsw.ef_search', %s, true)",
+                (str(max(self.hnsw_ef_search, k)),),
+            )
+            if self.hnsw_iterative_scan:
+                conn.execute(
+                    "SELECT set_config('hnsw.iterative_scan', %s, true)",
+                    (self.hnsw_iterative_scan,),
+                )
+            rows = conn.execute(query, [vector, *params, vector, k]).fetchall()
+
+        return [
+            (Document(id=str(id), page_content=content, metadata=metadata), score)
+            for id, content, metadata, score in rows
+        ]
+
+    def keyword_search(self, doc_id: str, query: str, k: int = 4) -> List[Document]:
+        """Return the document's k chunks best matching any of the query's terms.
+
+        Ranked by `ts_rank_cd` over the chunk's full text search vector, the query's
+        terms are OR'ed as questions rarely contain every term of a chunk.
+        """
+        with self.connection_pool.connection() as conn:
+            rows = conn.execute(
+                sql.SQL(
+                    "SELECT id, content, metadata FROM {}, "
+                    "to_tsquery('english', replace("
+                    "plainto_tsquery('english', %s)::text, ' & ', ' | ')) AS query "
+                    "WHERE doc_id = %s AND content_tsv @@ query "
+                    "ORDER BY ts_rank_cd(content_tsv, query) DESC LIMIT %s"
+                ).format(self.table),
+                (query, doc_id, k),
+            ).fetchall()
+        return [
+            Document(id=str(id), page_content=content, metadata=metadata)
+            for id, content, metadata in rows
+        ]
+
     def clear(self) -> None:
-        """Reset both store and metadata"""
-        self.store = InMemoryVectorStore(self.store._embedding)
-        self.docs_metadata.clear()
+        with self.connection_pool.connection() as conn:
+            conn.execute(sql.SQL("TRUNCATE {}").format(self.table))
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "PGChunkIndex":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def _create_schema(self, embedding_size: int, partitions: int) -> None:
+        """Create the partitioned chunks table and its indexes if they don't exist."""
+        with self.connection_pool.connection() as conn:
+            conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            conn.execute(
+                sql.SQL(
+                    """
+                    CREATE TABLE IF NOT EXISTS {} (
+                        id UUID NOT NULL,
+                        doc_id TEXT NOT NULL,
+                        session_id TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        metadata JSONB NOT NULL,
+                        embedding vector({}) NOT NULL,
+                        PRIMARY KEY (doc_id, id)
+                    ) PARTITION BY HASH (doc_id)
+                    """
+                ).format(self.table, sql.Literal(embedding_size))
+            )
+            for remainder in range(partitions):
+                conn.execute(
+                    sql.SQL(
+                        "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} "
+                        "FOR VALUES WITH (MODULUS {}, REMAINDER {})"
+                    ).format(
+                        sql.Identifier(f"{self.table_name}_p{remainder}"),
+                        self.table,
+                        sql.Literal(partitions),
+                        sql.Literal(remainder),
+                    )
+                )
+            # Full text search vector for keyword retrieval
+            conn.execute(
+                sql.SQL(
+                    "ALTER TABLE {} ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+                    "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED"
+                ).format(self.table)
+            )
+            conn.execute(
+                sql.SQL(
+                    "CREATE INDEX IF NOT EXISTS {} ON {} USING gin (content_tsv)"
+                ).format(
+                    sql.Identifier(f"{self.table_name}_content_tsv_idx"), self.table
+                )
+            )
+            # The primary key is the B-tree index on doc_id
+            conn.execute(
+                sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (session_id)").format(
+                    sql.Identifier(f"{self.table_name}_session_id_idx"), self.table
+                )
+            )
+            self._create_index(conn)
+
+    def _check_column_size(self, conn: psycopg.Connection) -> None:
+        """Check the existing table stores vectors of the configured size."""
+        (column_size,) = conn.execute(
+            "SELECT atttypmod FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = 'embedding'",
+            (self.table_name,),
+        ).fetchone()
+        if column_size != self.embedding_size:
+            raise ValueError(
+                f"{self.table_name} stores {column_size} dimensional embeddings, but "
+                f"EMBEDDING_SIZE is {self.embedding_size}: the documents must be "
+                "re-ingested into a new table to change it"
+            )
+
+    def _check_size(self, size: int) -> None:
+        if size != self.embedding_size:
+            raise ValueError(
+                f"Got {size} dimensional embeddings, {self.table_name} stores "
+                f"{self.embedding_size}: check EMBEDDING_MODEL and EMBEDDING_SIZE"
+            )
+
+    def _create_index(self, conn: psycopg.Connection) -> None:
+        if self.index_type == "hnsw":
+            conn.execute(
+                sql.SQL(
+                    "CREATE INDEX IF NOT EXISTS {} ON {} "
+                    "USING hnsw (embedding vector_cosine_ops) "
+                    "WITH (m = {}, ef_construction = {})"
+                ).format(
+                    self._index_name,
+                    self.table,
+                    sql.Literal(self.hnsw_m),
+                    sql.Literal(self.hnsw_ef_construction),
+                )
+            )
+
+
+def _to_vector(embedding: List[float]) -> str:
+    """Format an embedding as a pgvector literal."""
+    return "[" + ",".join(map(str, embedding)) + "]"
 
 
 class PGVectorStore(VectorStore):
@@ -76,33 +764,44 @@ class PGVectorStore(VectorStore):
     def __init__(
         self,
         embeddings: Embeddings,
-        connection_string: str,
-        collection_name: str = "documents",
+        connection_pool: Optional[ConnectionPool] = None,
+        table_name: str = "document_chunks",
     ):
-        self.store = PGVector(
-            embedding_function=embeddings,
-            connection_string=connection_string,
-            collection_name=collection_name,
+        self.embeddings = embeddings
+        self.store = PGChunkIndex(
+            embedding=embeddings,
+            connection_pool=connection_pool or get_connection_pool(),
+            table_name=table_name,
         )
 
     def add_documents(
         self, documents: List[Document], session_id: str, doc_id: str
     ) -> None:
         """Add documents to the vector store with session and document identifiers."""
+        self.add_embeddings(
+            documents,
+            self.embeddings.embed_documents([doc.page_content for doc in documents]),
+            session_id,
+            doc_id,
+        )
+
+    def add_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        session_id: str,
+        doc_id: str,
+    ) -> None:
+        """Add already embedded documents with session and document identifiers."""
         for doc in documents:
             doc.metadata["session_id"] = session_id
             doc.metadata["doc_id"] = doc_id
 
-        self.store.add_documents(documents)
+        self.store.add_embeddings(documents, embeddings)
 
-    def get_retriever(self, session_id: str, doc_id: str) -> VectorStoreRetriever:
-        return self.store.as_retriever(
-            search_kwargs={
-                "filter": {"session_id": session_id, "doc_id": doc_id},
-                "k": 4,  # Number of relevant chunks to retrieve
-            }
-        )
+    def keyword_search(self, doc_id: str, query: str, k: int) -> List[Document]:
+        return self.store.keyword_search(doc_id, query, k)
 
     def clear(self) -> None:
-        """Clear all documents from the collection"""
-        self.store.delete_collection()
+        """Delete all chunks from the table"""
+        self.store.clear()
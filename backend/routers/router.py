@@ -1,15 +1,21 @@
+import asyncio
+import json
 import logging
 import uuid
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Response, UploadFile
+from fastapi.responses import StreamingResponse
 
-from dependencies.services import get_pdf_service
+from dependencies.services import get_ingestion_queue, get_pdf_service, services
 from models.api_models import AppInfo, QueryRequest
+from repositories.session_db import CachedDocumentStore
+from services.ingestion_jobs import IngestionJobQueue
 from services.pdf_chat_service import PDFChatService
 from settings import settings
-from utills.db_utils import trigger_db_wakeup
+from utills.db_utils import get_connection_pool_stats, trigger_db_wakeup
+from utills.file_utils import UploadTooLargeError, save_stream
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +42,21 @@ def wake_up():
     return {"status": "ok", "message": "Database wake-up triggered"}
 
 
+@router.get("/metrics")
+def get_metrics():
+    """Endpoint exposing service, routing, cache and connection pool statistics."""
+    metrics = {"services": services.metrics, "db_pool": get_connection_pool_stats()}
+    if services.pdf_service is not None:
+        metrics["router"] = services.pdf_service.router.stats()
+        if services.pdf_service.answer_cache is not None:
+            metrics["answer_cache"] = services.pdf_service.answer_cache.stats()
+    if services.embeddings is not None:
+        metrics["embeddings"] = services.embeddings.stats()
+    if isinstance(services.document_store, CachedDocumentStore):
+        metrics["document_cache"] = services.document_store.stats()
+    return metrics
+
+
 @router.get("/session")
 def get_session():
     return {"session": str(uuid.uuid4())}
@@ -51,10 +72,11 @@ async def query(
     logger.info(f"Doc ID: {request.doc_id}")
 
     try:
-        result = pdf_service.query(
+        result = await pdf_service.aquery(
             session_id=request.session_id,
             doc_id=request.doc_id,
             question=request.query,
+            bypass_cache=request.bypass_cache,
         )
         return {"message": result}
     except Exception as e:
@@ -62,27 +84,113 @@ async def query(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/query/stream")
+async def query_stream(
+    request: QueryRequest,
+    pdf_service: Annotated[PDFChatService, Depends(get_pdf_service)],
+):
+    """Stream the answer to a query as Server-Sent Events."""
+    logger.info(f"Streaming query for session {request.session_id}")
+    logger.info(f"Query: {request.query}")
+    logger.info(f"Doc ID: {request.doc_id}")
+
+    tokens = pdf_service.astream_query(
+        session_id=request.session_id,
+        doc_id=request.doc_id,
+        question=request.query,
+        bypass_cache=request.bypass_cache,
+    )
+    return StreamingResponse(
+        _to_sse(tokens),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _to_sse(tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Format answer tokens as Server-Sent Events, ending with a done/error event."""
+    try:
+        async for token in tokens:
+            yield f"data: {json.dumps({'token': token})}\n\n"
+    except Exception as e:
+        logger.error(f"Streaming query failed: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        return
+    yield "event: done\ndata: {}\n\n"
+
+
 @router.post("/upload")
 async def upload_file(
+    response: Response,
     pdf_service: Annotated[PDFChatService, Depends(get_pdf_service)],
+    ingestion_queue: Annotated[IngestionJobQueue, Depends(get_ingestion_queue)],
     file: UploadFile = File(...),
     session_id: str = Form(...),
 ):
+    """Save and ingest the PDF.
+
+    With background tasks the PDF is queued for ingestion and a 202 is returned at
+    once, poll `/upload/{job_id}` for progress. Otherwise, as on Lambda, it's ingested
+    before the response.
+    """
     logger.info(f"Uploading file for session {session_id}")
+    # Clients may not send a filename
+    filename = Path(file.filename or "upload.pdf").name
+    # Unique per upload, so concurrent uploads of files with the same name don't clash
+    file_path = UPLOAD_DIR / f"{uuid.uuid4()}-{filename}"
     try:
-        file_path = UPLOAD_DIR / file.filename
-        contents = await file.read()
-
-        with open(file_path, "wb") as f:
-            f.write(contents)
-
-        result = pdf_service.upload(str(file_path), session_id)
+        if file.size is not None and file.size > settings.max_upload_bytes:
+            raise UploadTooLargeError(
+                f"Upload is larger than the {settings.max_upload_bytes} byte limit"
+            )
+        # Streamed to disk in blocks, so memory use doesn't grow with the file size.
+        # Identical uploads are stored once, keyed by the content hash
+        content_hash, size = await asyncio.to_thread(
+            save_stream, file.file, str(file_path), settings.max_upload_bytes
+        )
+        logger.info(f"Saved {size} byte upload to {file_path}")
+
+        if not settings.background_tasks:
+            try:
+                result = await pdf_service.aupload(
+                    str(file_path), session_id, content_hash=content_hash
+                )
+            finally:
+                file_path.unlink(missing_ok=True)
+            return {
+                "doc_id": result["doc_id"],
+                "status": "completed",
+                "message": result["message"],
+                "filename": filename,
+            }
+
+        job = ingestion_queue.submit(
+            str(file_path), session_id, filename, content_hash=content_hash
+        )
+        response.status_code = 202
         return {
-            "doc_id": result["doc_id"],
-            "message": result["message"],
-            "filename": file.filename,
+            "job_id": job.job_id,
+            "status": job.status,
+            "message": "File queued for processing",
+            "filename": filename,
         }
 
+    except UploadTooLargeError as e:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.exception("Upload failed with error:")
+        file_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/upload/{job_id}")
+def get_upload_status(
+    job_id: str,
+    ingestion_queue: Annotated[IngestionJobQueue, Depends(get_ingestion_queue)],
+):
+    """Status of an upload's ingestion job, with the progress of each stage."""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown upload job {job_id}")
+    return job.to_dict()
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from services.pdf_chat_service import IngestionProgress, PDFChatService
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestionJob:
+    """A queued PDF upload and its progress through the ingestion stages."""
+
+    job_id: str
+    session_id: str
+    filename: str
+    file_path: str
+    content_hash: Optional[str] = None
+    status: str = "queued"  # queued, running, completed or failed
+    progress: IngestionProgress = field(default_factory=IngestionProgress)
+    doc_id: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Job status as returned by the API."""
+        job = asdict(self)
+        del job["file_path"], job["content_hash"]
+        return job
+
+
+class IngestionJobQueue:
+    """In-process queue of uploads, ingested by a fixed number of worker tasks.
+
+    Uploads return as soon as they are queued, and clients poll the job's status.
+    Workers are started on the first submitted job, on the running event loop. The
+    saved upload is deleted once its job has finished. Jobs only live in this process,
+    so the queue is only used with `settings.background_tasks`.
+    """
+
+    def __init__(
+        self,
+        pdf_service: PDFChatService,
+        workers: int = settings.ingestion_workers,
+        max_jobs: int = settings.ingestion_max_jobs,
+    ):
+        self.pdf_service = pdf_service
+        self.num_workers = workers
+        self.max_jobs = max_jobs
+        self._queue: asyncio.Queue[IngestionJob] = asyncio.Queue()
+        self._jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def submit(
+        self,
+        file_path: str,
+        session_id: str,
+        filename: str,
+        content_hash: Optional[str] = None,
+    ) -> IngestionJob:
+        """Queue a PDF for ingestion and return its job."""
+        self._start_workers()
+        job = IngestionJob(
+            job_id=str(uuid.uuid4()),
+            session_id=session_id,
+            filename=filename,
+            file_path=file_path,
+            content_hash=content_hash,
+        )
+        self._jobs[job.job_id] = job
+        self._forget_finished_jobs()
+        self._queue.put_nowait(job)
+        logger.info(f"Queued ingestion job {job.job_id} for session {session_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    async def join(self) -> None:
+        """Wait until every queued job has finished."""
+        await self._queue.join()
+
+    def close(self) -> None:
+        """Stop the workers, jobs still queued are dropped."""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers.clear()
+        self._loop = None
+
+    def _start_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Workers and the queue belong to a single event loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._workers = [
+                asyncio.create_task(self._work()) for _ in range(self.num_workers)
+            ]
+
+    def _forget_finished_jobs(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in ("completed", "failed")
+        ]
+        for job_id in finished[: max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            try:
+                result = await self.pdf_service.aupload(
+                    job.file_path,
+                    job.session_id,
+                    content_hash=job.content_hash,
+                    progress=job.progress,
+                )
+                job.doc_id = result["doc_id"]
+                job.status = "completed"
+            except Exception as e:
+                logger.error(f"Ingestion job {job.job_id} failed: {str(e)}")
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                Path(job.file_path).unlink(missing_ok=True)
+                self._queue.task_done()
@@ -1,21 +1,80 @@
+import asyncio
+import itertools
 import logging
+import tempfile
 import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 from langchain.schema import Document
-from langchain_community.chat_message_histories import PostgresChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.retrievers import BaseRetriever
 
+from brain.answer_cache import SemanticAnswerCache
+from brain.chat_memory import ChatMemory
 from brain.document_processing import DocumentProcessor
-from brain.model_router import create_router
+from brain.model_router import QueryRouter
 from brain.rag import RAGChain
-from brain.summariser import SummaryChain
+from brain.summariser import SUMMARY_PROMPT_VERSION, SummaryChain
+from repositories.chat_history import PostgresChatHistory
 from repositories.session_db import DocumentStore
 from repositories.vector_db import VectorStore
 from settings import settings
+from utills.file_utils import hash_file
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+@dataclass
+class QueryContext:
+    """Everything gathered for a query before the answer is generated."""
+
+    task: str
+    history: PostgresChatHistory
+    messages: List[BaseMessage]
+    retriever: BaseRetriever
+    documents: Optional[List[Document]] = None
+    # Set when the answer cache applies, i.e. enabled and there's no chat history
+    question_embedding: Optional[List[float]] = None
+    answer: Optional[str] = None
+
+
+INGESTION_STAGES = ("parse", "chunk", "embed", "index")
+
+
+@dataclass
+class StageProgress:
+    """Progress of one ingestion stage, items are pages for parse and chunks after."""
+
+    status: str = "pending"  # pending, running, completed or failed
+    items: int = 0
+
+
+@dataclass
+class IngestionProgress:
+    """Per stage progress of a document ingestion."""
+
+    stages: Dict[str, StageProgress] = field(
+        default_factory=lambda: {stage: StageProgress() for stage in INGESTION_STAGES}
+    )
+    deduplicated: bool = False
+
+    def start(self, stage: str) -> None:
+        self.stages[stage].status = "running"
+
+    def advance(self, stage: str, items: int) -> None:
+        self.stages[stage].items += items
+
+    def complete(self, stage: str) -> None:
+        self.stages[stage].status = "completed"
+
+    def fail(self) -> None:
+        for progress in self.stages.values():
+            if progress.status != "completed":
+                progress.status = "failed"
+
+
 class PDFChatService:
     def __init__(
         self,
@@ -24,6 +83,12 @@ class PDFChatService:
         document_store: DocumentStore,
         rag_chain: RAGChain,
         summary_chain: SummaryChain,
+        precompute_summaries: bool = False,
+        deduplicate_uploads: bool = False,
+        ingestion_batch_size: int = settings.ingestion_batch_size,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        chat_memory: Optional[ChatMemory] = None,
+        background_tasks: bool = True,
     ):
         logger.info("Initializing PDFChatService")
         self.document_processor = document_processor
@@ -31,47 +96,78 @@ class PDFChatService:
         self.summary_chain = summary_chain
         self.vector_store = vector_store
         self.document_store = document_store
-        self.router = create_router()
+        self.router = QueryRouter()
+        # Start generating the summary in the background as soon as a PDF is uploaded
+        self.precompute_summaries = precompute_summaries
+        # In-flight summary jobs keyed by (doc_id, prompt version)
+        self._summary_jobs: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Store identical PDFs once, sharing them between the sessions uploading them
+        self.deduplicate_uploads = deduplicate_uploads
+        # In-flight ingestions keyed by content hash
+        self._ingest_jobs: Dict[str, asyncio.Task] = {}
+        # Chunks embedded and indexed at a time while ingesting
+        self.ingestion_batch_size = ingestion_batch_size
+        # Answers to similar questions, asked without chat history, of the same document
+        self.answer_cache = answer_cache
+        # Bounded window of the chat history given to the prompt
+        self.chat_memory = chat_memory or ChatMemory()
+        # In-flight rolling summary updates keyed by chat history session
+        self._history_jobs: Dict[str, asyncio.Task] = {}
+        # Update the rolling summary after the response, rather than before it
+        self.background_tasks = background_tasks
 
     def query(
         self,
         session_id: str,
         doc_id: str,
         question: str,
+        bypass_cache: bool = False,
+    ):
+        """
+        Synchronous wrapper around `aquery` for scripts and tests.
+        Must not be called from a running event loop.
+        """
+        return asyncio.run(self.aquery(session_id, doc_id, question, bypass_cache))
+
+    async def aquery(
+        self,
+        session_id: str,
+        doc_id: str,
+        question: str,
+        bypass_cache: bool = False,
     ):
         """
         Query the document with a question/task.
+        With `bypass_cache` the answer cache is neither read nor updated.
         """
         logger.info(
             f"Querying with question: {question}, session_id: {session_id}, doc_id: {doc_id}"
         )
 
-        # Get document content
-        full_text = self.document_store.get_document(doc_id)
-        if not full_text:
-            return "Please upload a document first."
-
-        state_key = f"{session_id}:{doc_id}"
-        history = PostgresChatMessageHistory(
-            connection_string=settings.connection_string,
-            session_id=state_key,
-        )
-
         try:
-            result = self.router.invoke(question)
-
-            if result.task.lower() == "q_and_a":
-                retriever = self.vector_store.get_retriever(session_id, doc_id)
-                result = self.rag_chain.run(question, retriever, history.messages)
-            elif result.task.lower() == "summary":
-                full_text_doc = [Document(page_content=full_text, metadata={})]
-                result = self.summary_chain.run(full_text_doc)
+            context = await self._prepare_query(
+                session_id, doc_id, question, bypass_cache
+            )
+            if context is None:
+                return "Please upload a document first."
+
+            if context.answer is not None:
+                result = context.answer
+            elif context.task == "q_and_a":
+                result = await self.rag_chain.arun(
+                    question,
+                    context.retriever,
+                    context.messages,
+                    documents=context.documents,
+                )
+            elif context.task == "summary":
+                result = await self._get_summary(doc_id)
             else:
                 return "Invalid task"
 
+            self._cache_answer(context, doc_id, question, result)
             # Add messages to history
-            history.add_user_message(question)
-            history.add_ai_message(result)
+            await self._save_turn(context.history, question, result)
 
             return result
 
@@ -79,36 +175,458 @@ class PDFChatService:
             logger.error(f"Failed to process query: {str(e)}", exc_info=True)
             raise Exception(f"Failed to process query: {str(e)}")
 
+    async def astream_query(
+        self,
+        session_id: str,
+        doc_id: str,
+        question: str,
+        bypass_cache: bool = False,
+    ) -> AsyncIterator[str]:
+        """
+        Query the document with a question/task, yielding the answer as it is generated.
+        The chat history is only written once the full answer has been streamed.
+        With `bypass_cache` the answer cache is neither read nor updated.
+        """
+        logger.info(
+            f"Streaming query with question: {question}, session_id: {session_id}, doc_id: {doc_id}"
+        )
+
+        try:
+            context = await self._prepare_query(
+                session_id, doc_id, question, bypass_cache
+            )
+            if context is None:
+                yield "Please upload a document first."
+                return
+
+            if context.answer is not None:
+                tokens = _yield_once(context.answer)
+            elif context.task == "q_and_a":
+                tokens = self.rag_chain.astream(
+                    question,
+                    context.retriever,
+                    context.messages,
+                    documents=context.documents,
+                )
+            elif context.task == "summary":
+                tokens = self._stream_summary(doc_id)
+            else:
+                yield "Invalid task"
+                return
+
+            answer = []
+            async for token in tokens:
+                answer.append(token)
+                yield token
+
+            self._cache_answer(context, doc_id, question, "".join(answer))
+            # Add messages to history once the answer is complete
+            await self._save_turn(context.history, question, "".join(answer))
+
+        except Exception as e:
+            logger.error(f"Failed to stream query: {str(e)}", exc_info=True)
+            raise Exception(f"Failed to process query: {str(e)}")
+
+    async def _prepare_query(
+        self, session_id: str, doc_id: str, question: str, bypass_cache: bool = False
+    ) -> Optional[QueryContext]:
+        """
+        Run everything a query needs concurrently: the document existence check, routing,
+        chat history load, retrieval and, if the answer cache applies, the question's
+        embedding. Retrieval is speculative, it doesn't depend on the route and is
+        cancelled if the question is routed to a summary. Without chat history, a cached
+        answer cancels routing and retrieval.
+        Returns None if the document doesn't exist.
+        """
+        retriever = self.vector_store.get_retriever(session_id, doc_id)
+        # Only checked, the full text is only read if a summary must be generated
+        document_task = asyncio.create_task(
+            self.document_store.adocument_exists(doc_id)
+        )
+        history_task = asyncio.create_task(self._load_history(session_id, doc_id))
+        route_task = asyncio.create_task(self.router.ainvoke(question))
+        retrieval_task = asyncio.create_task(retriever.ainvoke(question))
+        tasks = [document_task, history_task, route_task, retrieval_task]
+        embedding_task = None
+        if self.answer_cache is not None and not bypass_cache:
+            # Retrieval embeds the same question, BatchedEmbeddings makes one call
+            embedding_task = asyncio.create_task(
+                self.vector_store.embeddings.aembed_query(question)
+            )
+            tasks.append(embedding_task)
+
+        try:
+            history, messages = await history_task
+            question_embedding = None
+            # Follow-up questions depend on the conversation, so aren't cached
+            if embedding_task is not None and not messages:
+                question_embedding = await embedding_task
+                answer = self.answer_cache.get(doc_id, question_embedding)
+                if answer is not None:
+                    if not await document_task:
+                        return None
+                    logger.info(f"Answer cache hit for document {doc_id}")
+                    return QueryContext(
+                        task="cached",
+                        history=history,
+                        messages=messages,
+                        retriever=retriever,
+                        answer=answer,
+                    )
+
+            if not await document_task:
+                return None
+
+            task = (await route_task).task.lower()
+            if task != "q_and_a":
+                retrieval_task.cancel()
+                documents = None
+            else:
+                documents = await retrieval_task
+
+            return QueryContext(
+                task=task,
+                history=history,
+                messages=messages,
+                retriever=retriever,
+                documents=documents,
+                question_embedding=question_embedding,
+            )
+        finally:
+            for pending in tasks:
+                pending.cancel()
+            # Let cancelled tasks finish so their exceptions aren't left unretrieved
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _cache_answer(
+        self, context: QueryContext, doc_id: str, question: str, answer: str
+    ) -> None:
+        """Cache a freshly generated answer, if the answer cache applied to the query."""
+        if context.question_embedding is not None and context.answer is None:
+            self.answer_cache.put(doc_id, question, context.question_embedding, answer)
+
     def upload(self, file_path: str, session_id: str) -> dict:
+        """
+        Synchronous wrapper around `aupload` for scripts and tests.
+        Must not be called from a running event loop.
+        """
+
+        async def upload_and_summarise():
+            result = await self.aupload(file_path, session_id)
+            # Don't let the event loop close on an in-flight summary job
+            await self.wait_for_summary(result["doc_id"])
+            return result
+
+        return asyncio.run(upload_and_summarise())
+
+    async def aupload(
+        self,
+        file_path: str,
+        session_id: str,
+        content_hash: Optional[str] = None,
+        progress: Optional[IngestionProgress] = None,
+    ) -> dict:
         """
         Upload a PDF file to the service. Creates new session state.
+        If the same file was uploaded before, the stored document is attached to
+        the session instead of being processed again.
+        Per stage progress is reported to `progress`, if given.
         Returns document ID and filename.
         """
+        progress = progress or IngestionProgress()
         logger.info(f"Starting upload process for session_id: {session_id}")
 
         try:
-            pages = self.document_processor.load_pdf(file_path)
-            logger.info(f"Successfully loaded PDF with {len(pages)} pages")
+            if self.deduplicate_uploads:
+                doc_id = await self._deduplicated_ingest(
+                    file_path, session_id, content_hash, progress
+                )
+            else:
+                doc_id = await self._ingest(
+                    file_path, session_id, content_hash, progress
+                )
+
+            return {"doc_id": doc_id, "message": "File uploaded successfully!"}
+
+        except Exception as e:
+            progress.fail()
+            logger.error(f"Upload failed: {str(e)}", exc_info=True)
+            raise Exception(f"Failed to process PDF: {str(e)}")
+
+    async def _deduplicated_ingest(
+        self,
+        file_path: str,
+        session_id: str,
+        content_hash: Optional[str],
+        progress: IngestionProgress,
+    ) -> str:
+        """
+        Return the document already stored for the file's content, attaching the
+        session to it, or ingest the file if it's new. Concurrent uploads of the same
+        file share a single ingestion.
+        """
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(hash_file, file_path)
+
+        doc_id = None
+        if content_hash not in self._ingest_jobs:
+            doc_id = await self.document_store.aget_doc_id_by_hash(content_hash)
+
+        if doc_id is None:
+            job = self._ingest_jobs.get(content_hash)
+            if job is None:
+                job = asyncio.create_task(
+                    self._ingest(file_path, session_id, content_hash, progress)
+                )
+                job.add_done_callback(
+                    lambda _: self._ingest_jobs.pop(content_hash, None)
+                )
+                self._ingest_jobs[content_hash] = job
+                # Shielded so one cancelled request doesn't cancel the shared job
+                return await asyncio.shield(job)
+            doc_id = await asyncio.shield(job)
+
+        logger.info(f"Document {doc_id} already ingested, attaching to {session_id}")
+        await self.document_store.aattach_session(doc_id, session_id)
+        progress.deduplicated = True
+        for stage in INGESTION_STAGES:
+            progress.complete(stage)
+        return doc_id
+
+    async def _ingest(
+        self,
+        file_path: str,
+        session_id: str,
+        content_hash: Optional[str] = None,
+        progress: Optional[IngestionProgress] = None,
+    ) -> str:
+        """
+        Parse, chunk, embed and index a PDF, returning the new document ID.
+        Pages are parsed and chunked lazily, a batch at a time, while earlier batches
+        are embedded and indexed. The page text is written to a temporary file as it
+        goes, so memory use is bounded by the batch size, not the document size.
+        """
+        progress = progress or IngestionProgress()
+        doc_id = str(uuid.uuid4())
+        chunks_queue: asyncio.Queue[Optional[List[Document]]] = asyncio.Queue(maxsize=2)
+        embedded_queue: asyncio.Queue[
+            Optional[Tuple[List[Document], List[List[float]]]]
+        ] = asyncio.Queue(maxsize=2)
+
+        # Newlines aren't translated, so the page offsets are offsets into the file
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", newline="", suffix=".txt"
+        ) as text_file:
+
+            # Where each page starts in the text, so pages can be stored separately
+            page_offsets: List[int] = []
+
+            def iter_pages() -> Iterator[Document]:
+                """Yield the parsed pages, writing their text to the text file."""
+                progress.start("parse")
+                pages = self.document_processor.iter_pages(file_path)
+                length = 0
+                for number, page in enumerate(pages):
+                    # Pages are separated by newlines, as in the stored full text
+                    separator = "\n" if number else ""
+                    page_offsets.append(length + len(separator))
+                    length += len(separator) + len(page.page_content)
+                    text_file.write(separator + page.page_content)
+                    progress.advance("parse", 1)
+                    yield page
+                progress.complete("parse")
+
+            chunks = self.document_processor.iter_chunks(iter_pages())
+
+            async def parse_and_chunk() -> None:
+                # PDF parsing and chunking are CPU bound, keep them off the event loop
+                def next_batch() -> List[Document]:
+                    return list(itertools.islice(chunks, self.ingestion_batch_size))
 
-            docs = self.document_processor.chunk_docs(pages)
-            doc_id = str(uuid.uuid4())
+                progress.start("chunk")
+                while batch := await asyncio.to_thread(next_batch):
+                    progress.advance("chunk", len(batch))
+                    await chunks_queue.put(batch)
+                progress.complete("chunk")
+                await chunks_queue.put(None)
 
-            # Prepare and store full text for summarization
-            full_text = "\n".join([page.page_content for page in pages])
-            self.document_store.put_document(
+            async def embed() -> None:
+                while (docs := await chunks_queue.get()) is not None:
+                    progress.start("embed")
+                    embeddings = await self.vector_store.embeddings.aembed_documents(
+                        [doc.page_content for doc in docs]
+                    )
+                    progress.advance("embed", len(docs))
+                    await embedded_queue.put((docs, embeddings))
+                progress.complete("embed")
+                await embedded_queue.put(None)
+
+            async def index() -> None:
+                while (batch := await embedded_queue.get()) is not None:
+                    progress.start("index")
+                    docs, embeddings = batch
+                    await self.vector_store.aadd_embeddings(
+                        docs, embeddings, session_id, doc_id
+                    )
+                    progress.advance("index", len(docs))
+                progress.complete("index")
+
+            # A failing stage cancels the others
+            try:
+                async with asyncio.TaskGroup() as stages:
+                    for stage in [parse_and_chunk(), embed(), index()]:
+                        stages.create_task(stage)
+            except ExceptionGroup as e:
+                # Surface the failing stage's own error
+                raise e.exceptions[0]
+            logger.info(
+                f"Successfully loaded {progress.stages['parse'].items} pages and "
+                f"added {progress.stages['index'].items} chunks to vector store"
+            )
+
+            # Store the full text for summarization. Stored last, so the content
+            # hash only resolves to this document once its chunks are indexed
+            text_file.flush()
+            await self.document_store.aput_document_file(
                 doc_id=doc_id,
                 session_id=session_id,
-                full_text=full_text,
+                text_path=text_file.name,
                 filename=file_path,
+                content_hash=content_hash,
+                page_offsets=page_offsets,
             )
             logger.info("Successfully saved document content")
 
-            # Add documents to vector store with session and doc identifiers
-            self.vector_store.add_documents(docs, session_id, doc_id)
-            logger.info("Successfully added documents to vector store")
+        if self.precompute_summaries:
+            self._start_summary_job(doc_id)
 
-            return {"doc_id": doc_id, "message": "File uploaded successfully!"}
+        return doc_id
+
+    async def wait_for_summary(self, doc_id: str) -> None:
+        """Wait for an in-flight summary job for the document, if there is one."""
+        job = self._summary_jobs.get((doc_id, SUMMARY_PROMPT_VERSION))
+        if job is not None:
+            await asyncio.wait([job])
+
+    def _start_summary_job(
+        self, doc_id: str, full_text: Optional[str] = None
+    ) -> asyncio.Task:
+        """
+        Generate and store the document summary in the background. Concurrent requests
+        for the same document and prompt version share a single job. The full text is
+        read from the document store if it isn't given.
+        """
+        key = (doc_id, SUMMARY_PROMPT_VERSION)
+        job = self._summary_jobs.get(key)
+        if job is not None:
+            return job
+
+        async def summarise() -> str:
+            text = full_text
+            if text is None:
+                text = await self.document_store.aget_document(doc_id)
+            full_text_doc = [Document(page_content=text, metadata={})]
+            summary = await self.summary_chain.arun(full_text_doc, doc_id=doc_id)
+            await self.document_store.aput_summary(
+                doc_id, SUMMARY_PROMPT_VERSION, summary
+            )
+            logger.info(f"Stored summary for document {doc_id}")
+            return summary
+
+        def on_done(task: asyncio.Task) -> None:
+            self._summary_jobs.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(
+                    f"Summary job for document {doc_id} failed: {task.exception()}"
+                )
+
+        job = asyncio.create_task(summarise())
+        job.add_done_callback(on_done)
+        self._summary_jobs[key] = job
+        return job
+
+    async def _get_cached_summary(self, doc_id: str) -> Optional[str]:
+        """Return the stored summary, waiting on an in-flight job if there is one."""
+        job = self._summary_jobs.get((doc_id, SUMMARY_PROMPT_VERSION))
+        if job is not None:
+            try:
+                # Shielded so one cancelled request doesn't cancel the shared job
+                return await asyncio.shield(job)
+            except Exception as e:
+                logger.warning(f"Summary job failed, regenerating: {e}")
+                return None
+        return await self.document_store.aget_summary(doc_id, SUMMARY_PROMPT_VERSION)
+
+    async def _get_summary(self, doc_id: str) -> str:
+        """Return the cached summary, generating it only if it doesn't exist yet."""
+        summary = await self._get_cached_summary(doc_id)
+        if summary is None:
+            summary = await asyncio.shield(self._start_summary_job(doc_id))
+        return summary
+
+    async def _stream_summary(self, doc_id: str) -> AsyncIterator[str]:
+        """Yield the cached summary, or stream and cache a freshly generated one."""
+        summary = await self._get_cached_summary(doc_id)
+        if summary is not None:
+            yield summary
+            return
 
+        full_text = await self.document_store.aget_document(doc_id)
+        full_text_doc = [Document(page_content=full_text, metadata={})]
+        tokens = []
+        async for token in self.summary_chain.astream(full_text_doc, doc_id=doc_id):
+            tokens.append(token)
+            yield token
+        await self.document_store.aput_summary(
+            doc_id, SUMMARY_PROMPT_VERSION, "".join(tokens)
+        )
+
+    async def _load_history(
+        self, session_id: str, doc_id: str
+    ) -> Tuple[PostgresChatHistory, List[BaseMessage]]:
+        """Load the recent chat history of a session/document pair off the event loop."""
+        state_key = f"{session_id}:{doc_id}"
+
+        def load():
+            history = PostgresChatHistory(session_id=state_key)
+            return history, self.chat_memory.load(history)
+
+        return await asyncio.to_thread(load)
+
+    async def _save_turn(
+        self, history: PostgresChatHistory, question: str, answer: str
+    ) -> None:
+        """Append a question/answer turn to the chat history off the event loop."""
+        await asyncio.to_thread(
+            history.add_messages,
+            [HumanMessage(content=question), AIMessage(content=answer)],
+        )
+        if self.background_tasks:
+            self._start_history_summary(history)
+            return
+        try:
+            await self.chat_memory.aupdate_summary(history)
         except Exception as e:
-            logger.error(f"Upload failed: {str(e)}", exc_info=True)
-            raise Exception(f"Failed to process PDF: {str(e)}")
+            logger.error(f"Summarising chat history {history.session_id} failed: {e}")
+
+    def _start_history_summary(self, history: PostgresChatHistory) -> None:
+        """Update the rolling summary of the chat history in the background."""
+        if history.session_id in self._history_jobs:
+            # The running update catches up with this turn on the next one
+            return
+
+        def on_done(task: asyncio.Task) -> None:
+            self._history_jobs.pop(history.session_id, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(
+                    f"Summarising chat history {history.session_id} failed: "
+                    f"{task.exception()}"
+                )
+
+        job = asyncio.create_task(self.chat_memory.aupdate_summary(history))
+        job.add_done_callback(on_done)
+        self._history_jobs[history.session_id] = job
+
+
+async def _yield_once(text: str) -> AsyncIterator[str]:
+    yield text
@@ -1,3 +1,5 @@
+import os
+
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -10,13 +12,128 @@ class Settings(BaseSettings):
     db_password: str = Field("postgres", env="DB_PASSWORD")
     db_name: str = Field("pdf_chat", env="DB_NAME")
 
+    # Shared psycopg connection pool, see utills/db_utils.get_connection_pool
+    db_pool_min_size: int = Field(1, env="DB_POOL_MIN_SIZE")
+    db_pool_max_size: int = Field(10, env="DB_POOL_MAX_SIZE")
+    db_pool_timeout: float = Field(30.0, env="DB_POOL_TIMEOUT")
+    db_pool_max_idle: float = Field(300.0, env="DB_POOL_MAX_IDLE")
+    db_pool_max_lifetime: float = Field(3600.0, env="DB_POOL_MAX_LIFETIME")
+    db_pool_check_connection: bool = Field(True, env="DB_POOL_CHECK_CONNECTION")
+
     use_postgres_db: bool = Field(True, env="USE_POSTGRES_DB")
     document_store_type: str = Field("s3", env="DOCUMENT_STORE_TYPE")
 
     s3_bucket_name: str = Field("pdf-chat-lambda-state", env="S3_BUCKET_NAME")
+    # Stored document content: "gzip", "zstd" (needs zstandard) or "none", each page
+    # compressed separately so pages can be read on their own
+    document_compression: str = Field("gzip", env="DOCUMENT_COMPRESSION")
+    # Read-through cache of document content over the S3 and Postgres stores, in
+    # memory and, unless the directory is empty, on disk across warm invocations
+    document_cache: bool = Field(True, env="DOCUMENT_CACHE")
+    document_cache_max_bytes: int = Field(
+        64 * 1024 * 1024, env="DOCUMENT_CACHE_MAX_BYTES"
+    )
+    document_cache_dir: str = Field("/tmp/pdf_chat_documents", env="DOCUMENT_CACHE_DIR")
+    document_cache_disk_max_bytes: int = Field(
+        256 * 1024 * 1024, env="DOCUMENT_CACHE_DISK_MAX_BYTES"
+    )
+
+    # Chat model answering, routing and summarising, also picking the tokenizer used
+    # to count tokens against the context budgets
+    llm_model: str = Field("gpt-4o-mini", env="LLM_MODEL")
+
+    # Minimum margin for the local router to skip the LLM routing call
+    router_confidence_threshold: float = Field(0.25, env="ROUTER_CONFIDENCE_THRESHOLD")
+
+    # Generate document summaries in the background at upload time
+    precompute_summaries: bool = Field(True, env="PRECOMPUTE_SUMMARIES")
+    # Reuse the stored chunks and embeddings when an identical PDF is uploaded again
+    deduplicate_uploads: bool = Field(True, env="DEDUPLICATE_UPLOADS")
+
+    # Larger uploads are rejected while they are being written to disk
+    max_upload_bytes: int = Field(100 * 1024 * 1024, env="MAX_UPLOAD_BYTES")
+    # Processes parsing large PDFs in parallel. Defaults to 1 (no pool) as Lambda
+    # has no /dev/shm, which multiprocessing needs
+    pdf_parse_workers: int = Field(1, env="PDF_PARSE_WORKERS")
+    pdf_min_pages_per_worker: int = Field(8, env="PDF_MIN_PAGES_PER_WORKER")
+    # Work carried on after the response is sent: queued ingestion of uploads, see
+    # services/ingestion_jobs.py, summary precompute and chat history summaries. Off
+    # by default on Lambda, which freezes the runtime once the response is sent, so
+    # uploads are ingested within the request and summaries are made when needed
+    background_tasks: bool = Field(
+        default_factory=lambda: "AWS_LAMBDA_FUNCTION_NAME" not in os.environ,
+        env="BACKGROUND_TASKS",
+    )
+    ingestion_workers: int = Field(2, env="INGESTION_WORKERS")
+    # Chunks handed from the chunk stage to the embed and index stages at a time
+    ingestion_batch_size: int = Field(512, env="INGESTION_BATCH_SIZE")
+    # Finished jobs are forgotten, oldest first, once more than this are kept
+    ingestion_max_jobs: int = Field(1000, env="INGESTION_MAX_JOBS")
+
+    # Documents longer than this are summarised hierarchically (map-reduce)
+    summary_stuff_max_chars: int = Field(48000, env="SUMMARY_STUFF_MAX_CHARS")
+    summary_section_chars: int = Field(12000, env="SUMMARY_SECTION_CHARS")
+    summary_reduce_fanout: int = Field(8, env="SUMMARY_REDUCE_FANOUT")
+    summary_max_concurrency: int = Field(8, env="SUMMARY_MAX_CONCURRENCY")
+    # Intermediate summaries are kept for retries of this many documents, for a while
+    summary_cache_documents: int = Field(16, env="SUMMARY_CACHE_DOCUMENTS")
+    summary_cache_ttl: float = Field(3600.0, env="SUMMARY_CACHE_TTL")
+
+    # Chat history given to the prompt: the last turns that fit in the token budget,
+    # older turns are folded into a rolling summary
+    history_max_turns: int = Field(10, env="HISTORY_MAX_TURNS")
+    history_max_tokens: int = Field(2000, env="HISTORY_MAX_TOKENS")
+    # Retrieved chunks are merged, deduplicated and packed into this many tokens
+    context_max_tokens: int = Field(3000, env="CONTEXT_MAX_TOKENS")
+    # Shingle (Jaccard) similarity above which a retrieved span is a duplicate
+    context_dedup_threshold: float = Field(0.9, env="CONTEXT_DEDUP_THRESHOLD")
+    # Cache answers to similar questions, asked without chat history, per document
+    answer_cache: bool = Field(True, env="ANSWER_CACHE")
+    answer_cache_similarity_threshold: float = Field(
+        0.95, env="ANSWER_CACHE_SIMILARITY_THRESHOLD"
+    )
+    answer_cache_size: int = Field(1000, env="ANSWER_CACHE_SIZE")
+    answer_cache_ttl: float = Field(86400.0, env="ANSWER_CACHE_TTL")
+    # Retrieval: "dense" only uses the embeddings, "hybrid" fuses dense and BM25
+    # keyword results by reciprocal rank fusion. Compare them on the QA pairs with
+    # research/hybrid_retrieval.py before switching
+    retrieval_mode: str = Field("dense", env="RETRIEVAL_MODE")
+    retrieval_k: int = Field(4, env="RETRIEVAL_K")
+    # Candidates fetched by each retriever before fusion
+    retrieval_fetch_k: int = Field(20, env="RETRIEVAL_FETCH_K")
+    retrieval_dense_weight: float = Field(0.5, env="RETRIEVAL_DENSE_WEIGHT")
+    retrieval_keyword_weight: float = Field(0.5, env="RETRIEVAL_KEYWORD_WEIGHT")
+    retrieval_rrf_k: int = Field(60, env="RETRIEVAL_RRF_K")
+    # In-memory vector index: exact "flat" search, or approximate "hnsw" (needs hnswlib)
+    vector_index_type: str = Field("flat", env="VECTOR_INDEX_TYPE")
+    # pgvector chunks table, hash partitioned by doc_id, with an "hnsw" index or "none"
+    pg_vector_index_type: str = Field("hnsw", env="PG_VECTOR_INDEX_TYPE")
+    pg_vector_partitions: int = Field(16, env="PG_VECTOR_PARTITIONS")
+    # Needs pgvector 0.8, set to an empty string for older versions
+    pg_hnsw_iterative_scan: str = Field("relaxed_order", env="PG_HNSW_ITERATIVE_SCAN")
+    # HNSW parameters, used by both the in-memory and pgvector indexes
+    hnsw_m: int = Field(16, env="HNSW_M")
+    hnsw_ef_construction: int = Field(200, env="HNSW_EF_CONSTRUCTION")
+    hnsw_ef_search: int = Field(64, env="HNSW_EF_SEARCH")
 
     embedding_model: str = Field("text-embedding-3-large", env="EMBEDDING_MODEL")
+    # Embeddings are shortened to this width, which must be supported by the model
+    # (text-embedding-3 models) and at most 2000 for the pgvector HNSW index
     embedding_size: int = Field(1536, env="EMBEDDING_SIZE")
+    embedding_batch_size: int = Field(256, env="EMBEDDING_BATCH_SIZE")
+    embedding_max_concurrency: int = Field(4, env="EMBEDDING_MAX_CONCURRENCY")
+    # Content-hash keyed embedding cache: local, postgres or none
+    embedding_cache_type: str = Field("local", env="EMBEDDING_CACHE_TYPE")
+    embedding_cache_path: str = Field(
+        "/tmp/pdf_chat_embeddings.sqlite", env="EMBEDDING_CACHE_PATH"
+    )
+    # Least recently used embeddings are pruned from the local cache beyond this many
+    embedding_cache_max_rows: int = Field(20000, env="EMBEDDING_CACHE_MAX_ROWS")
+    # Query embedding cache: in-process "memory", "postgres" for a shared tier too,
+    # or "none"
+    query_embedding_cache_type: str = Field("memory", env="QUERY_EMBEDDING_CACHE_TYPE")
+    query_embedding_cache_size: int = Field(1024, env="QUERY_EMBEDDING_CACHE_SIZE")
+    query_embedding_cache_ttl: float = Field(3600.0, env="QUERY_EMBEDDING_CACHE_TTL")
 
     @property
     def connection_string(self):
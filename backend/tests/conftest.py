@@ -4,6 +4,12 @@ from pathlib import Path
 import pytest
 
 
+@pytest.fixture
+def anyio_backend():
+    """Run async tests on asyncio, the event loop used by FastAPI/uvicorn."""
+    return "asyncio"
+
+
 @pytest.fixture
 def pdf_path():
     """Returns the path to the Bitcoin whitepaper PDF."""
@@ -0,0 +1,67 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from repositories.chat_history import PostgresChatHistory
+from utills.db_utils import get_connection_pool
+
+
+@pytest.fixture
+def chat_history():
+    """Fixture that creates and clears a pooled chat history"""
+    history = PostgresChatHistory(session_id="test-session:test-doc")
+    history.clear()
+    yield history
+    history.clear()
+
+
+@pytest.mark.integration
+def test_chat_history_round_trip(chat_history):
+    """Test messages written through the pool are read back in order"""
+    # WHEN we add a question/answer turn
+    chat_history.add_messages(
+        [HumanMessage(content="What is Bitcoin?"), AIMessage(content="A currency.")]
+    )
+
+    # THEN the messages are returned in insertion order
+    assert chat_history.messages == [
+        HumanMessage(content="What is Bitcoin?"),
+        AIMessage(content="A currency."),
+    ]
+
+
+@pytest.mark.integration
+def test_chat_history_reuses_pooled_connections(chat_history):
+    """Test repeated history operations don't grow the connection pool"""
+    # GIVEN the shared pool used by the history
+    pool = get_connection_pool()
+
+    # WHEN we read and write the history many times
+    for i in range(20):
+        chat_history.add_messages([HumanMessage(content=f"question {i}")])
+        chat_history.messages
+
+    # THEN the pool never exceeds its configured bound
+    stats = pool.get_stats()
+    assert stats["pool_size"] <= pool.max_size
+    assert len(chat_history.messages) == 20
+
+
+@pytest.mark.integration
+def test_chat_history_window_and_summary(chat_history):
+    """Test the recent window, older messages and summary are read by id"""
+    # GIVEN five messages
+    chat_history.add_messages([HumanMessage(content=f"m{i}") for i in range(5)])
+
+    # WHEN the last two are read as the window
+    recent = chat_history.get_recent_messages(2)
+    older = chat_history.get_older_messages(keep_recent=2)
+
+    # THEN the window is the newest messages, oldest first, and the rest are older
+    assert [m.content for _, m in recent] == ["m3", "m4"]
+    assert [m.content for _, m in older] == ["m0", "m1", "m2"]
+
+    # AND a summary is only replaced by one covering later messages
+    chat_history.put_summary("first", older[-1][0])
+    chat_history.put_summary("stale", older[0][0])
+    assert chat_history.get_summary() == ("first", older[-1][0])
+    assert chat_history.get_older_messages(2, after_id=older[-1][0]) == []
@@ -0,0 +1,26 @@
+import uuid
+
+import pytest
+
+from repositories.session_db import PostgresDocumentStore
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_postgres_document_pages_round_trip(compression):
+    """Test compressed documents are read back whole or a range of pages at a time"""
+    # GIVEN a document of three pages stored with the compression
+    store = PostgresDocumentStore(compression=compression)
+    doc_id = f"test-{uuid.uuid4()}"
+    pages = ["First page", "Second page, café", "Third page"]
+    store.put_document(
+        doc_id, "test-session", "\n".join(pages), page_offsets=[0, 11, 29]
+    )
+
+    # THEN the full text and ranges of pages are read back
+    assert store.get_document(doc_id) == "\n".join(pages)
+    assert store.get_pages(doc_id) == pages
+    assert store.get_pages(doc_id, 1, 2) == pages[1:2]
+    assert store.get_pages(doc_id, 2, 10) == pages[2:]
+    assert store.get_pages(doc_id, 5) == []
+    assert store.get_pages("missing") is None
@@ -1,5 +1,5 @@
 import os
-from unittest.mock import ANY, Mock, patch
+from unittest.mock import ANY, AsyncMock, Mock, patch
 
 import pytest
 from langchain_community.chat_models import ChatOpenAI
@@ -34,8 +34,7 @@ def vector_store(connection_string):
     embeddings = FakeEmbeddings(size=settings.embedding_size)
     store = PGVectorStore(
         embeddings=embeddings,
-        connection_string=connection_string,
-        collection_name="test_documents",
+        table_name="test_document_chunks",
     )
     yield store
     # Cleanup
@@ -68,10 +67,10 @@ def mock_openai_dependencies():
 def mock_chains(mock_openai_dependencies):
     """Create mock RAG and Summary chains."""
     mock_rag_chain = Mock(spec=RAGChain)
-    mock_rag_chain.run.return_value = "Mock RAG response"
+    mock_rag_chain.arun.return_value = "Mock RAG response"
 
     mock_summary_chain = Mock(spec=SummaryChain)
-    mock_summary_chain.run.return_value = "Mock summary response"
+    mock_summary_chain.arun.return_value = "Mock summary response"
 
     return mock_rag_chain, mock_summary_chain
 
@@ -105,7 +104,7 @@ class TestPDFChatServiceIntegration:
 
         # Create mock router response for testing
         mock_router = Mock()
-        mock_router.invoke.return_value = Mock(task="q_and_a")
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
         service.router = mock_router
 
         # First question
@@ -125,13 +124,14 @@ class TestPDFChatServiceIntegration:
         assert response2 == "Mock RAG response"
 
         # Verify the RAG chain was called with the correct history
-        service.rag_chain.run.assert_any_call(
+        service.rag_chain.arun.assert_any_call(
             "Can you elaborate on that?",
             ANY,  # retriever
             [
                 HumanMessage(content="What is this document about?"),
                 AIMessage(content="Mock RAG response"),
             ],
+            documents=ANY,
         )
 
     def test_multiple_documents_with_shared_history(
@@ -148,7 +148,7 @@ class TestPDFChatServiceIntegration:
 
         # Create mock router response
         mock_router = Mock()
-        mock_router.invoke.return_value = Mock(task="q_and_a")
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
         pdf_chat_service.router = mock_router
 
         # Query first document
@@ -176,13 +176,14 @@ class TestPDFChatServiceIntegration:
         assert response3 == "Mock RAG response"
 
         # Verify RAG chain was called with correct history for each document
-        pdf_chat_service.rag_chain.run.assert_any_call(
+        pdf_chat_service.rag_chain.arun.assert_any_call(
             "Can you elaborate on document 1?",
             ANY,  # retriever
             [
                 HumanMessage(content="Tell me about document 1"),
                 AIMessage(content="Mock RAG response"),
             ],
+            documents=ANY,
         )
 
     def test_vector_search_integration(self, loaded_pdf_chat_service):
@@ -209,7 +210,7 @@ class TestPDFChatServiceIntegration:
 
         # Create mock router response for summary
         mock_router = Mock()
-        mock_router.invoke.return_value = Mock(task="summary")
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="summary"))
         service.router = mock_router
 
         # Request summary
@@ -5,8 +5,10 @@ import pytest
 from langchain_community.embeddings import FakeEmbeddings
 
 from brain.document_processing import DocumentProcessor
-from repositories.vector_db import PGVectorStore
+from dependencies.services import get_embeddings, reset_services
+from repositories.vector_db import PGChunkIndex, PGVectorStore
 from settings import settings
+from utills.db_utils import get_connection_pool
 
 
 @pytest.fixture
@@ -14,8 +16,7 @@ def vector_store():
     """Fixture that creates and tears down a vector store"""
     store = PGVectorStore(
         embeddings=FakeEmbeddings(size=settings.embedding_size),
-        connection_string=settings.connection_string,
-        collection_name="test_documents",
+        table_name="test_document_chunks",
     )
     yield store
     store.clear()
@@ -88,3 +89,101 @@ def test_similarity_search(vector_store, bitcoin_chunks):
         assert doc.metadata["doc_id"] == doc_id
         assert isinstance(doc.page_content, str)
         assert len(doc.page_content) > 0
+
+
+@pytest.mark.integration
+def test_retrieval_is_scoped_to_the_document(vector_store, bitcoin_chunks):
+    """Test the HNSW search only returns chunks of the requested document"""
+    # GIVEN two documents in the partitioned chunks table
+    vector_store.add_documents(bitcoin_chunks, "session-1", "doc-1")
+    vector_store.add_documents(
+        [doc.model_copy(deep=True) for doc in bitcoin_chunks], "session-2", "doc-2"
+    )
+
+    # WHEN the second document is searched
+    results = vector_store.get_retriever("session-2", "doc-2").invoke(
+        "What is Bitcoin?"
+    )
+
+    # THEN k chunks are found, all of them from that document
+    assert len(results) == 4
+    assert all(doc.metadata["doc_id"] == "doc-2" for doc in results)
+
+
+@pytest.mark.integration
+def test_bulk_load_with_deferred_index(vector_store, bitcoin_chunks):
+    """Test chunks COPY'd while the HNSW index is dropped are searchable afterwards"""
+    # GIVEN a bulk load with the index built afterwards
+    with vector_store.store.deferred_index():
+        vector_store.add_documents(bitcoin_chunks, "session-1", "doc-1")
+
+    # WHEN the document is searched
+    results = vector_store.get_retriever("session-1", "doc-1").invoke(
+        "What is Bitcoin?"
+    )
+
+    # THEN its chunks are found
+    assert len(results) == 4
+    assert all(doc.metadata["doc_id"] == "doc-1" for doc in results)
+
+
+@pytest.mark.integration
+def test_keyword_search_matches_exact_terms(vector_store, bitcoin_chunks):
+    """Test the full text search finds chunks by their exact terms"""
+    # GIVEN the whitepaper in the chunks table
+    vector_store.add_documents(bitcoin_chunks, "session-1", "doc-1")
+
+    # WHEN the document is searched for a term of one of its sections
+    results = vector_store.keyword_search("doc-1", "What is a Merkle Tree?", k=4)
+
+    # THEN the best match contains the term
+    assert 0 < len(results) <= 4
+    assert "Merkle" in results[0].page_content
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(
+    not os.environ.get("OPENAI_API_KEY", "").startswith("sk-")
+    or os.environ.get("OPENAI_API_KEY") == "sk-fake-key-for-testing",
+    reason="Needs a real OpenAI API key",
+)
+def test_configured_embeddings_fit_the_chunks_table(bitcoin_chunks):
+    """Test the configured OpenAI embeddings are inserted and searched with HNSW"""
+    # GIVEN the vector store with the embeddings the API uses
+    reset_services()
+    store = PGVectorStore(
+        embeddings=get_embeddings(), table_name="test_document_chunks"
+    )
+
+    try:
+        # WHEN chunks are inserted and searched
+        store.add_documents(bitcoin_chunks[:8], "session-1", "doc-1")
+        results = store.get_retriever("session-1", "doc-1").invoke("What is Bitcoin?")
+
+        # THEN the COPY accepted their width and they are found
+        assert len(results) == 4
+        assert all(doc.metadata["doc_id"] == "doc-1" for doc in results)
+    finally:
+        store.clear()
+        reset_services()
+
+
+@pytest.mark.integration
+def test_embeddings_of_another_width_are_rejected(vector_store, bitcoin_chunks):
+    """Test a mismatched embedding size fails with a clear error, at start-up if it can"""
+    # GIVEN the chunks table, created for settings.embedding_size
+
+    # WHEN it is opened for another size
+    # THEN it fails before any document is ingested
+    with pytest.raises(ValueError, match="re-ingested"):
+        PGChunkIndex(
+            embedding=FakeEmbeddings(size=8),
+            connection_pool=get_connection_pool(),
+            table_name="test_document_chunks",
+            embedding_size=8,
+        )
+
+    # AND embeddings of another width are rejected before the COPY
+    store = PGVectorStore(FakeEmbeddings(size=8), table_name="test_document_chunks")
+    with pytest.raises(ValueError, match="EMBEDDING_SIZE"):
+        store.add_documents(bitcoin_chunks[:1], "session-1", "doc-1")
@@ -0,0 +1,38 @@
+from brain.answer_cache import SemanticAnswerCache
+
+
+def test_similar_questions_of_the_same_document_share_an_answer():
+    """Test answers are matched by question similarity within a document."""
+    # GIVEN a cached answer to a question about a document
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put("doc-1", "What is the main contribution?", [1.0, 0.0, 0.0], "Bitcoin")
+
+    # WHEN similar and dissimilar questions are looked up
+    # THEN only a similar question about the same document gets the answer
+    assert cache.get("doc-1", [0.95, 0.1, 0.0]) == "Bitcoin"
+    assert cache.get("doc-1", [0.5, 0.8, 0.0]) is None
+    assert cache.get("doc-2", [1.0, 0.0, 0.0]) is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 1, "hit_rate": 1 / 3}
+
+
+def test_answers_are_evicted_when_expired_or_least_recently_used(monkeypatch):
+    """Test the cache is bounded in size and time."""
+    # GIVEN a cache of two answers with a 10s time to live
+    now = [0.0]
+    monkeypatch.setattr("brain.answer_cache.time.monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(threshold=0.9, max_size=2, ttl=10)
+    cache.put("doc-1", "a", [1.0, 0.0], "A")
+    cache.put("doc-2", "b", [1.0, 0.0], "B")
+
+    # WHEN the first answer is used, then a third one added
+    assert cache.get("doc-1", [1.0, 0.0]) == "A"
+    cache.put("doc-1", "c", [0.0, 1.0], "C")
+
+    # THEN the least recently used answer was evicted
+    assert cache.get("doc-2", [1.0, 0.0]) is None
+    assert cache.get("doc-1", [0.0, 1.0]) == "C"
+
+    # AND answers expire after their time to live
+    now[0] = 11.0
+    assert cache.get("doc-1", [1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
@@ -1,11 +1,13 @@
-from unittest.mock import Mock
+import hashlib
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
-from dependencies.services import get_pdf_service
+from dependencies.services import get_ingestion_queue, get_pdf_service
 from routers.router import router
+from services.ingestion_jobs import IngestionJob
 
 
 @pytest.fixture
@@ -21,7 +23,7 @@ def test_client(test_app):
     """Create a test client with mocked PDF service"""
     # Create mock PDF service
     mock_pdf_service = Mock()
-    mock_pdf_service.query.return_value = "Mock response"
+    mock_pdf_service.aquery = AsyncMock(return_value="Mock response")
 
     # Override the dependency
     test_app.dependency_overrides[get_pdf_service] = lambda: mock_pdf_service
@@ -50,6 +52,183 @@ def test_query_endpoint(test_client):
     assert response.json() == {"message": "Mock response"}
 
     # Verify service was called correctly
-    mock_pdf_service.query.assert_called_once_with(
-        session_id="test-session", doc_id="123", question="test question"
+    mock_pdf_service.aquery.assert_called_once_with(
+        session_id="test-session",
+        doc_id="123",
+        question="test question",
+        bypass_cache=False,
     )
+
+
+def test_query_stream_endpoint(test_client):
+    """Test the streaming query endpoint emits tokens as Server-Sent Events"""
+    client, mock_pdf_service = test_client
+
+    async def mock_stream(**kwargs):
+        for token in ["Mock", " response"]:
+            yield token
+
+    mock_pdf_service.astream_query = Mock(side_effect=mock_stream)
+
+    test_request = {
+        "query": "test question",
+        "session_id": "test-session",
+        "doc_id": "123",
+    }
+
+    response = client.post("/prod/query/stream", json=test_request)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        'data: {"token": "Mock"}\n\n'
+        'data: {"token": " response"}\n\n'
+        "event: done\ndata: {}\n\n"
+    )
+    mock_pdf_service.astream_query.assert_called_once_with(
+        session_id="test-session",
+        doc_id="123",
+        question="test question",
+        bypass_cache=False,
+    )
+
+
+def test_upload_endpoint_queues_ingestion(test_app, test_client, tmp_path, monkeypatch):
+    """Test the upload endpoint returns a job id without waiting for ingestion"""
+    monkeypatch.setattr("routers.router.UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr("routers.router.settings.background_tasks", True)
+    mock_queue = Mock()
+    mock_queue.submit.return_value = IngestionJob(
+        job_id="job-1",
+        session_id="test-session",
+        filename="test.pdf",
+        file_path=str(tmp_path / "test.pdf"),
+    )
+    test_app.dependency_overrides[get_ingestion_queue] = lambda: mock_queue
+    client, _ = test_client
+
+    response = client.post(
+        "/prod/upload",
+        files={"file": ("test.pdf", b"%PDF-1.4 test", "application/pdf")},
+        data={"session_id": "test-session"},
+    )
+
+    assert response.status_code == 202
+    assert response.json()["job_id"] == "job-1"
+    assert response.json()["status"] == "queued"
+
+    # The upload is written to disk and queued with its content hash
+    (saved_file,) = tmp_path.iterdir()
+    assert saved_file.name.endswith("-test.pdf")
+    assert saved_file.read_bytes() == b"%PDF-1.4 test"
+    mock_queue.submit.assert_called_once_with(
+        str(saved_file),
+        "test-session",
+        "test.pdf",
+        content_hash=hashlib.sha256(b"%PDF-1.4 test").hexdigest(),
+    )
+
+
+def test_upload_endpoint_rejects_large_files(
+    test_app, test_client, tmp_path, monkeypatch
+):
+    """Test uploads over the size limit are rejected and not kept on disk"""
+    monkeypatch.setattr("routers.router.UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr("routers.router.settings.max_upload_bytes", 8)
+    mock_queue = Mock()
+    test_app.dependency_overrides[get_ingestion_queue] = lambda: mock_queue
+    client, _ = test_client
+
+    response = client.post(
+        "/prod/upload",
+        files={"file": ("test.pdf", b"%PDF-1.4 test", "application/pdf")},
+        data={"session_id": "test-session"},
+    )
+
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+    mock_queue.submit.assert_not_called()
+
+
+def test_upload_endpoint_removes_failed_uploads(
+    test_app, test_client, tmp_path, monkeypatch
+):
+    """Test an upload that fails while it's being saved isn't kept on disk"""
+    monkeypatch.setattr("routers.router.UPLOAD_DIR", tmp_path)
+
+    def save_stream(source, path, max_bytes):
+        with open(path, "wb") as f:
+            f.write(source.read(4))
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr("routers.router.save_stream", save_stream)
+    mock_queue = Mock()
+    test_app.dependency_overrides[get_ingestion_queue] = lambda: mock_queue
+    client, _ = test_client
+
+    response = client.post(
+        "/prod/upload",
+        files={"file": ("test.pdf", b"%PDF-1.4 test", "application/pdf")},
+        data={"session_id": "test-session"},
+    )
+
+    assert response.status_code == 500
+    assert list(tmp_path.iterdir()) == []
+    mock_queue.submit.assert_not_called()
+
+
+def test_upload_endpoint_ingests_without_background_tasks(
+    test_app, test_client, tmp_path, monkeypatch
+):
+    """Test uploads are ingested before the response when background tasks are off"""
+    monkeypatch.setattr("routers.router.UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr("routers.router.settings.background_tasks", False)
+    mock_queue = Mock()
+    test_app.dependency_overrides[get_ingestion_queue] = lambda: mock_queue
+    client, mock_pdf_service = test_client
+    saved_files = []
+
+    async def aupload(file_path, session_id, content_hash=None):
+        saved_files.append(open(file_path, "rb").read())
+        return {"doc_id": "doc-1", "message": "File uploaded successfully!"}
+
+    mock_pdf_service.aupload = aupload
+
+    response = client.post(
+        "/prod/upload",
+        files={"file": ("test.pdf", b"%PDF-1.4 test", "application/pdf")},
+        data={"session_id": "test-session"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["doc_id"] == "doc-1"
+    assert response.json()["status"] == "completed"
+    mock_queue.submit.assert_not_called()
+
+    # The upload was ingested from disk, and removed once it was
+    assert saved_files == [b"%PDF-1.4 test"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_status_endpoint(test_app):
+    """Test the upload status endpoint reports the job's progress per stage"""
+    job = IngestionJob(
+        job_id="job-1",
+        session_id="test-session",
+        filename="test.pdf",
+        file_path="/tmp/test.pdf",
+    )
+    job.progress.start("parse")
+    mock_queue = Mock()
+    mock_queue.get.side_effect = lambda job_id: job if job_id == "job-1" else None
+    test_app.dependency_overrides[get_ingestion_queue] = lambda: mock_queue
+    client = TestClient(test_app)
+
+    response = client.get("/prod/upload/job-1")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "queued"
+    assert body["progress"]["stages"]["parse"] == {"status": "running", "items": 0}
+    assert "file_path" not in body
+    assert client.get("/prod/upload/unknown").status_code == 404
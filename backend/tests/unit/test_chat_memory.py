@@ -0,0 +1,107 @@
+from typing import List, Optional, Tuple
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from brain.chat_memory import ChatMemory
+
+
+class InMemoryChatHistory:
+    """The windowed reads and summary of PostgresChatHistory, over a list."""
+
+    def __init__(self, messages: List[BaseMessage]):
+        self.session_id = "session:doc"
+        self.messages = list(enumerate(messages, 1))
+        self.summary: Tuple[Optional[str], int] = (None, 0)
+
+    def get_recent_messages(self, limit: int):
+        return self.messages[-limit:]
+
+    def get_older_messages(self, keep_recent: int, after_id: int = 0, limit: int = 100):
+        older = self.messages[: max(0, len(self.messages) - keep_recent)]
+        return [(id, message) for id, message in older if id > after_id][:limit]
+
+    def get_summary(self):
+        return self.summary
+
+    def put_summary(self, summary: str, last_message_id: int) -> None:
+        self.summary = (summary, last_message_id)
+
+
+def _turns(count: int) -> List[BaseMessage]:
+    messages = []
+    for i in range(count):
+        messages += [
+            HumanMessage(content=f"question {i}"),
+            AIMessage(content=f"answer {i}"),
+        ]
+    return messages
+
+
+def test_window_is_bounded_by_turns_and_tokens(monkeypatch):
+    """Test only the most recent whole turns within both limits are given to the prompt."""
+    # GIVEN a long history with a summary of its older turns, and a token per word
+    monkeypatch.setattr(
+        "brain.chat_memory.count_tokens_batch",
+        lambda texts: [len(text.split()) for text in texts],
+    )
+    history = InMemoryChatHistory(_turns(50))
+    history.summary = ("The user asked about Bitcoin.", 60)
+    memory = ChatMemory(llm=FakeListChatModel(responses=[]), max_turns=3, max_tokens=7)
+
+    # WHEN the window is loaded
+    messages = memory.load(history)
+
+    # THEN the summary comes first, then the most recent turns that fit, whole
+    assert messages[0] == SystemMessage(
+        content="Summary of the earlier conversation: The user asked about Bitcoin."
+    )
+    assert [message.content for message in messages[1:]] == [
+        "question 49",
+        "answer 49",
+    ]
+
+
+@pytest.mark.anyio
+async def test_rolling_summary_only_folds_in_new_older_messages():
+    """Test the summary is updated incrementally with messages leaving the window."""
+    # GIVEN a history one turn longer than the window
+    history = InMemoryChatHistory(_turns(4))
+    llm = FakeListChatModel(responses=["summary 1", "summary 2"])
+    memory = ChatMemory(llm=llm, max_turns=3)
+
+    # WHEN the summary is updated, before and after another turn
+    await memory.aupdate_summary(history)
+    assert history.summary == ("summary 1", 2)
+    await memory.aupdate_summary(history)
+    history.messages += list(enumerate(_turns(5)[-2:], 9))
+    await memory.aupdate_summary(history)
+
+    # THEN each update only summarised the turn that left the window
+    assert history.summary == ("summary 2", 4)
+    assert llm.i == 0  # both responses were used, and no more
+
+
+@pytest.mark.anyio
+async def test_turns_dropped_for_the_token_budget_are_summarised(monkeypatch):
+    """Test turns left out of the prompt for their size are folded into the summary."""
+    # GIVEN three turns within the turn limit, of which only the last fits the budget
+    monkeypatch.setattr(
+        "brain.chat_memory.count_tokens_batch",
+        lambda texts: [len(text.split()) for text in texts],
+    )
+    history = InMemoryChatHistory(_turns(3))
+    memory = ChatMemory(
+        llm=FakeListChatModel(responses=["summary 1"]), max_turns=3, max_tokens=7
+    )
+
+    # WHEN the summary is updated
+    await memory.aupdate_summary(history)
+
+    # THEN it covers the two turns before the window, and the window is the last turn
+    assert history.summary == ("summary 1", 4)
+    assert [message.content for message in memory.load(history)[1:]] == [
+        "question 2",
+        "answer 2",
+    ]
@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+from utills.compression import (
+    decode_pages,
+    decompress,
+    read_pages,
+    split_pages,
+    write_frames,
+    zstandard,
+)
+
+PAGES = ["First page\nwith two lines", "", "Third page, café", "Last page"]
+FULL_TEXT = "\n".join(PAGES)
+PAGE_OFFSETS = [0, 26, 27, 44]
+
+
+@pytest.mark.parametrize(
+    "encoding",
+    [
+        None,
+        "gzip",
+        pytest.param(
+            "zstd",
+            marks=pytest.mark.skipif(zstandard is None, reason="needs zstandard"),
+        ),
+    ],
+)
+def test_pages_are_stored_as_independently_readable_frames(encoding):
+    """Test the frames decompress to the full text, or a range of them to its pages."""
+    # GIVEN a text file of pages separated by newlines
+    assert split_pages(FULL_TEXT, PAGE_OFFSETS) == PAGES
+    text_file = io.StringIO(FULL_TEXT, newline="")
+
+    # WHEN its pages are written as frames
+    content = io.BytesIO()
+    frame_offsets = write_frames(read_pages(text_file, PAGE_OFFSETS), encoding, content)
+    data = content.getvalue()
+
+    # THEN all the frames decompress to the full text
+    assert frame_offsets[0] == 0 and frame_offsets[-1] == len(data)
+    assert decompress(data, encoding).decode("utf-8") == FULL_TEXT
+
+    # AND a range of frames decompresses to its pages
+    first, last = frame_offsets[1], frame_offsets[3]
+    assert (
+        decode_pages(
+            data[first:last],
+            [offset - first for offset in frame_offsets[1:4]],
+            1,
+            encoding,
+        )
+        == PAGES[1:3]
+    )
+    assert decode_pages(data[: frame_offsets[1]], frame_offsets[:2], 0, encoding) == [
+        PAGES[0]
+    ]
+
+
+def test_gzip_compresses_repetitive_text():
+    """Test stored text is smaller compressed."""
+    pages = ["The quick brown fox jumps over the lazy dog. " * 100] * 3
+    raw, compressed = io.BytesIO(), io.BytesIO()
+    write_frames(pages, None, raw)
+    write_frames(pages, "gzip", compressed)
+    assert len(compressed.getvalue()) * 10 < len(raw.getvalue())
@@ -0,0 +1,102 @@
+import pytest
+from langchain_core.documents import Document
+
+from brain import tokens
+from brain.context import ContextPacker
+from brain.document_processing import SentenceChunker
+
+PAGE = "Alice pays Bob. Bob pays Carol. Carol pays Dave. Dave pays Erin. Erin saves."
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """Count a token per word, whichever tokenizer is available"""
+    monkeypatch.setattr(
+        "brain.context.count_tokens_batch",
+        lambda texts: [len(text.split()) for text in texts],
+    )
+
+
+def _chunks(page: int = 0):
+    chunker = SentenceChunker(chunk_size=35, chunk_overlap=18, separators=["."])
+    return chunker.split_documents(
+        [Document(page_content=PAGE, metadata={"source": "a.pdf", "page": page})]
+    )
+
+
+def test_overlapping_chunks_are_merged_into_the_page_text():
+    """Test overlapping chunks are sent once, as the contiguous text of the page."""
+    # GIVEN overlapping chunks of a page, retrieved out of order
+    chunks = _chunks()
+    assert len(chunks) > 2
+    assert chunks[0].page_content[-10:] in chunks[1].page_content
+
+    # WHEN they are packed
+    context = ContextPacker(max_tokens=100).pack(list(reversed(chunks)))
+
+    # THEN the context is the page text, without repeated overlaps
+    assert context == PAGE
+
+
+def test_near_duplicates_are_dropped_and_spans_ordered_by_page():
+    """Test duplicated text is sent once and spans of different pages keep apart."""
+    # GIVEN a chunk of page 2, and the same text on page 1 with different spacing
+    page_2 = Document(
+        page_content="Dave pays Erin. Erin saves.",
+        metadata={"source": "a.pdf", "page": 2, "start_index": 0},
+    )
+    page_1 = Document(
+        page_content="Dave  pays Erin.\nErin saves",
+        metadata={"source": "a.pdf", "page": 1, "start_index": 40},
+    )
+    other = Document(
+        page_content="Carol pays Dave.",
+        metadata={"source": "a.pdf", "page": 0, "start_index": 0},
+    )
+
+    # WHEN they are packed
+    context = ContextPacker(max_tokens=100).pack([page_2, page_1, other])
+
+    # THEN the best ranked copy is kept, after the page before it
+    assert context == "Carol pays Dave.\n\nDave pays Erin. Erin saves."
+
+
+def test_best_ranked_spans_are_packed_within_the_token_budget():
+    """Test lower ranked spans are left out once the budget is spent."""
+    # GIVEN three single-chunk spans of 3, 4 and 2 tokens
+    docs = [
+        Document(page_content="one two three", metadata={"page": 3}),
+        Document(page_content="four five six seven", metadata={"page": 1}),
+        Document(page_content="eight nine", metadata={"page": 2}),
+    ]
+
+    # WHEN they are packed into 6 tokens
+    context = ContextPacker(max_tokens=6, separator=" | ").pack(docs)
+
+    # THEN the first and third spans fit, with their separator, in page order
+    assert context == "eight nine | one two three"
+
+
+@pytest.mark.parametrize(
+    "model, encoding",
+    [
+        ("gpt-4o-mini", "o200k_base"),
+        ("gpt-4", "cl100k_base"),
+        ("new-model", "o200k_base"),
+    ],
+)
+def test_tokenizer_follows_the_chat_model(monkeypatch, model, encoding):
+    """Test tokens are counted with the chat model's encoding, o200k_base if unknown."""
+    # GIVEN a configured chat model, and encodings standing in for the downloaded ones
+    monkeypatch.setattr(tokens.settings, "llm_model", model)
+    monkeypatch.setattr(tokens.tiktoken, "get_encoding", lambda name: name)
+    tokens._get_encoding.cache_clear()
+
+    # WHEN the tokenizer is loaded
+    try:
+        loaded = tokens._get_encoding()
+    finally:
+        tokens._get_encoding.cache_clear()
+
+    # THEN it is the model's encoding
+    assert loaded == encoding
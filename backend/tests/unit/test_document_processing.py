@@ -3,8 +3,9 @@ from unittest.mock import Mock, patch
 import pytest
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyMuPDFLoader
 
-from brain.document_processing import DocumentProcessor
+from brain.document_processing import DocumentProcessor, SentenceChunker
 
 
 class TestDocumentProcessor:
@@ -18,7 +19,7 @@ class TestDocumentProcessor:
         processor = DocumentProcessor()
 
         # Then: The processor should have default settings
-        assert processor.text_splitter == RecursiveCharacterTextSplitter
+        assert processor.text_splitter == SentenceChunker
         assert processor.text_splitter_kwargs == {
             "chunk_size": 500,
             "separators": [".", "?", "!"],
@@ -68,3 +69,94 @@ class TestDocumentProcessor:
         assert all(
             isinstance(chunk, Document) for chunk in chunks
         )  # Verify chunk types
+
+    def test_parallel_loading_matches_serial_loading(self, pdf_path):
+        """Test that page-parallel parsing returns the same pages, in order."""
+        # Given: A processor parsing page ranges on 2 worker processes
+        processor = DocumentProcessor(parse_workers=2, min_pages_per_worker=1)
+
+        # When: Loading the PDF
+        try:
+            pages = processor.load_pdf(pdf_path)
+        finally:
+            processor.close()
+
+        # Then: The pages match PyMuPDFLoader's, content and metadata
+        assert pages == PyMuPDFLoader(pdf_path).load()
+
+    def test_small_pdfs_are_parsed_without_worker_processes(self, pdf_path):
+        """Test that PDFs with too few pages to split are parsed in-process."""
+        # Given: A processor needing at least 8 pages per worker
+        processor = DocumentProcessor(parse_workers=4, min_pages_per_worker=8)
+
+        # When: Loading the 9 page PDF
+        pages = processor.load_pdf(pdf_path)
+
+        # Then: No worker processes are started
+        assert processor._parse_pool is None
+        assert [page.metadata["page"] for page in pages] == list(range(9))
+
+    def test_iter_chunks_matches_chunk_docs(self, pdf_path):
+        """Test that the streaming API yields the same pages and chunks."""
+        # Given: A processor
+        processor = DocumentProcessor()
+
+        # When: Streaming the pages and chunks of a PDF
+        pages = processor.iter_pages(pdf_path)
+        chunks = processor.iter_chunks(pages)
+
+        # Then: They are generated lazily, matching the list based API
+        first_chunk = next(chunks)
+        expected = processor.chunk_docs(processor.load_pdf(pdf_path))
+        assert [first_chunk, *chunks] == expected
+
+
+class TestSentenceChunker:
+    """Tests for the SentenceChunker class."""
+
+    @pytest.mark.parametrize(
+        "splitter_kwargs",
+        [
+            DocumentProcessor.DEFAULT_SPLITTER_KWARGS,
+            {"chunk_size": 12000, "chunk_overlap": 0, "separators": [".", "?", "!"]},
+            {"chunk_size": 60, "chunk_overlap": 20, "separators": [".", "?", "!"]},
+            {"chunk_size": 100, "chunk_overlap": 30, "separators": ["\n\n", "\n", " "]},
+        ],
+    )
+    def test_chunks_match_recursive_character_text_splitter(
+        self, pdf_path, splitter_kwargs
+    ):
+        """Test that the chunker is a drop-in replacement for LangChain's splitter."""
+        # Given: The pages of a PDF
+        pages = DocumentProcessor().load_pdf(pdf_path)
+
+        # When: Splitting them with both splitters
+        chunks = SentenceChunker(**splitter_kwargs).split_documents(pages)
+        expected = RecursiveCharacterTextSplitter(**splitter_kwargs).split_documents(
+            pages
+        )
+
+        # Then: The chunks are the same
+        assert [chunk.page_content for chunk in chunks] == [
+            chunk.page_content for chunk in expected
+        ]
+
+    def test_chunks_record_their_page_and_start_index(self):
+        """Test that chunks keep the page metadata and their offset in the page."""
+        # Given: A page with several sentences
+        page = Document(
+            page_content="  First sentence. Second one? Third! Fourth sentence here.",
+            metadata={"page": 3},
+        )
+
+        # When: Splitting it into small overlapping chunks
+        chunks = SentenceChunker(
+            chunk_size=25, chunk_overlap=10, separators=[".", "?", "!"]
+        ).split_documents([page])
+
+        # Then: Each chunk is found at its start index, on the same page
+        assert len(chunks) > 1
+        for chunk in chunks:
+            start = chunk.metadata["start_index"]
+            assert chunk.metadata["page"] == 3
+            assert page.page_content[start:].startswith(chunk.page_content)
@@ -0,0 +1,92 @@
+from unittest.mock import Mock
+
+import pytest
+
+from repositories.session_db import CachedDocumentStore, InMemoryDocumentStore
+
+
+@pytest.fixture
+def backing_store():
+    """An in-memory document store recording its calls, standing in for S3"""
+    store = Mock(wraps=InMemoryDocumentStore())
+    store.put_document("doc-1", "session", "first document")
+    store.put_document("doc-2", "session", "second document")
+    store.reset_mock()
+    return store
+
+
+def test_documents_are_read_through_the_memory_cache(backing_store):
+    """Test a document is fetched from the store once, then served from memory."""
+    # GIVEN a cache over the store, without a disk tier
+    cache = CachedDocumentStore(backing_store, disk_dir=None)
+
+    # WHEN a document is read twice and its existence checked
+    assert cache.get_document("doc-1") == "first document"
+    assert cache.get_document("doc-1") == "first document"
+    assert cache.document_exists("doc-1")
+
+    # THEN the store was only read once, and missing documents aren't cached
+    backing_store.get_document.assert_called_once_with("doc-1")
+    backing_store.document_exists.assert_not_called()
+    assert cache.get_document("missing") is None
+    assert not cache.document_exists("missing")
+    assert cache.stats() == {
+        "memory_hits": 1,
+        "disk_hits": 0,
+        "misses": 2,
+        "documents": 1,
+        "bytes": len("first document"),
+    }
+
+
+def test_memory_is_bounded_and_disk_outlives_the_cache(backing_store, tmp_path):
+    """Test the memory tier evicts by size and the disk tier serves a new cache."""
+    # GIVEN a cache holding up to 20 bytes in memory, with a disk tier
+    cache = CachedDocumentStore(backing_store, max_bytes=20, disk_dir=str(tmp_path))
+
+    # WHEN two documents of 14 and 15 bytes are read
+    cache.get_document("doc-1")
+    cache.get_document("doc-2")
+
+    # THEN only the most recent stays in memory
+    assert cache.stats()["documents"] == 1
+    assert cache.stats()["bytes"] == len("second document")
+
+    # AND a new cache, e.g. in the next warm invocation, reads them from disk
+    backing_store.reset_mock()
+    warm_cache = CachedDocumentStore(backing_store, disk_dir=str(tmp_path))
+    assert warm_cache.get_document("doc-1") == "first document"
+    assert warm_cache.get_document("doc-2") == "second document"
+    backing_store.get_document.assert_not_called()
+    assert warm_cache.stats()["disk_hits"] == 2
+
+
+def test_disk_tier_evicts_least_recently_used_files(backing_store, tmp_path):
+    """Test the disk tier is bounded in bytes."""
+    # GIVEN a disk tier of 20 bytes
+    cache = CachedDocumentStore(
+        backing_store, max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=20
+    )
+
+    # WHEN two documents are cached
+    cache.get_document("doc-1")
+    cache.get_document("doc-2")
+
+    # THEN only one file fits on disk
+    assert len(list(tmp_path.glob("*.txt"))) == 1
+
+
+def test_disk_tier_keeps_line_endings(backing_store, tmp_path):
+    """Test documents come back from disk exactly as stored, whatever their newlines."""
+    # GIVEN a document with Windows and old Mac line endings, cached on disk
+    full_text = "first line\r\nsecond line\rthird line\n"
+    backing_store.put_document("doc-3", "session", full_text)
+    CachedDocumentStore(backing_store, disk_dir=str(tmp_path)).get_document("doc-3")
+
+    # WHEN a new cache reads it from disk
+    backing_store.reset_mock()
+    warm_cache = CachedDocumentStore(backing_store, disk_dir=str(tmp_path))
+
+    # THEN its content, and so its page offsets, are unchanged
+    assert warm_cache.get_document("doc-3") == full_text
+    backing_store.get_document.assert_not_called()
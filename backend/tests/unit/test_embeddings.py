@@ -0,0 +1,224 @@
+import asyncio
+import threading
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from brain.embeddings import (
+    BatchedEmbeddings,
+    InMemoryEmbeddingCache,
+    LocalEmbeddingCache,
+    QueryEmbeddingCache,
+)
+
+
+class RecordingEmbeddings(Embeddings):
+    """Fake embeddings recording each batch and the peak number of concurrent calls."""
+
+    def __init__(self, delay: float = 0.0):
+        self.model = "fake-model"
+        self.delay = delay
+        self.batches: List[List[str]] = []
+        self.queries: List[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(list(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return self.embed_query(text)
+
+
+@pytest.fixture
+def fake_embeddings():
+    return RecordingEmbeddings(delay=0.01)
+
+
+def test_embed_documents_batches_and_preserves_order(fake_embeddings):
+    """Test the texts are embedded in batches and returned in input order."""
+    # GIVEN a batched wrapper with a batch size of 3
+    embeddings = BatchedEmbeddings(fake_embeddings, batch_size=3, max_concurrency=2)
+    texts = [f"chunk {i}" for i in range(7)]
+
+    # WHEN the texts are embedded
+    result = embeddings.embed_documents(texts)
+
+    # THEN the wrapped embeddings are called in batches of at most 3
+    assert [len(batch) for batch in fake_embeddings.batches] == [3, 3, 1]
+    # AND the embeddings line up with the texts
+    assert result == [fake_embeddings.embed_query(text) for text in texts]
+
+
+@pytest.mark.anyio
+async def test_aembed_documents_bounds_concurrency(fake_embeddings):
+    """Test no more than max_concurrency batches are embedded at once."""
+    # GIVEN a batched wrapper allowing 2 concurrent requests
+    embeddings = BatchedEmbeddings(fake_embeddings, batch_size=2, max_concurrency=2)
+    texts = [f"chunk {i}" for i in range(12)]
+
+    # WHEN the texts are embedded asynchronously
+    result = await embeddings.aembed_documents(texts)
+
+    # THEN all 6 batches were embedded, never more than 2 at a time
+    assert len(fake_embeddings.batches) == 6
+    assert fake_embeddings.max_in_flight == 2
+    assert result == [fake_embeddings.embed_query(text) for text in texts]
+
+
+@pytest.mark.anyio
+async def test_cached_chunks_are_not_embedded_again(fake_embeddings):
+    """Test re-uploaded and duplicate chunks are served from the cache."""
+    # GIVEN a batched wrapper with a cache, which has already embedded a document
+    embeddings = BatchedEmbeddings(fake_embeddings, cache=InMemoryEmbeddingCache())
+    await embeddings.aembed_documents(["a", "b", "b"])
+    assert fake_embeddings.batches == [["a", "b"]]
+
+    # WHEN a document sharing chunks with it is embedded
+    result = await embeddings.aembed_documents(["b", "c", "a"])
+
+    # THEN only the new chunk is sent to the wrapped embeddings
+    assert fake_embeddings.batches[-1] == ["c"]
+    assert result == [fake_embeddings.embed_query(text) for text in ["b", "c", "a"]]
+
+    # AND the stats count the cache hits and embedded chunks
+    stats = embeddings.stats()
+    assert stats["chunks"] == 6
+    assert stats["cached_chunks"] == 3
+    assert stats["embedded_chunks"] == 3
+    assert stats["embedded_tokens"] > 0
+    assert stats["chunks_per_second"] > 0
+
+
+def test_local_cache_round_trips_embeddings(tmp_path):
+    """Test the SQLite cache persists embeddings across instances."""
+    # GIVEN embeddings stored in a local cache
+    path = str(tmp_path / "embeddings.sqlite")
+    LocalEmbeddingCache(path).put_many({"a": [0.5, 1.5], "b": [2.0, -1.0]})
+
+    # WHEN they are read back from a new instance
+    found = LocalEmbeddingCache(path).get_many(["a", "b", "missing"])
+
+    # THEN the stored embeddings are returned
+    assert found == {"a": [0.5, 1.5], "b": [2.0, -1.0]}
+
+
+def test_local_cache_prunes_least_recently_used(tmp_path):
+    """Test the SQLite cache keeps at most max_rows, dropping the least recently used."""
+    # GIVEN a cache of two embeddings, of which "a" was read after "b" was stored
+    cache = LocalEmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_rows=2)
+    cache.put_many({"a": [1.0]})
+    cache.put_many({"b": [2.0]})
+    cache.get_many(["a"])
+
+    # WHEN a third embedding is stored
+    cache.put_many({"c": [3.0]})
+
+    # THEN the least recently used one was pruned
+    assert cache.get_many(["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+
+
+@pytest.mark.anyio
+async def test_query_cache_serves_normalised_repeats(fake_embeddings):
+    """Test a question asked again, with different case or spacing, isn't re-embedded."""
+    # GIVEN embeddings with a query cache, which has embedded a question
+    embeddings = BatchedEmbeddings(fake_embeddings, query_cache=QueryEmbeddingCache())
+    first = await embeddings.aembed_query("What is proof of work?")
+
+    # WHEN variants of the question are embedded
+    second = await embeddings.aembed_query("  what is PROOF of  work? ")
+    await embeddings.aembed_query("What is a block?")
+
+    # THEN only distinct questions are sent to the wrapped embeddings
+    assert fake_embeddings.queries == ["What is proof of work?", "What is a block?"]
+    assert second == first
+    # AND the hit rate is reported
+    stats = embeddings.stats()["query_cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+@pytest.mark.anyio
+async def test_concurrent_queries_share_one_embedding(fake_embeddings):
+    """Test a question embedded concurrently, by the answer cache and retrieval, once."""
+    # GIVEN embeddings with a query cache
+    embeddings = BatchedEmbeddings(fake_embeddings, query_cache=QueryEmbeddingCache())
+
+    # WHEN the same question is embedded concurrently, one caller being cancelled
+    cancelled = asyncio.create_task(embeddings.aembed_query("What is a block?"))
+    results = asyncio.gather(
+        embeddings.aembed_query("What is a block?"),
+        embeddings.aembed_query("what is a  block?"),
+    )
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    # THEN they share a single call to the wrapped embeddings
+    first, second = await results
+    assert first == second
+    assert fake_embeddings.queries == ["What is a block?"]
+
+
+def test_query_cache_evicts_least_recently_used_and_expired_entries(monkeypatch):
+    """Test the in-process tier is bounded in size and time."""
+    # GIVEN a cache of two entries with a 10s time to live
+    now = [0.0]
+    monkeypatch.setattr("brain.embeddings.time.monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(max_size=2, ttl=10)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+
+    # WHEN "a" is used, then a third entry added
+    assert cache.get("a") == [1.0]
+    cache.put("c", [3.0])
+
+    # THEN the least recently used entry was evicted
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+
+    # AND entries expire after their time to live
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+@pytest.mark.anyio
+async def test_query_cache_falls_back_to_the_shared_tier(fake_embeddings):
+    """Test a question embedded by another instance is read from the shared tier."""
+    # GIVEN two instances sharing a cache tier, one of which embedded a question
+    shared = InMemoryEmbeddingCache()
+    other = BatchedEmbeddings(
+        RecordingEmbeddings(), query_cache=QueryEmbeddingCache(shared=shared)
+    )
+    expected = await other.aembed_query("Who wrote the paper?")
+    cache = QueryEmbeddingCache(shared=shared)
+    embeddings = BatchedEmbeddings(fake_embeddings, query_cache=cache)
+
+    # WHEN the second instance embeds the same question twice
+    assert await embeddings.aembed_query("Who wrote the paper?") == expected
+    assert await embeddings.aembed_query("Who wrote the paper?") == expected
+
+    # THEN it is read from the shared tier once, then from memory
+    assert fake_embeddings.queries == []
+    assert cache.stats()["shared_hits"] == 1
+    assert cache.stats()["hits"] == 1
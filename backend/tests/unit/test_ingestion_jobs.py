@@ -0,0 +1,85 @@
+import shutil
+from unittest.mock import Mock
+
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+
+from brain.document_processing import DocumentProcessor
+from brain.rag import RAGChain
+from brain.summariser import SummaryChain
+from repositories.session_db import InMemoryDocumentStore
+from repositories.vector_db import InMemoryStore
+from services.ingestion_jobs import IngestionJobQueue
+from services.pdf_chat_service import INGESTION_STAGES, PDFChatService
+
+
+@pytest.fixture
+def pdf_service(monkeypatch):
+    """Create a PDFChatService with in-memory stores and small ingestion batches."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-fake-key-for-testing")
+    return PDFChatService(
+        document_processor=DocumentProcessor(),
+        vector_store=InMemoryStore(embeddings=FakeEmbeddings(size=8)),
+        document_store=InMemoryDocumentStore(),
+        rag_chain=Mock(spec=RAGChain),
+        summary_chain=Mock(spec=SummaryChain),
+        ingestion_batch_size=10,
+    )
+
+
+@pytest.mark.anyio
+async def test_queued_upload_is_ingested_in_stages(pdf_service, pdf_path, tmp_path):
+    """Test a queued upload runs every stage and records the document ID."""
+    # GIVEN an ingestion queue, and an uploaded PDF
+    queue = IngestionJobQueue(pdf_service, workers=1)
+    upload_path = shutil.copy(pdf_path, tmp_path / "upload.pdf")
+
+    # WHEN the PDF is submitted
+    job = queue.submit(str(upload_path), "test_session", "bitcoin.pdf")
+    assert job.status == "queued"
+    await queue.join()
+
+    # THEN the job completes with the new document, and the upload is deleted
+    assert job.status == "completed"
+    assert not upload_path.exists()
+
+    # AND every stage has run, with all chunks embedded and indexed
+    stages = job.progress.stages
+    assert all(stages[stage].status == "completed" for stage in INGESTION_STAGES)
+    pages = DocumentProcessor().load_pdf(pdf_path)
+    chunk_count = len(DocumentProcessor().chunk_docs(pages))
+    assert stages["parse"].items == len(pages) == 9
+    assert stages["chunk"].items == stages["embed"].items == chunk_count
+    assert stages["index"].items == len(pdf_service.vector_store.store)
+    assert stages["index"].items == chunk_count
+
+    # AND the full text is stored as it was parsed
+    assert pdf_service.document_store.get_document(job.doc_id) == "\n".join(
+        page.page_content for page in pages
+    )
+    # AND each page can be read on its own
+    assert pdf_service.document_store.get_pages(job.doc_id, 2, 4) == [
+        page.page_content for page in pages[2:4]
+    ]
+    queue.close()
+
+
+@pytest.mark.anyio
+async def test_failed_upload_reports_error(pdf_service, tmp_path):
+    """Test a job fails with the error, and the unfinished stages are failed."""
+    # GIVEN an ingestion queue
+    queue = IngestionJobQueue(pdf_service, workers=1)
+
+    # WHEN a file that isn't a PDF is submitted
+    not_a_pdf = tmp_path / "not_a.pdf"
+    not_a_pdf.write_text("definitely not a PDF")
+    job = queue.submit(str(not_a_pdf), "test_session", "not_a.pdf")
+    await queue.join()
+
+    # THEN the job fails, reporting the error, and the upload is deleted
+    assert job.status == "failed"
+    assert job.error is not None
+    assert not not_a_pdf.exists()
+    assert job.progress.stages["parse"].status == "failed"
+    assert job.doc_id is None
+    queue.close()
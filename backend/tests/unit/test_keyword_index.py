@@ -0,0 +1,83 @@
+from typing import List
+
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from repositories.keyword_index import BM25Index, tokenize
+from repositories.vector_db import InMemoryStore
+
+CHUNKS = [
+    "Nodes collect new transactions into a block.",
+    "The proof-of-work involves scanning for a value that when hashed begins with "
+    "a number of zero bits.",
+    "We consider the scenario of an attacker trying to generate an alternate chain.",
+    "The probability drops exponentially as the number of blocks z increases, "
+    "see equation 7.",
+    "Transactions are hashed in a Merkle Tree, with only the root included.",
+]
+
+
+class ConstantEmbeddings(Embeddings):
+    """Fake embeddings that make every chunk equally similar to every query."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [1.0, 0.0, 0.0]
+
+
+def _documents() -> List[Document]:
+    return [Document(page_content=text) for text in CHUNKS]
+
+
+def test_tokenize_keeps_numbers_and_drops_stopwords():
+    """Test question words are dropped and numbers kept whole."""
+    assert tokenize("What is the value of 2.5 in Equation 7?") == [
+        "value",
+        "2.5",
+        "equation",
+        "7",
+    ]
+
+
+def test_bm25_ranks_exact_term_matches_first():
+    """Test chunks containing the query's rare terms are ranked first."""
+    # GIVEN chunks of two documents indexed in two batches
+    index = BM25Index()
+    index.add("doc-1", _documents()[:3])
+    index.add("doc-1", _documents()[3:])
+    index.add("doc-2", [Document(page_content="Merkle Tree equation 7")])
+
+    # WHEN the first document is searched for exact terms
+    results = index.search("doc-1", "Which equation shows the Merkle Tree?", k=2)
+
+    # THEN the matching chunks of that document come first
+    assert [doc.page_content for doc in results] == [CHUNKS[4], CHUNKS[3]]
+    # AND chunks without any of the terms are never returned
+    assert index.search("doc-1", "elliptic curves", k=2) == []
+    assert index.search("missing", "Merkle Tree", k=2) == []
+
+
+@pytest.mark.anyio
+async def test_hybrid_retriever_finds_exact_terms_dense_retrieval_misses():
+    """Test keyword results are fused in when the embeddings can't tell chunks apart."""
+    # GIVEN a store whose embeddings rank every chunk the same
+    vector_store = InMemoryStore(ConstantEmbeddings())
+    vector_store.add_documents(_documents(), session_id="session", doc_id="doc-1")
+
+    # WHEN the document is searched in dense and hybrid mode
+    query = "Where is the Merkle Tree root?"
+    dense = await vector_store.get_retriever(
+        "session", "doc-1", k=2, mode="dense"
+    ).ainvoke(query)
+    hybrid = await vector_store.get_retriever(
+        "session", "doc-1", k=2, mode="hybrid"
+    ).ainvoke(query)
+
+    # THEN only the hybrid retriever ranks the chunk with the exact terms first
+    assert CHUNKS[4] not in [doc.page_content for doc in dense]
+    assert hybrid[0].page_content == CHUNKS[4]
+    # AND k chunks are returned
+    assert len(hybrid) == 2
@@ -0,0 +1,199 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from brain.model_router import (
+    ROUTE_PROTOTYPES,
+    PrototypeClassifier,
+    QueryRouter,
+    RouteQuery,
+)
+from settings import settings
+
+# Queries about assorted documents, none of them used as prototypes
+LABELLED_QUERIES = [
+    ("What is this document about?", "summary"),
+    ("Summarize the paper", "summary"),
+    ("Can you give me a summary of this report?", "summary"),
+    ("Give me an overview", "summary"),
+    ("What are the main findings?", "summary"),
+    ("What are the key takeaways?", "summary"),
+    ("What is the main argument of this article?", "summary"),
+    ("TL;DR", "summary"),
+    ("Briefly, what does this contract cover?", "summary"),
+    ("What is the gist of this book?", "summary"),
+    ("Summarise the main points", "summary"),
+    ("What are the conclusions of the study?", "summary"),
+    ("Give me a high level overview of the manual", "summary"),
+    ("What is the purpose of this document?", "summary"),
+    ("Can you sum up the paper in a few sentences?", "summary"),
+    ("Could you summarise the whole thesis?", "summary"),
+    ("What is the overall message of the book?", "summary"),
+    ("Provide an executive summary", "summary"),
+    ("What are the main findings about double spending?", "q_and_a"),
+    ("What does the report say about revenue growth in 2023?", "q_and_a"),
+    ("What is the termination clause in the contract?", "q_and_a"),
+    ("Who are the authors?", "q_and_a"),
+    ("What does table 2 show?", "q_and_a"),
+    ("What is shown in figure 3?", "q_and_a"),
+    ("How is the sample size calculated?", "q_and_a"),
+    ("What dosage does the study recommend for children?", "q_and_a"),
+    ("What did I ask you before?", "q_and_a"),
+    ("Can you elaborate on that?", "q_and_a"),
+    ("What was your previous answer?", "q_and_a"),
+    ("Which methods were used to collect the data?", "q_and_a"),
+    ("When does the warranty expire?", "q_and_a"),
+    ("How do I reset the device to factory settings?", "q_and_a"),
+    ("What does the author conclude about climate policy?", "q_and_a"),
+    ("Is it true that the merger was approved?", "q_and_a"),
+    ("What is the definition of net present value in section 4?", "q_and_a"),
+    ("Summarize section 3", "q_and_a"),
+    ("Why did the experiment fail?", "q_and_a"),
+    ("How many participants were in the trial?", "q_and_a"),
+    ("What are the main risks mentioned in the prospectus?", "q_and_a"),
+    ("What are the key points on data retention?", "q_and_a"),
+    ("How much does the premium plan cost?", "q_and_a"),
+    ("Who is the landlord in this lease?", "q_and_a"),
+    ("What happens in chapter 5?", "q_and_a"),
+    ("Explain the second equation", "q_and_a"),
+    ("What are the side effects listed?", "q_and_a"),
+]
+
+
+@pytest.fixture
+def llm_router():
+    """Mock LLM router that would route everything to q_and_a."""
+    router = Mock()
+    router.invoke.return_value = RouteQuery(task="q_and_a")
+    router.ainvoke = AsyncMock(return_value=RouteQuery(task="q_and_a"))
+    return router
+
+
+class TestPrototypeClassifier:
+    @pytest.mark.parametrize(
+        "query, expected_task",
+        [
+            ("What is this document about?", "summary"),
+            ("Give me an overview", "summary"),
+            ("What did I ask you before?", "q_and_a"),
+            ("How does the timestamp server work?", "q_and_a"),
+        ],
+    )
+    def test_classifies_clear_queries(self, query, expected_task):
+        """Test unambiguous queries are classified with a confident margin."""
+        classifier = PrototypeClassifier(ROUTE_PROTOTYPES)
+
+        task, confidence = classifier.predict(query)
+
+        assert task == expected_task
+        assert confidence > 0.25
+
+    def test_confident_routes_are_accurate_on_labelled_queries(self):
+        """Test queries routed locally are almost never misrouted, whatever the document."""
+        classifier = PrototypeClassifier(ROUTE_PROTOTYPES)
+        threshold = settings.router_confidence_threshold
+
+        predictions = [
+            (classifier.predict(query), expected)
+            for query, expected in LABELLED_QUERIES
+        ]
+        confident = [
+            task == expected
+            for (task, confidence), expected in predictions
+            if confidence >= threshold
+        ]
+        accuracy = sum(task == expected for (task, _), expected in predictions) / len(
+            predictions
+        )
+
+        # Less sure queries fall back to the LLM router, confident ones must be right
+        assert sum(confident) / len(confident) >= 0.95
+        assert len(confident) / len(predictions) >= 0.5
+        assert accuracy >= 0.85
+
+    def test_topic_questions_are_not_routed_to_summary(self):
+        """Test a summary-like question narrowed to a topic isn't confidently a summary."""
+        classifier = PrototypeClassifier(ROUTE_PROTOTYPES)
+
+        task, confidence = classifier.predict(
+            "What are the main findings about double spending?"
+        )
+
+        assert task == "q_and_a" or confidence < settings.router_confidence_threshold
+
+    def test_unrelated_query_has_no_confidence(self):
+        """Test queries sharing no terms with the prototypes have zero confidence."""
+        classifier = PrototypeClassifier(ROUTE_PROTOTYPES)
+
+        _, confidence = classifier.predict("xyzzy plugh")
+
+        assert confidence == 0.0
+
+
+class TestQueryRouter:
+    def test_confident_query_skips_llm(self, llm_router):
+        """Test a confident local route short-circuits the LLM router."""
+        router = QueryRouter(llm_router=llm_router)
+
+        route = router.invoke("Who are the authors of this paper?")
+
+        assert route.task == "q_and_a"
+        llm_router.invoke.assert_not_called()
+        assert router.stats()["short_circuits"] == 1
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            "Summarize this document",
+            "What is the purpose of the nonce?",
+            "Give me an overview of the incentive mechanism",
+            "What does this document cover regarding privacy?",
+            "What is the gist of section 4?",
+            "What is the main argument for using timestamps?",
+        ],
+    )
+    def test_summary_routes_are_confirmed_by_llm(self, llm_router, query):
+        """Test queries taken for summaries never skip retrieval without the LLM."""
+        router = QueryRouter(llm_router=llm_router)
+
+        route = router.invoke(query)
+
+        assert route.task == "q_and_a"
+        llm_router.invoke.assert_called_once_with(query)
+        assert router.stats()["short_circuits"] == 0
+
+    def test_ambiguous_query_falls_back_to_llm(self, llm_router):
+        """Test a low confidence local route falls back to the LLM router."""
+        router = QueryRouter(llm_router=llm_router)
+
+        route = router.invoke("What is Bitcoin?")
+
+        assert route.task == "q_and_a"
+        llm_router.invoke.assert_called_once_with("What is Bitcoin?")
+        assert router.stats()["llm_calls"] == 1
+
+    @pytest.mark.anyio
+    async def test_stats_report_saved_latency(self, llm_router):
+        """Test stats report the short-circuit rate and latency saved."""
+        router = QueryRouter(llm_router=llm_router)
+
+        await router.ainvoke("What is Bitcoin?")
+        await router.ainvoke("Who are the authors?")
+        await router.ainvoke("What did I ask you before?")
+
+        stats = router.stats()
+        assert stats["short_circuit_rate"] == pytest.approx(2 / 3)
+        assert 0 <= stats["saved_seconds_p50"] <= stats["saved_seconds_p95"]
+
+    def test_saved_latency_percentiles_follow_llm_latencies(self, llm_router):
+        """Test the saved latency percentiles are those of the LLM calls avoided."""
+        router = QueryRouter(llm_router=llm_router)
+        router.invoke("Who are the authors?")
+        for latency in [0.1 * i for i in range(1, 21)]:  # 0.1s to 2.0s
+            router._record_llm_call(latency)
+
+        stats = router.stats()
+
+        assert stats["saved_seconds_p50"] == pytest.approx(1.0, abs=0.01)
+        assert stats["saved_seconds_p95"] == pytest.approx(1.9, abs=0.01)
+        assert stats["saved_seconds_total"] == pytest.approx(1.05, abs=0.01)
@@ -1,14 +1,17 @@
+import asyncio
 import os
-from unittest.mock import ANY, Mock, call, patch
+from unittest.mock import ANY, AsyncMock, Mock, call, patch
 
 import pytest
 from langchain_community.chat_models import ChatOpenAI
-from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.embeddings import DeterministicFakeEmbedding, FakeEmbeddings
 from langchain_community.llms import FakeListLLM
+from langchain_core.messages import AIMessage, HumanMessage
 
+from brain.answer_cache import SemanticAnswerCache
 from brain.document_processing import DocumentProcessor
 from brain.rag import RAGChain
-from brain.summariser import SummaryChain
+from brain.summariser import SUMMARY_PROMPT_VERSION, SummaryChain
 from repositories.session_db import InMemoryDocumentStore
 from repositories.vector_db import InMemoryStore
 from services.pdf_chat_service import PDFChatService
@@ -31,20 +34,21 @@ def mock_openai_dependencies():
     del os.environ["OPENAI_API_KEY"]
 
 
+def create_mock_history(session_id=None, messages=()):
+    """Mock PostgresChatHistory holding the given messages and no summary."""
+    mock_history = Mock()
+    mock_history.session_id = session_id
+    mock_history.get_summary.return_value = (None, 0)
+    mock_history.get_recent_messages.return_value = list(enumerate(messages, 1))
+    mock_history.get_older_messages.return_value = []
+    return mock_history
+
+
 @pytest.fixture(autouse=True)
 def mock_chat_history():
-    """Mock PostgresChatMessageHistory for all tests."""
-
-    def create_mock_history(connection_string=None, session_id=None):
-        mock_history = Mock()
-        mock_history.messages = []
-        mock_history.add_user_message = Mock()
-        mock_history.add_ai_message = Mock()
-        return mock_history
-
-    with patch(
-        "services.pdf_chat_service.PostgresChatMessageHistory"
-    ) as mock_history_cls:
+    """Mock PostgresChatHistory for all tests."""
+
+    with patch("services.pdf_chat_service.PostgresChatHistory") as mock_history_cls:
         mock_history_cls.side_effect = create_mock_history
         yield mock_history_cls
 
@@ -53,10 +57,16 @@ def mock_chat_history():
 def mock_chains():
     """Create mock RAG and Summary chains."""
     mock_rag_chain = Mock(spec=RAGChain)
-    mock_rag_chain.run.return_value = "Mock RAG response"
+    mock_rag_chain.arun.return_value = "Mock RAG response"
+
+    async def mock_rag_stream(*args, **kwargs):
+        for token in ["Mock ", "RAG ", "response"]:
+            yield token
+
+    mock_rag_chain.astream = Mock(side_effect=mock_rag_stream)
 
     mock_summary_chain = Mock(spec=SummaryChain)
-    mock_summary_chain.run.return_value = "Mock summary response"
+    mock_summary_chain.arun.return_value = "Mock summary response"
 
     return mock_rag_chain, mock_summary_chain
 
@@ -126,7 +136,7 @@ class TestPDFChatService:
 
         # Create mock router response just for this test
         mock_router = Mock()
-        mock_router.invoke.return_value = Mock(task="q_and_a")
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
         service.router = mock_router
 
         response = service.query(
@@ -138,13 +148,34 @@ class TestPDFChatService:
         assert isinstance(response, str)
         assert len(response) > 0
 
+    def test_q_and_a_query_only_checks_the_document_exists(
+        self, loaded_pdf_chat_service
+    ):
+        """Test answering a question never reads the document's full text."""
+        service, session_id, doc_id = loaded_pdf_chat_service
+        mock_router = Mock()
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
+        service.router = mock_router
+        service.document_store.aget_document = AsyncMock()
+
+        response = service.query(
+            session_id=session_id, doc_id=doc_id, question="What is the main topic?"
+        )
+        missing = service.query(
+            session_id=session_id, doc_id="missing", question="What is the main topic?"
+        )
+
+        assert response == "Mock RAG response"
+        assert missing == "Please upload a document first."
+        service.document_store.aget_document.assert_not_called()
+
     def test_summary_query(self, loaded_pdf_chat_service):
         """Test summary functionality."""
         service, session_id, doc_id = loaded_pdf_chat_service
 
         # Create mock router response for summary
         mock_router = Mock()
-        mock_router.invoke.return_value = Mock(task="summary")
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="summary"))
         service.router = mock_router
 
         response = service.query(
@@ -154,25 +185,146 @@ class TestPDFChatService:
         )
 
         assert response == "Mock summary response"
-        service.summary_chain.run.assert_called_once()
+        service.summary_chain.arun.assert_called_once()
+
+    def test_query_retrieves_while_routing(self, loaded_pdf_chat_service):
+        """Test retrieval runs speculatively and its documents are handed to the RAG chain."""
+        service, session_id, doc_id = loaded_pdf_chat_service
+
+        route_started = asyncio.Event()
+        retrieval_started = asyncio.Event()
+
+        async def route(question):
+            route_started.set()
+            # Routing only finishes once retrieval has started, i.e. they overlap
+            await asyncio.wait_for(retrieval_started.wait(), timeout=1)
+            return Mock(task="q_and_a")
+
+        async def retrieve(question):
+            retrieval_started.set()
+            await asyncio.wait_for(route_started.wait(), timeout=1)
+            return ["retrieved chunk"]
+
+        mock_router = Mock()
+        mock_router.ainvoke = AsyncMock(side_effect=route)
+        service.router = mock_router
+        mock_retriever = Mock()
+        mock_retriever.ainvoke = AsyncMock(side_effect=retrieve)
+        service.vector_store.get_retriever = Mock(return_value=mock_retriever)
+
+        response = service.query(
+            session_id=session_id, doc_id=doc_id, question="What is the main topic?"
+        )
+
+        assert response == "Mock RAG response"
+        service.rag_chain.arun.assert_called_once_with(
+            "What is the main topic?", ANY, [], documents=["retrieved chunk"]
+        )
+
+    def test_summary_query_discards_speculative_retrieval(
+        self, loaded_pdf_chat_service
+    ):
+        """Test speculative retrieval is cancelled when the question is a summary."""
+        service, session_id, doc_id = loaded_pdf_chat_service
+
+        retrieval_cancelled = False
+
+        async def retrieve(question):
+            nonlocal retrieval_cancelled
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                retrieval_cancelled = True
+                raise
+
+        mock_router = Mock()
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="summary"))
+        service.router = mock_router
+        mock_retriever = Mock()
+        mock_retriever.ainvoke = AsyncMock(side_effect=retrieve)
+        service.vector_store.get_retriever = Mock(return_value=mock_retriever)
+
+        response = service.query(
+            session_id=session_id, doc_id=doc_id, question="Summarize this document"
+        )
+
+        assert response == "Mock summary response"
+        assert retrieval_cancelled
+        service.rag_chain.arun.assert_not_called()
+
+    def test_summary_is_precomputed_at_upload(
+        self, mock_chains, vector_store, document_store, pdf_path
+    ):
+        """Test the summary generated at upload is reused instead of regenerated."""
+        mock_rag_chain, mock_summary_chain = mock_chains
+        service = PDFChatService(
+            document_processor=DocumentProcessor(),
+            vector_store=vector_store,
+            document_store=document_store,
+            rag_chain=mock_rag_chain,
+            summary_chain=mock_summary_chain,
+            precompute_summaries=True,
+        )
+        mock_router = Mock()
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="summary"))
+        service.router = mock_router
+
+        doc_id = service.upload(pdf_path, "test_session")["doc_id"]
+
+        # The summary is stored alongside the document
+        assert (
+            document_store.get_summary(doc_id, SUMMARY_PROMPT_VERSION)
+            == "Mock summary response"
+        )
+
+        for question in ["Summarize this document", "What is this paper about?"]:
+            response = service.query(
+                session_id="test_session", doc_id=doc_id, question=question
+            )
+            assert response == "Mock summary response"
+
+        mock_summary_chain.arun.assert_called_once()
+
+    @pytest.mark.anyio
+    async def test_concurrent_summary_queries_share_one_job(
+        self, loaded_pdf_chat_service
+    ):
+        """Test concurrent summary questions wait on a single summary generation."""
+        service, session_id, doc_id = loaded_pdf_chat_service
+
+        async def slow_summary(docs, doc_id=None):
+            await asyncio.sleep(0.05)
+            return "Mock summary response"
+
+        service.summary_chain.arun.side_effect = slow_summary
+        mock_router = Mock()
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="summary"))
+        service.router = mock_router
+
+        responses = await asyncio.gather(
+            *[
+                service.aquery(
+                    session_id=session_id, doc_id=doc_id, question="Summarize this"
+                )
+                for _ in range(5)
+            ]
+        )
+
+        assert responses == ["Mock summary response"] * 5
+        service.summary_chain.arun.assert_called_once()
 
     def test_chat_history_integration(self, loaded_pdf_chat_service):
-        """Test chat history integration with PostgresChatMessageHistory."""
+        """Test chat history integration with PostgresChatHistory."""
         service, session_id, doc_id = loaded_pdf_chat_service
 
         # Create mock router response for Q&A
         mock_router = Mock()
-        mock_router.invoke.return_value = Mock(task="q_and_a")
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
         service.router = mock_router
 
-        # Mock PostgresChatMessageHistory before making any calls
-        with patch(
-            "services.pdf_chat_service.PostgresChatMessageHistory"
-        ) as mock_history_cls:
-            mock_history = Mock()
-            mock_history.messages = []
-            mock_history.add_user_message = Mock()
-            mock_history.add_ai_message = Mock()
+        # Mock PostgresChatHistory before making any calls
+        with patch("services.pdf_chat_service.PostgresChatHistory") as mock_history_cls:
+            mock_history = create_mock_history()
             mock_history_cls.return_value = mock_history
 
             # First question
@@ -193,18 +345,81 @@ class TestPDFChatService:
             assert response1 == "Mock RAG response"
             assert response2 == "Mock RAG response"
 
-            # Verify chat history was updated correctly
-            assert mock_history.add_user_message.call_count == 2
-            assert mock_history.add_ai_message.call_count == 2
+            # Verify chat history was updated correctly, one write per turn
+            assert mock_history.add_messages.call_count == 2
 
             # Verify the correct messages were added in order
-            mock_history.add_user_message.assert_has_calls(
-                [call("What is the main topic?"), call("Can you elaborate?")]
+            mock_history.add_messages.assert_has_calls(
+                [
+                    call(
+                        [
+                            HumanMessage(content="What is the main topic?"),
+                            AIMessage(content="Mock RAG response"),
+                        ]
+                    ),
+                    call(
+                        [
+                            HumanMessage(content="Can you elaborate?"),
+                            AIMessage(content="Mock RAG response"),
+                        ]
+                    ),
+                ]
+            )
+
+    @pytest.mark.anyio
+    async def test_stream_query_writes_history_after_stream(
+        self, loaded_pdf_chat_service
+    ):
+        """Test streamed answers are yielded token by token and saved once complete."""
+        service, session_id, doc_id = loaded_pdf_chat_service
+
+        mock_router = Mock()
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
+        service.router = mock_router
+
+        with patch("services.pdf_chat_service.PostgresChatHistory") as mock_history_cls:
+            mock_history = create_mock_history()
+            mock_history_cls.return_value = mock_history
+
+            stream = service.astream_query(
+                session_id=session_id,
+                doc_id=doc_id,
+                question="What is the main topic?",
             )
-            mock_history.add_ai_message.assert_has_calls(
-                [call("Mock RAG response"), call("Mock RAG response")]
+
+            # Nothing is written to history until the stream has been consumed
+            assert await anext(stream) == "Mock "
+            mock_history.add_messages.assert_not_called()
+
+            assert [token async for token in stream] == ["RAG ", "response"]
+            mock_history.add_messages.assert_called_once_with(
+                [
+                    HumanMessage(content="What is the main topic?"),
+                    AIMessage(content="Mock RAG response"),
+                ]
             )
 
+    @pytest.mark.anyio
+    async def test_history_summary_is_awaited_without_background_tasks(
+        self, loaded_pdf_chat_service
+    ):
+        """Test the rolling summary is updated before returning when tasks can't outlive it."""
+        service, session_id, doc_id = loaded_pdf_chat_service
+        service.background_tasks = False
+        service.chat_memory = Mock()
+        service.chat_memory.load.return_value = []
+        service.chat_memory.aupdate_summary = AsyncMock()
+        mock_router = Mock()
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
+        service.router = mock_router
+
+        await service.aquery(
+            session_id=session_id, doc_id=doc_id, question="What is the main topic?"
+        )
+
+        service.chat_memory.aupdate_summary.assert_awaited_once()
+        assert service._history_jobs == {}
+
     def test_multiple_documents_per_session(
         self, pdf_chat_service, pdf_path, mock_chat_history
     ):
@@ -224,7 +439,7 @@ class TestPDFChatService:
 
         # Create mock router response for testing
         mock_router = Mock()
-        mock_router.invoke.return_value = Mock(task="q_and_a")
+        mock_router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
         pdf_chat_service.router = mock_router
 
         # Query first document
@@ -257,3 +472,152 @@ class TestPDFChatService:
         assert len(history_calls) == 2
         assert history_calls[0].kwargs["session_id"] == f"{session_id}:{doc_1_id}"
         assert history_calls[1].kwargs["session_id"] == f"{session_id}:{doc_2_id}"
+
+    def test_identical_upload_is_deduplicated(
+        self, mock_chains, vector_store, document_store, pdf_path
+    ):
+        """Test re-uploading the same PDF reuses the stored document and chunks."""
+        mock_rag_chain, mock_summary_chain = mock_chains
+        document_processor = DocumentProcessor()
+        service = PDFChatService(
+            document_processor=document_processor,
+            vector_store=vector_store,
+            document_store=document_store,
+            rag_chain=mock_rag_chain,
+            summary_chain=mock_summary_chain,
+            deduplicate_uploads=True,
+        )
+        first_doc_id = service.upload(pdf_path, "session_1")["doc_id"]
+        chunk_count = len(vector_store.store)
+
+        with patch.object(
+            document_processor, "iter_pages", wraps=document_processor.iter_pages
+        ) as iter_pages:
+            second_doc_id = service.upload(pdf_path, "session_2")["doc_id"]
+
+        # The second session is given the existing document without reprocessing it
+        assert second_doc_id == first_doc_id
+        iter_pages.assert_not_called()
+        assert len(vector_store.store) == chunk_count
+        assert document_store._sessions[first_doc_id] == {"session_1", "session_2"}
+
+        # And can retrieve its chunks
+        retriever = vector_store.get_retriever("session_2", second_doc_id)
+        assert len(retriever.invoke("test query")) > 0
+
+    @pytest.mark.anyio
+    async def test_concurrent_identical_uploads_share_one_ingestion(
+        self, mock_chains, vector_store, document_store, pdf_path
+    ):
+        """Test concurrent uploads of the same PDF are only processed once."""
+        mock_rag_chain, mock_summary_chain = mock_chains
+        document_processor = DocumentProcessor()
+        service = PDFChatService(
+            document_processor=document_processor,
+            vector_store=vector_store,
+            document_store=document_store,
+            rag_chain=mock_rag_chain,
+            summary_chain=mock_summary_chain,
+            deduplicate_uploads=True,
+        )
+
+        with patch.object(
+            document_processor, "iter_pages", wraps=document_processor.iter_pages
+        ) as iter_pages:
+            results = await asyncio.gather(
+                *[service.aupload(pdf_path, f"session_{i}") for i in range(3)]
+            )
+
+        assert len({result["doc_id"] for result in results}) == 1
+        iter_pages.assert_called_once()
+
+    @pytest.fixture
+    def cached_pdf_chat_service(self, mock_chains, document_store, pdf_path):
+        """PDFChatService with an answer cache and deterministic embeddings."""
+        mock_rag_chain, mock_summary_chain = mock_chains
+        service = PDFChatService(
+            document_processor=DocumentProcessor(),
+            vector_store=InMemoryStore(
+                embeddings=DeterministicFakeEmbedding(size=settings.embedding_size)
+            ),
+            document_store=document_store,
+            rag_chain=mock_rag_chain,
+            summary_chain=mock_summary_chain,
+            answer_cache=SemanticAnswerCache(threshold=0.95),
+        )
+        doc_id = service.upload(pdf_path, "session_1")["doc_id"]
+        service.router = Mock()
+        service.router.ainvoke = AsyncMock(return_value=Mock(task="q_and_a"))
+        return service, doc_id
+
+    def test_repeated_question_is_answered_from_the_cache(
+        self, cached_pdf_chat_service, mock_chat_history
+    ):
+        """Test another session asking the same question skips RAG."""
+        service, doc_id = cached_pdf_chat_service
+        question = "What is the main contribution?"
+        first = service.query("session_1", doc_id, question)
+
+        second = service.query("session_2", doc_id, question)
+
+        assert second == first == "Mock RAG response"
+        service.rag_chain.arun.assert_called_once()
+        assert service.answer_cache.stats()["hits"] == 1
+        # The cached turn is still recorded in the second session's history
+        assert mock_chat_history.call_args.kwargs["session_id"] == f"session_2:{doc_id}"
+
+    @pytest.mark.anyio
+    async def test_cache_hit_cancels_routing_and_retrieval(
+        self, cached_pdf_chat_service
+    ):
+        """Test routing and retrieval start with the cache lookup, and stop on a hit."""
+        service, doc_id = cached_pdf_chat_service
+        question = "What is the main contribution?"
+        await service.aquery("session_1", doc_id, question)
+
+        # GIVEN routing and retrieval that would never finish
+        cancelled = []
+
+        async def never_finishes(question):
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(question)
+                raise
+
+        service.router.ainvoke = AsyncMock(side_effect=never_finishes)
+        mock_retriever = Mock()
+        mock_retriever.ainvoke = AsyncMock(side_effect=never_finishes)
+        service.vector_store.get_retriever = Mock(return_value=mock_retriever)
+
+        # WHEN the question is asked again
+        answer = await asyncio.wait_for(
+            service.aquery("session_2", doc_id, question), timeout=5
+        )
+
+        # THEN both were started, and cancelled once the cached answer was found
+        assert answer == "Mock RAG response"
+        assert cancelled == [question, question]
+
+    def test_answer_cache_is_bypassed_on_request_or_with_history(
+        self, cached_pdf_chat_service, mock_chat_history
+    ):
+        """Test bypassing requests and follow-up questions are always answered afresh."""
+        service, doc_id = cached_pdf_chat_service
+        question = "What is the main contribution?"
+        service.query("session_1", doc_id, question)
+
+        # A request bypassing the cache
+        service.query("session_2", doc_id, question, bypass_cache=True)
+
+        # A session with chat history
+        def history_with_messages(session_id=None):
+            return create_mock_history(
+                session_id, [HumanMessage(content="Hi"), AIMessage(content="Hello")]
+            )
+
+        mock_chat_history.side_effect = history_with_messages
+        service.query("session_3", doc_id, question)
+
+        assert service.rag_chain.arun.call_count == 3
+        assert service.answer_cache.stats()["hits"] == 0
@@ -0,0 +1,73 @@
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_openai import OpenAIEmbeddings
+
+from brain.embeddings import BatchedEmbeddings
+from dependencies import services as services_module
+from dependencies.services import (
+    get_embeddings,
+    get_pdf_service,
+    reset_services,
+    services,
+    warm_up_services,
+)
+from repositories.session_db import InMemoryDocumentStore
+from repositories.vector_db import HNSW_MAX_DIMENSIONS, InMemoryStore
+
+
+@pytest.fixture(autouse=True)
+def in_memory_settings(monkeypatch):
+    """Build in-memory stores with fake embeddings instead of Postgres/S3/OpenAI."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-fake-key-for-testing")
+    monkeypatch.setattr(services_module.settings, "use_postgres_db", False)
+    monkeypatch.setattr(services_module.settings, "document_store_type", "in_memory")
+    monkeypatch.setattr(services_module.settings, "embedding_cache_type", "none")
+    monkeypatch.setattr(
+        services_module,
+        "OpenAIEmbeddings",
+        lambda model, dimensions: FakeEmbeddings(size=8),
+    )
+    reset_services()
+    yield
+    reset_services()
+
+
+def test_embeddings_are_shortened_to_the_vector_column(monkeypatch):
+    """Test the OpenAI embeddings are requested at the configured, indexable, width."""
+    # GIVEN the real OpenAI embeddings client
+    monkeypatch.setattr(services_module, "OpenAIEmbeddings", OpenAIEmbeddings)
+
+    # WHEN the embeddings are built
+    embeddings = get_embeddings().embeddings
+
+    # THEN they have the size of the pgvector column, which HNSW can index
+    assert embeddings.model == services_module.settings.embedding_model
+    assert embeddings.dimensions == services_module.settings.embedding_size
+    assert embeddings.dimensions <= HNSW_MAX_DIMENSIONS
+
+
+def test_warm_up_builds_services_once():
+    """Test the PDF service is built during warm-up and reused by every request."""
+    # WHEN the services are warmed up
+    warm_up_services()
+    warmed_up_service = services.pdf_service
+
+    # THEN the stores and service are built up front
+    assert isinstance(services.vector_store, InMemoryStore)
+    assert isinstance(services.embeddings, BatchedEmbeddings)
+    assert isinstance(services.document_store, InMemoryDocumentStore)
+    assert warmed_up_service is not None
+    assert services.metrics["pdf_service_build_seconds"] > 0
+
+    # AND subsequent requests reuse the same instance
+    for _ in range(3):
+        service = get_pdf_service(
+            vector_store=services.vector_store,
+            document_store=services.document_store,
+        )
+        assert service is warmed_up_service
+
+    assert services.metrics["pdf_service_reuses"] == 3
+    assert services.metrics["pdf_service_build_seconds_saved"] == pytest.approx(
+        3 * services.metrics["pdf_service_build_seconds"]
+    )
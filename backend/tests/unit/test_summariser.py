@@ -0,0 +1,130 @@
+import asyncio
+import math
+
+import pytest
+from langchain.schema import Document
+from langchain_core.runnables import RunnableLambda
+
+from brain.summariser import HierarchicalSummariser
+
+
+class FakeLLM:
+    """Fake LLM recording how many calls were made and how many ran at once."""
+
+    def __init__(self):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, prompt_value) -> str:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return f"summary {self.calls}."
+
+
+@pytest.fixture
+def fake_llm():
+    return FakeLLM()
+
+
+@pytest.fixture
+def summariser(fake_llm):
+    return HierarchicalSummariser(
+        RunnableLambda(fake_llm),
+        section_chars=100,
+        reduce_fanout=4,
+        max_concurrency=3,
+    )
+
+
+@pytest.fixture
+def long_document():
+    """A document that splits into around 20 sections of 100 characters."""
+    sentence = "This sentence is exactly fifty characters long ok."
+    return [Document(page_content=sentence * 40, metadata={})]
+
+
+class TestHierarchicalSummariser:
+    @pytest.mark.anyio
+    async def test_summarises_in_a_tree_with_bounded_concurrency(
+        self, summariser, fake_llm, long_document
+    ):
+        """Test sections are mapped then reduced level by level, never too many at once."""
+        sections = len(summariser.document_processor.chunk_docs(long_document))
+
+        summary = await summariser.arun(long_document, doc_id="doc-1")
+
+        assert summary.startswith("summary")
+        # e.g. 20 sections -> 5 level-1 summaries -> 2 level-2 summaries -> 1 final
+        expected_calls, level_size = sections, sections
+        while level_size > 4:
+            level_size = math.ceil(level_size / 4)
+            expected_calls += level_size
+        assert sections > 16
+        assert fake_llm.calls == expected_calls + 1
+        assert fake_llm.max_in_flight <= 3
+
+    @pytest.mark.anyio
+    async def test_intermediate_summaries_are_cached_per_document(
+        self, summariser, fake_llm, long_document
+    ):
+        """Test intermediate summaries aren't recomputed for the same document."""
+        first = await summariser._summarise_to_fanout(long_document, doc_id="doc-1")
+        calls = fake_llm.calls
+
+        second = await summariser._summarise_to_fanout(long_document, doc_id="doc-1")
+
+        assert second == first
+        assert fake_llm.calls == calls
+
+        # A different document is summarised from scratch
+        await summariser._summarise_to_fanout(long_document, doc_id="doc-2")
+        assert fake_llm.calls == 2 * calls
+
+    @pytest.mark.anyio
+    async def test_streams_the_final_reduce(self, summariser, long_document):
+        """Test the final summary can be streamed once the sections are summarised."""
+        tokens = [
+            token async for token in summariser.astream(long_document, doc_id="doc-1")
+        ]
+
+        assert "".join(tokens).startswith("summary")
+        # The cache is dropped once the final summary is produced
+        assert summariser._cache == {}
+
+    @pytest.mark.anyio
+    async def test_cache_is_bounded_when_summaries_fail(self, fake_llm, long_document):
+        """Test intermediate summaries of failed documents are evicted."""
+        # GIVEN a summariser caching two documents for 10s, whose final step fails
+        now = [0.0]
+        summariser = HierarchicalSummariser(
+            RunnableLambda(fake_llm),
+            section_chars=100,
+            reduce_fanout=4,
+            cache_documents=2,
+            cache_ttl=10,
+            clock=lambda: now[0],
+        )
+        summariser.reduce_chain = RunnableLambda(_fail)
+
+        # WHEN three documents fail to be summarised
+        for doc_id in ["doc-1", "doc-2", "doc-3"]:
+            with pytest.raises(RuntimeError):
+                await summariser.arun(long_document, doc_id=doc_id)
+
+        # THEN only the two most recent documents are cached
+        assert list(summariser._cache) == ["doc-2", "doc-3"]
+
+        # AND they expire after their time to live
+        now[0] = 11.0
+        summariser.map_chain = RunnableLambda(_fail)
+        with pytest.raises(RuntimeError):
+            await summariser.arun(long_document, doc_id="doc-4")
+        assert list(summariser._cache) == ["doc-4"]
+
+
+async def _fail(prompt_value) -> str:
+    raise RuntimeError("LLM unavailable")
@@ -0,0 +1,123 @@
+from typing import List
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from repositories.vector_db import InMemoryStore, NumpyVectorStore
+
+
+class RandomEmbeddings(Embeddings):
+    """Fake embeddings mapping each text to a fixed random vector."""
+
+    def __init__(self, dimensions: int = 16):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        seed = sum(map(ord, text)) * 31 + len(text)
+        return np.random.default_rng(seed).normal(size=self.dimensions).tolist()
+
+
+def _brute_force_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> List[int]:
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = vectors @ (query / np.linalg.norm(query))
+    return list(np.argsort(-scores)[:k])
+
+
+def _add_random_documents(
+    store: NumpyVectorStore, doc_id: str, count: int, seed: int
+) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, 16))
+    store.add_embeddings(
+        [
+            Document(page_content=f"{doc_id} chunk {i}", metadata={"doc_id": doc_id})
+            for i in range(count)
+        ],
+        vectors.tolist(),
+    )
+    return vectors
+
+
+def test_flat_search_matches_brute_force_within_the_document():
+    """Test the top k of a document match a brute force cosine similarity search."""
+    # GIVEN two documents added in several batches, growing the matrix
+    store = NumpyVectorStore(RandomEmbeddings(), index_type="flat")
+    first = np.vstack(
+        [_add_random_documents(store, "doc-1", 50, seed) for seed in range(4)]
+    )
+    _add_random_documents(store, "doc-2", 300, 10)
+    query = np.random.default_rng(42).normal(size=16)
+
+    # WHEN the first document is searched
+    results = store.similarity_search_with_score_by_vector(
+        query.tolist(), k=5, filter={"doc_id": "doc-1"}
+    )
+
+    # THEN the results are the brute force top 5 of that document, best first
+    expected = _brute_force_top_k(first, query, 5)
+    assert [doc.page_content for doc, _ in results] == [
+        f"doc-1 chunk {row % 50}" for row in expected
+    ]
+    assert all(doc.metadata["doc_id"] == "doc-1" for doc, _ in results)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert len(store) == 500
+
+
+def test_search_of_unknown_or_small_document():
+    """Test documents with fewer than k chunks, or none, are handled."""
+    # GIVEN a document with 2 chunks
+    store = NumpyVectorStore(RandomEmbeddings())
+    _add_random_documents(store, "doc-1", 2, 0)
+
+    # WHEN the document and an unknown one are searched
+    # THEN every chunk of the document is returned, and nothing for the other
+    assert len(store.similarity_search("query", k=4, filter={"doc_id": "doc-1"})) == 2
+    assert store.similarity_search("query", k=4, filter={"doc_id": "missing"}) == []
+
+
+def test_hnsw_search_finds_the_nearest_neighbours():
+    """Test the HNSW index agrees with exact search on a small document."""
+    pytest.importorskip("hnswlib")
+    # GIVEN a document indexed with HNSW, added in two batches
+    store = NumpyVectorStore(RandomEmbeddings(), index_type="hnsw")
+    vectors = np.vstack(
+        [_add_random_documents(store, "doc-1", 100, seed) for seed in range(2)]
+    )
+    _add_random_documents(store, "doc-2", 100, 5)
+    query = np.random.default_rng(7).normal(size=16)
+
+    # WHEN the document is searched
+    results = store.similarity_search_by_vector(
+        query.tolist(), k=3, filter={"doc_id": "doc-1"}
+    )
+
+    # THEN the exact nearest neighbours are found
+    expected = _brute_force_top_k(vectors, query, 3)
+    assert [doc.page_content for doc in results] == [
+        f"doc-1 chunk {row % 100}" for row in expected
+    ]
+
+
+@pytest.mark.anyio
+async def test_in_memory_store_retriever_is_scoped_to_the_document():
+    """Test the retriever only returns chunks of the requested document."""
+    # GIVEN two documents in the in-memory store
+    vector_store = InMemoryStore(RandomEmbeddings())
+    for doc_id in ("doc-1", "doc-2"):
+        await vector_store.aadd_documents(
+            [Document(page_content=f"{doc_id} text {i}") for i in range(6)],
+            session_id="session",
+            doc_id=doc_id,
+        )
+
+    # WHEN the second document is retrieved from
+    docs = await vector_store.get_retriever("session", "doc-2").ainvoke("text")
+
+    # THEN 4 chunks of that document are returned
+    assert len(docs) == 4
+    assert {doc.metadata["doc_id"] for doc in docs} == {"doc-2"}
@@ -0,0 +1,104 @@
+import gzip
+import io
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    # Optional, only needed for the "zstd" document compression
+    zstandard = None
+
+# Stored document content encodings, None is uncompressed UTF-8
+ENCODINGS = (None, "gzip", "zstd")
+
+
+def check_encoding(encoding: Optional[str]) -> Optional[str]:
+    """Validate a configured encoding, where "none" or "" mean uncompressed."""
+    encoding = None if encoding in ("none", "") else encoding
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown document compression: {encoding}")
+    if encoding == "zstd" and zstandard is None:
+        raise ImportError("zstd compression needs zstandard: pip install zstandard")
+    return encoding
+
+
+def compress(data: bytes, encoding: Optional[str]) -> bytes:
+    """Compress data as a single, independently decompressible, frame."""
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+    """Decompress one or more concatenated frames."""
+    return open_decompressed(io.BytesIO(data), encoding).read()
+
+
+def open_decompressed(fileobj: BinaryIO, encoding: Optional[str]) -> BinaryIO:
+    """Wrap a binary stream to read it decompressed, without reading it all first.
+
+    Concatenated gzip members and zstd frames are read as one stream.
+    """
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(
+            fileobj, read_across_frames=True
+        )
+    return fileobj
+
+
+def write_frames(
+    pages: Iterable[str], encoding: Optional[str], out: BinaryIO
+) -> List[int]:
+    """Write each page as its own frame, returning the offsets of the frames in `out`.
+
+    Pages are separated by newlines, so all the frames decompress to the full text,
+    and as frames are compressed independently a range of them can be fetched and
+    decompressed on its own. The offsets end with the total length.
+    """
+    frame_offsets = [0]
+    for number, page in enumerate(pages):
+        text = ("\n" if number else "") + page
+        frame_offsets.append(
+            frame_offsets[-1] + out.write(compress(text.encode("utf-8"), encoding))
+        )
+    return frame_offsets
+
+
+def split_pages(full_text: str, page_offsets: Optional[List[int]]) -> List[str]:
+    """Split a full text into pages, given the offset at which each page starts."""
+    if not page_offsets:
+        return [full_text]
+    # Each page but the last is followed by a newline separator
+    ends = [offset - 1 for offset in page_offsets[1:]] + [len(full_text)]
+    return [full_text[start:end] for start, end in zip(page_offsets, ends)]
+
+
+def read_pages(
+    text_file: io.TextIOBase, page_offsets: Optional[List[int]]
+) -> Iterator[str]:
+    """Read a text file page by page, given the offset at which each page starts."""
+    if not page_offsets:
+        yield text_file.read()
+        return
+    position = 0
+    for start, next_start in zip(page_offsets, page_offsets[1:]):
+        text_file.read(start - position)  # The separator before the page, if any
+        yield text_file.read(next_start - 1 - start)
+        position = next_start - 1
+    text_file.read(page_offsets[-1] - position)
+    yield text_file.read()
+
+
+def decode_pages(
+    data: bytes, frame_offsets: List[int], first_page: int, encoding: Optional[str]
+) -> List[str]:
+    """Decompress the frames of consecutive pages, at `frame_offsets` in `data`."""
+    pages = []
+    for number, (start, end) in enumerate(zip(frame_offsets, frame_offsets[1:])):
+        text = decompress(data[start:end], encoding).decode("utf-8")
+        pages.append(text[1:] if first_page + number else text)
+    return pages
@@ -1,12 +1,59 @@
 import logging
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
 import psycopg
+from psycopg_pool import ConnectionPool
 
 from settings import settings
 
 logger = logging.getLogger(__name__)
 
+_connection_pool: Optional[ConnectionPool] = None
+
+
+def get_connection_pool() -> ConnectionPool:
+    """
+    Get the process-wide Postgres connection pool, creating it on first use.
+    Shared by the document store, chat history and vector store.
+    """
+    global _connection_pool
+    if _connection_pool is None:
+        _connection_pool = ConnectionPool(
+            settings.connection_string,
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            timeout=settings.db_pool_timeout,
+            max_idle=settings.db_pool_max_idle,
+            max_lifetime=settings.db_pool_max_lifetime,
+            check=(
+                ConnectionPool.check_connection
+                if settings.db_pool_check_connection
+                else None
+            ),
+            name="pdf-chat",
+            open=True,
+        )
+        logger.info(
+            f"Opened connection pool (min_size={settings.db_pool_min_size}, "
+            f"max_size={settings.db_pool_max_size})"
+        )
+    return _connection_pool
+
+
+def get_connection_pool_stats() -> Dict[str, int]:
+    """Statistics of the shared connection pool, empty if it hasn't been opened."""
+    if _connection_pool is None:
+        return {}
+    return _connection_pool.get_stats()
+
+
+def close_connection_pool() -> None:
+    """Close the shared connection pool, it is reopened on next use."""
+    global _connection_pool
+    if _connection_pool is not None:
+        _connection_pool.close()
+        _connection_pool = None
+
 
 def test_db_connection() -> Tuple[bool, str]:
     """
@@ -0,0 +1,38 @@
+import hashlib
+from typing import BinaryIO, Tuple
+
+# Read files in 1MiB blocks so large uploads aren't held in memory to be hashed
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload is larger than the configured limit."""
+
+
+def hash_file(file_path: str) -> str:
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_stream(source: BinaryIO, file_path: str, max_bytes: int) -> Tuple[str, int]:
+    """
+    Copy a file-like object to disk block by block, hashing it on the way.
+    Returns the sha256 hex digest and size of the content. Raises
+    UploadTooLargeError, leaving a partial file behind, once `max_bytes` is exceeded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "wb") as f:
+        while block := source.read(HASH_BLOCK_SIZE):
+            size += len(block)
+            if size > max_bytes:
+                raise UploadTooLargeError(
+                    f"Upload is larger than the {max_bytes} byte limit"
+                )
+            digest.update(block)
+            f.write(block)
+    return digest.hexdigest(), size
@@ -1,5 +1,5 @@
 import { describe, it, expect, vi } from 'vitest'
-import { sendQuery } from '@/services/api'
+import { sendQuery, uploadPDF } from '@/services/api'
 import axios from 'axios'
 
 vi.mock('axios')
@@ -40,4 +40,58 @@ describe('api', () => {
       await expect(sendQuery(query, sessionId, docId)).rejects.toThrow('API Error')
     })
   })
+
+  describe('uploadPDF', () => {
+    it('polls the ingestion job until the document is ready', async () => {
+      // Arrange
+      axios.post.mockResolvedValue({
+        data: { job_id: 'job-1', status: 'queued' }
+      })
+      axios.get
+        .mockResolvedValueOnce({ data: { job_id: 'job-1', status: 'running' } })
+        .mockResolvedValueOnce({
+          data: { job_id: 'job-1', status: 'completed', doc_id: 'doc-1' }
+        })
+
+      // Act
+      const result = await uploadPDF(new Blob(['%PDF']), 'test-session', 0)
+
+      // Assert
+      expect(axios.get).toHaveBeenCalledTimes(2)
+      expect(axios.get).toHaveBeenCalledWith(
+        expect.stringContaining('/upload/job-1')
+      )
+      expect(result.doc_id).toEqual('doc-1')
+    })
+
+    it('returns an upload ingested within the request without polling', async () => {
+      // Arrange
+      axios.get.mockClear()
+      axios.post.mockResolvedValue({
+        data: { status: 'completed', doc_id: 'doc-1' }
+      })
+
+      // Act
+      const result = await uploadPDF(new Blob(['%PDF']), 'test-session', 0)
+
+      // Assert
+      expect(axios.get).not.toHaveBeenCalled()
+      expect(result.doc_id).toEqual('doc-1')
+    })
+
+    it('throws when ingestion fails', async () => {
+      // Arrange
+      axios.post.mockResolvedValue({
+        data: { job_id: 'job-2', status: 'queued' }
+      })
+      axios.get.mockResolvedValue({
+        data: { job_id: 'job-2', status: 'failed', error: 'Bad PDF' }
+      })
+
+      // Act & Assert
+      await expect(
+        uploadPDF(new Blob(['%PDF']), 'test-session', 0)
+      ).rejects.toThrow('Bad PDF')
+    })
+  })
 })
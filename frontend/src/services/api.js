@@ -2,7 +2,22 @@ import axios from 'axios'
 
 export const API_URL = `${import.meta.env.VITE_API_GATEWAY_URL}/prod`
 
-export const uploadPDF = async (file, sessionId) => {
+// How often to poll an upload's ingestion job, and for how long
+const UPLOAD_POLL_INTERVAL_MS = 1000
+const UPLOAD_POLL_TIMEOUT_MS = 10 * 60 * 1000
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+export const getUploadStatus = async (jobId) => {
+  const response = await axios.get(`${API_URL}/upload/${jobId}`)
+  return response.data
+}
+
+export const uploadPDF = async (
+  file,
+  sessionId,
+  pollIntervalMs = UPLOAD_POLL_INTERVAL_MS
+) => {
   const formData = new FormData()
   formData.append('file', file)
   formData.append('session_id', sessionId)
@@ -12,7 +27,26 @@ export const uploadPDF = async (file, sessionId) => {
       'Content-Type': 'multipart/form-data'
     }
   })
-  return response.data
+
+  // Without background ingestion (e.g. on Lambda) the PDF is already ingested
+  if (response.data.status === 'completed') {
+    return response.data
+  }
+
+  // The PDF is ingested in the background, wait for its job to finish
+  const { job_id: jobId } = response.data
+  const deadline = Date.now() + UPLOAD_POLL_TIMEOUT_MS
+  while (Date.now() < deadline) {
+    const job = await getUploadStatus(jobId)
+    if (job.status === 'completed') {
+      return { ...response.data, ...job }
+    }
+    if (job.status === 'failed') {
+      throw new Error(`Upload failed: ${job.error}`)
+    }
+    await sleep(pollIntervalMs)
+  }
+  throw new Error(`Upload timed out waiting for job ${jobId}`)
 }
 
 export const sendQuery = async (query, sessionId, docId) => {
@@ -0,0 +1,71 @@
+"""
+Compare dense, keyword (BM25) and hybrid retrieval on the generated QA pairs.
+
+Chunks the Bitcoin whitepaper with the backend's DocumentProcessor, indexes it in the
+backend's InMemoryStore and measures each retrieval mode with evaluate_retrieval.
+Dense and hybrid retrieval embed with OpenAI, so they need OPENAI_API_KEY.
+
+Usage: python hybrid_retrieval.py --k 4
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.append(str(BACKEND_DIR))
+
+from brain.document_processing import DocumentProcessor  # noqa: E402
+from langchain_openai import OpenAIEmbeddings  # noqa: E402
+from repositories.vector_db import InMemoryStore, KeywordRetriever  # noqa: E402
+from settings import settings  # noqa: E402
+
+from utils import calculate_metric_avg, evaluate_retrieval, load_qa_pairs  # noqa: E402
+
+BITCOIN_PDF = (
+    BACKEND_DIR / "docs" / "Bitcoin - A Peer-to-Peer Electronic Cash System.pdf"
+)
+DOC_ID = "bitcoin"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--k", type=int, default=settings.retrieval_k)
+    parser.add_argument("--qa-pairs", default="data/qa_pairs.json")
+    parser.add_argument("--modes", nargs="+", default=["dense", "keyword", "hybrid"])
+    args = parser.parse_args()
+
+    qa_pairs = load_qa_pairs(args.qa_pairs)
+    processor = DocumentProcessor()
+    chunks = processor.chunk_docs(processor.load_pdf(str(BITCOIN_PDF)))
+    vector_store = InMemoryStore(
+        OpenAIEmbeddings(
+            model=settings.embedding_model, dimensions=settings.embedding_size
+        )
+    )
+    if {"dense", "hybrid"} & set(args.modes):
+        vector_store.add_documents(chunks, session_id="research", doc_id=DOC_ID)
+    else:
+        vector_store.keyword_index.add(DOC_ID, chunks)
+
+    print(f"{len(qa_pairs)} questions over {len(chunks)} chunks, k={args.k}")
+    for mode in args.modes:
+        if mode == "keyword":
+            retriever = KeywordRetriever(
+                vector_store=vector_store, doc_id=DOC_ID, k=args.k
+            )
+        else:
+            retriever = vector_store.get_retriever(
+                "research", DOC_ID, k=args.k, mode=mode
+            )
+        metrics = calculate_metric_avg(
+            evaluate_retrieval(qa_pairs, retriever, k=args.k)
+        )
+        print(
+            f"{mode:<8} "
+            + " ".join(f"{name}={value:.3f}" for name, value in metrics.items())
+        )
+
+
+if __name__ == "__main__":
+    main()